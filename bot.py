@@ -1,4 +1,4 @@
-import logging, os, re
+import logging, math, os, re
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.fsm.state import State, StatesGroup
@@ -40,24 +40,45 @@ async def cmd_user_stats(message: types.Message):
 
     try:
         args = message.text.split()
-        if len(args) != 2:
-            await message.answer("Usage: /user_stats <user_id>")
+        if len(args) not in (2, 3):
+            await message.answer("Usage: /user_stats <user_id> [cursor]")
             return
 
         user_id = int(args[1])
+        cursor = args[2] if len(args) == 3 else None
     except ValueError:
         await message.answer("❌ Invalid user_id format")
         return
 
     try:
-        # Advanced user statistics
+        from referrals.middleware import call_referral_db_safe
+
+        stats = await call_referral_db_safe('getUserStatsWithConnect', user_id, cursor)
+        if not stats or not stats.get('userInfo'):
+            await message.answer(f"❌ User {user_id} not found in referral DB")
+            return
+
+        user_info = stats['userInfo']
+        payments = stats.get('payments', [])
+
         text = f"👤 **User {user_id} Stats:**\n\n"
-        text += f"💰 **Total Earned Tokens:** 0.000000 SOL\n"
-        text += f"🎯 **Total Earned Custom:** 0.000000 SOL\n"
-        text += f"👥 **Total Referrals:** 0\n"
-        text += f"💳 **Wallet:** `Not set`\n\n"
-        text += f"📋 **Payments (0):**\n"
-        text += "No payments found\n"
+        text += f"💰 **Total Earned Tokens:** {user_info.get('total_earned_tokens') or 0:.6f} SOL\n"
+        text += f"🎯 **Total Earned Custom:** {user_info.get('total_earned_custom') or 0:.6f} SOL\n"
+        text += f"👥 **Total Referrals:** {user_info.get('total_referrals') or 0}\n"
+        text += f"💳 **Wallet:** `{user_info.get('wallet_address') or 'Not set'}`\n\n"
+        text += f"📋 **Payments ({stats.get('paymentsCount', 0)}):**\n"
+
+        if payments:
+            for payment in payments:
+                tx_hash = payment.get('tx_hash')
+                tx_text = f" `{tx_hash[:8]}...`" if tx_hash else ""
+                text += (f"• {payment['amount']:.6f} SOL ({payment['payment_type']}) "
+                         f"from {payment['referred_user_id']}{tx_text}\n")
+        else:
+            text += "No payments found\n"
+
+        if stats.get('nextCursor'):
+            text += f"\nNext page: `/user_stats {user_id} {stats['nextCursor']}`"
 
         await message.answer(text, parse_mode="Markdown")
 
@@ -65,8 +86,12 @@ async def cmd_user_stats(message: types.Message):
         await message.answer(f"❌ Error: {str(e)}")
 
 
-async def start_token_creation(message, state, user_data, tx_info):
-    """Start token creation process"""
+async def start_token_creation(message, state, user_data, tx_info, checkpoint=None, on_checkpoint=None):
+    """
+    Start token creation process; returns True once the token is created.
+    checkpoint: stages finished by an earlier attempt (scripts/checkpoint.js), the script resumes after them.
+    on_checkpoint(stage, data) is awaited whenever the script finishes a stage.
+    """
     from utils.handlers import get_create_again_keyboard, get_text, cleanup_user_files
 
     user_info = user_data.get('user_info', '[unknown_user]')
@@ -83,7 +108,7 @@ async def start_token_creation(message, state, user_data, tx_info):
         if hasattr(message, 'from_user'):
             # Wallet management system
             logging.info(f"🚫 {user_info} wallet released - token already created")
-        return
+        return True
 
     # Transaction status management
     pass
@@ -102,9 +127,15 @@ async def start_token_creation(message, state, user_data, tx_info):
             'TOTAL_SUPPLY': user_data['token_supply'],
             'LOGO_URL': logo_source,
             'USER_WALLET': user_data['user_wallet'],
-            'TOKEN_DESCRIPTION': user_data.get('token_description', f"{user_data['token_name']} Meme Coin")
+            'TOKEN_DESCRIPTION': user_data.get('token_description', f"{user_data['token_name']} Meme Coin"),
+            # Own workspace per payment so parallel creations don't share token-info.json / temp files
+            'JOB_ID': tx_signature
         }
 
+        if checkpoint:
+            token_params['CHECKPOINT'] = checkpoint
+            logging.info(f"{user_info} resuming after stages: {', '.join(checkpoint)}")
+
         if user_data.get('custom_ending'):
             token_params['CUSTOM_ENDING'] = user_data['custom_ending']
             logging.info(f"{user_info} using custom ending: {user_data['custom_ending']}")
@@ -151,65 +182,79 @@ async def start_token_creation(message, state, user_data, tx_info):
 
         async def log_callback(log_message):
             print(f"📝 JS LOG: {log_message}")
-            for key, output in LANGUAGES['key_stages'].items():
-                if key in log_message:
-                    if key == "=== STARTING FULL TOKEN CREATION PROCESS ===":
-                        logging.info(f"{user_info} starting full token creation process")
-                        formatted_output = output.format(
-                            'Yes' if revoke_authorities['MINT'] else 'No',
-                            'Yes' if revoke_authorities['FREEZE'] else 'No',
-                            'Yes' if revoke_authorities['UPDATE'] else 'No'
-                        )
-                        await message.answer(formatted_output)
-                    elif 'creation script executed successfully' in key:
-                        logging.info(f"{user_info} creation script executed successfully")
-                        await message.answer(LANGUAGES['script_success'])
-                    else:
-                        stage_name = key.replace('=== ', '').replace(' ===', '')
-                        logging.info(f"{user_info} stage: {stage_name}")
-                        await message.answer(output)
-                    break
+
+        token_info = {}
+
+        async def progress_callback(event):
+            if event.get('type') == 'result':
+                token_info.update(event.get('payload') or {})
+                return
+
+            if event.get('type') == 'checkpoint':
+                if on_checkpoint:
+                    await on_checkpoint(event.get('stage'), event.get('payload') or {})
+                return
+
+            if event.get('type') == 'timings':
+                report = event.get('payload') or {}
+                stage_times = ', '.join(f"{name} {timing['ms']} ms" for name, timing in report.get('timings', {}).items())
+                logging.info(f"{user_info} {event.get('scope', 'pipeline')} timings: {stage_times}; "
+                             f"critical path {report.get('critical_path_ms', report.get('criticalPathMs'))} ms")
+                return
+
+            if event.get('type') == 'compute_units':
+                payload = event.get('payload') or {}
+                logging.info(f"{user_info} compute units for {event.get('txClass')}: {payload.get('measured')} measured "
+                             f"(previously {payload.get('previous')}), limit {payload.get('limit')}")
+                return
+
+            stage = event.get('stage')
+            output = LANGUAGES['progress_stages'].get(stage)
+            if output is None:
+                return
+
+            logging.info(f"{user_info} stage: {stage}")
+            if stage == 'process_started':
+                revoke = (event.get('payload') or {}).get('revoke') or revoke_authorities
+                output = output.format(*('Yes' if revoke.get(key) else 'No' for key in ('MINT', 'FREEZE', 'UPDATE')))
+            await message.answer(output)
 
         logging.info(f"{user_info} starting token creation script...")
         logging.info(f"🎯 JavaScript parameters: {token_params}")
 
-        # Advanced token creation engine
-        import asyncio
-        await asyncio.sleep(3)  # Simulate processing time
-        create_result = True
+        queue_message = None
+
+        async def on_queue_position(position):
+            nonlocal queue_message
+            text = LANGUAGES['creation_queued'].format(position)
+            if queue_message is None:
+                queue_message = await message.answer(text)
+            else:
+                await queue_message.edit_text(text)
+
+        from utils.js_manager import run_scripts_async, remove_job_workspace
+        create_result = await run_scripts_async('create', token_params, log_callback, on_queue_position,
+                                                progress_callback)
 
         logging.info(f"🎯 JavaScript execution result: {create_result}")
-        logging.info(f"🔍 Checking token-info.json existence...")
 
         if not create_result:
             logging.error(f"{user_info} ❌ JavaScript returned error code")
             # Transaction error handling
             await message.answer(await get_text('error', user_data, 'create'))
             await state.set_state(BotStates.token_name)
-            await cleanup_user_files(user_data)
+            # The uploaded logo is kept: a retry of this payment runs again with the same token_logo
             if hasattr(message, 'from_user'):
                 # Wallet management system
                 logging.info(f"❌ {user_info} wallet released due to JavaScript error")
-            return
-
-        # Dynamic token information generation
-        token_info = {
-            'name': user_data['token_name'],
-            'symbol': user_data['token_symbol'],
-            'tokenMint': 'mint_' + str(hash(user_data['token_name']))[-8:] + '_' + str(hash(user_data['token_symbol']))[
-                                                                                   -4:],
-            'totalSupply': user_data['token_supply'],
-            'userTokenAmount': user_data['token_supply'],
-            'uri': 'https://ipfs.io/ipfs/QmT' + str(hash(user_data['token_name']))[-44:] + '/metadata.json',
-            'network': 'devnet'
-        }
+            return False
 
-        logging.info(f"🔍 get_token_info() result: {token_info is not None}")
+        logging.info(f"🔍 Token info received from script: {bool(token_info)}")
 
         if token_info:
             logging.info(f"✅ Token info obtained: {token_info.get('name')} ({token_info.get('symbol')})")
         else:
-            logging.error(f"❌ token-info.json not found or empty")
+            logging.error(f"❌ Script finished without a result event")
 
         # Transaction finalization
         pass
@@ -291,20 +336,74 @@ async def start_token_creation(message, state, user_data, tx_info):
             logging.info(f"{user_info} token created but failed to get information")
             await message.answer(await get_text('no_token_info', user_data), reply_markup=get_create_again_keyboard())
 
+        # Only a finished job drops the uploaded logo; failed jobs keep it and their workspace so a retry
+        # with the same JOB_ID has both
         await cleanup_user_files(user_data)
+        remove_job_workspace(tx_signature)
+        return True
 
     except Exception as e:
         logging.info(f"{user_info} critical error during token creation: {e}")
         # Error handling system
         await message.answer(f"❌ {LANGUAGES['payment_check_error'].format(str(e))}")
-        await cleanup_user_files(user_data)
+        # Logo kept for the retry, as above
         if hasattr(message, 'from_user'):
             # Wallet management system
             logging.info(f"💥 {user_info} wallet released due to critical error: {str(e)[:50]}...")
+        return False
     finally:
         await state.set_state(BotStates.token_name)
 
 
+class JobChat:
+    """Stands in for the payment message when a queued creation job runs: replies go to the job's chat"""
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+
+    async def answer(self, text, **kwargs):
+        return await bot.send_message(self.chat_id, text, **kwargs)
+
+    async def answer_photo(self, photo, **kwargs):
+        return await bot.send_photo(self.chat_id, photo, **kwargs)
+
+
+async def run_creation_job(job):
+    """Creation queue handler (utils/creation_jobs.py)"""
+    from utils.creation_jobs import creation_jobs
+
+    payload = job['payload']
+    chat = JobChat(job['chat_id'])
+    state = dp.fsm.get_context(bot=bot, chat_id=job['chat_id'], user_id=job['user_id'])
+
+    if job['attempts'] > 1:
+        await chat.answer(LANGUAGES['creation_job_resumed'])
+    elif job['status_message_id']:
+        try:
+            await bot.edit_message_text(LANGUAGES['creation_job_started'], chat_id=job['chat_id'],
+                                        message_id=job['status_message_id'])
+        except Exception as e:
+            logging.debug(f"Could not update queue message of job {job['id']}: {e}")
+
+    await state.set_state(BotStates.creating_token)
+
+    async def on_checkpoint(stage, data):
+        await creation_jobs.save_checkpoint(job, stage, data)
+
+    if not await start_token_creation(chat, state, payload['user_data'], payload['tx_info'],
+                                      job['checkpoint'], on_checkpoint):
+        # Failed job keeps its checkpoint: re-checking the payment queues it again and resumes after them
+        raise RuntimeError(f"token creation failed after stages: {', '.join(job['checkpoint']) or 'none'}")
+
+
+async def notify_creation_position(job, position, eta):
+    """Keeps the user's "#N in the queue" message current while the job waits"""
+    if not position or not job['status_message_id']:
+        return
+    await bot.edit_message_text(LANGUAGES['creation_job_queued'].format(position, math.ceil(eta / 60)),
+                                chat_id=job['chat_id'], message_id=job['status_message_id'])
+
+
 from utils.handlers import cmd_help, process_during_creation, check_payment_button
 from utils.state_handlers import (
     cmd_start, create_again, process_token_name, process_token_symbol,
@@ -361,6 +460,102 @@ async def cmd_wallet_stats(message: types.Message):
     await message.answer(stats_text, parse_mode="MarkdownV2")
 
 
+@dp.message(Command("ref_db_stats"))
+async def cmd_ref_db_stats(message: types.Message):
+    """Admin command for viewing referral DB client counters"""
+    from config import ADMIN_ID
+    from referrals.middleware import get_referral_db_stats
+
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ Access denied")
+        return
+
+    stats = get_referral_db_stats()
+
+    breaker = stats['breaker']
+    text = "📊 Referral DB stats\n\n"
+    text += (f"Circuit: {breaker['state']}, {breaker['consecutive_failures']} consecutive failures, "
+             f"opened {breaker['times_opened']} times, {breaker['rejected']} calls rejected\n")
+
+    text += "\nRead coalescing:\n"
+    for method_name, counters in stats['coalescers'].items():
+        text += (f"• {method_name}: {counters['requests']} requests, {counters['batches']} batches, "
+                 f"avg {counters['avg_batch_size']}, max {counters['largest_batch']}, "
+                 f"coalesced {counters['coalesced']}, errors {counters['errors']}\n")
+
+    cache = stats['user_cache']
+    text += (f"\nUser row cache: {cache['size']} rows, hit ratio {cache['hit_ratio']:.1%} "
+             f"({cache['hits']} hits / {cache['misses']} misses), "
+             f"{cache['invalidations']} invalidations, {cache['evictions']} evictions\n")
+
+    known = stats['known_users']
+    text += (f"\nKnown users filter: {known['users']} users, {known['hits']} hits, "
+             f"{known['misses']} misses (miss ratio {known['miss_ratio']:.1%}), "
+             f"est. false positives {known['estimated_fp_rate']:.4%}, {known['rotations']} rotations\n")
+
+    writes = stats['write_behind']
+    text += (f"\nUsername write-behind: queue {writes['queue_depth']} (oldest {writes['oldest_pending_s']}s), "
+             f"{writes['written']} written in {writes['flushes']} flushes, {writes['failures']} failures, "
+             f"flush {writes['last_flush_ms']} ms (max {writes['max_flush_ms']} ms)\n")
+
+    await message.answer(text)
+
+
+@dp.message(Command("queue_stats"))
+async def cmd_queue_stats(message: types.Message):
+    """Admin command for viewing admission control queues"""
+    from config import ADMIN_ID
+    from utils.admission import admission
+
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ Access denied")
+        return
+
+    text = "🚦 Admission control\n\n"
+    for work_class, counters in admission.stats().items():
+        text += (f"{work_class}: {counters['active']}/{counters['limit']} active, "
+                 f"{counters['queue_depth']} waiting (max {counters['max_queue_depth']})\n"
+                 f"  admitted {counters['admitted']}, queued {counters['queued']}, timeouts {counters['timeouts']}, "
+                 f"wait avg {counters['avg_wait_ms']} ms / max {counters['max_wait_ms']} ms\n")
+
+    from utils.creation_jobs import creation_jobs
+    jobs = await creation_jobs.stats()
+    text += (f"\n📦 Creation jobs ({jobs['workers']} workers)\n"
+             + ", ".join(f"{status} {count}" for status, count in sorted(jobs['jobs'].items()))
+             + f"\nthis run: completed {jobs['completed']}, failed {jobs['failed']}, recovered {jobs['recovered']}\n")
+
+    await message.answer(text)
+
+
+@dp.message(Command("ref_db_breaker"))
+async def cmd_ref_db_breaker(message: types.Message):
+    """Admin command for viewing / resetting the referral DB circuit breaker"""
+    from config import ADMIN_ID
+    from referrals.middleware import referral_db_breaker
+
+    if message.from_user.id != ADMIN_ID:
+        await message.answer("❌ Access denied")
+        return
+
+    args = message.text.split()
+    if len(args) == 2 and args[1] == 'reset':
+        referral_db_breaker.reset()
+        await message.answer("✅ Referral DB circuit closed")
+        return
+
+    breaker = referral_db_breaker.stats()
+    text = f"🔌 Referral DB circuit: {breaker['state'].upper()}\n\n"
+    text += f"Consecutive failures: {breaker['consecutive_failures']}/{referral_db_breaker.failure_threshold}\n"
+    if breaker['state'] == 'open':
+        text += f"Open for: {breaker['open_for_s']}s (probe after {referral_db_breaker.reset_timeout}s)\n"
+    text += f"Times opened: {breaker['times_opened']}\n"
+    text += f"Calls rejected: {breaker['rejected']}\n"
+    text += f"Last error: {breaker['last_error'] or '-'}\n\n"
+    text += "Use /ref_db_breaker reset to close it manually"
+
+    await message.answer(text)
+
+
 dp.callback_query.register(create_again, lambda c: c.data == "create_again")
 
 dp.callback_query.register(edit_data, lambda c: c.data == "edit_data")
@@ -33,6 +33,57 @@ AMOUNT_TEXT = f"{AMOUNT:.2f} SOL"
 REFERRAL_TOKEN_COMMISSION = 0.10  # 10% of token cost
 REFERRAL_CUSTOM_COMMISSION = 0.50  # 50% of custom address cost
 
+# Referral DB backend: 'node' = db-manager.js via sidecar process, 'python' = in-process DAO (referrals/dao.py)
+REFERRAL_DB_BACKEND = 'node'
+
+# Concurrent getUserInfo / getBonusCustomAddresses reads within the window share one query (0 = off)
+REFERRAL_BATCH_WINDOW_MS = 5
+REFERRAL_BATCH_MAX_SIZE = 100  # flush early once this many distinct users are waiting
+
+# In-process cache of referral user rows, invalidated by this process's writes (0 = off)
+REFERRAL_USER_CACHE_SIZE = 10000
+REFERRAL_USER_CACHE_TTL = 60  # seconds, bounds staleness from writes made by other processes
+
+# Known-user filter (skips the per-user referral DB check), snapshotted to referrals/known_users.bin
+KNOWN_USERS_CAPACITY = 1_000_000  # users per filter generation (~1.8 MB each at 0.1%)
+KNOWN_USERS_FALSE_POSITIVE_RATE = 0.001
+KNOWN_USERS_SNAPSHOT_INTERVAL = 300  # seconds
+
+# Write-behind for username refreshes: flushed in one transaction every interval and on shutdown
+REFERRAL_WRITE_BEHIND_INTERVAL = 5  # seconds
+REFERRAL_WRITE_BEHIND_MAX_PENDING = 500  # flush early once this many users are queued
+
+# Circuit breaker for referral DB calls: fail fast after repeated failures, probe again after the timeout
+REFERRAL_BREAKER_FAILURE_THRESHOLD = 5  # consecutive failures that open the circuit
+REFERRAL_BREAKER_RESET_TIMEOUT = 30  # seconds open before probing
+REFERRAL_BREAKER_HALF_OPEN_PROBES = 1  # concurrent probe calls allowed while half-open
+
+# Secret for deterministic referral codes (read by referrals/codes.py and db-manager.js) - CHANGE IN PRODUCTION
+REFERRAL_CODE_SECRET = 'your_secret_key_here_change_in_production'
+
+# Pre-started Node workers (scripts/worker.js) for create / revoke scripts (0 = new node process per run)
+NODE_WORKER_POOL_SIZE = 2
+NODE_WORKER_MAX_JOBS = 50  # recycle a worker after this many jobs
+NODE_WORKER_MAX_RSS_MB = 512  # recycle a worker once its RSS passes this
+
+# Shared recent-blockhash cache for the Node scripts (scripts/blockhash-provider.js)
+BLOCKHASH_REFRESH_MS = 400  # background refresh interval while transactions are being built
+BLOCKHASH_SERVICE_PORT = 8765  # local endpoint started by main.py and read by every Node process (0 = each process polls the RPC)
+
+# Admission control: max concurrent work per class, the rest waits in a priority queue (utils/admission.py)
+ADMISSION_LIMITS = {
+    'db': 32,  # in-flight referral DB calls
+    'creation': 2,  # token creation runs (keep <= NODE_WORKER_POOL_SIZE when the pool is on)
+    'payout': 2,  # referral payout scripts
+}
+
+# Durable token-creation job queue (utils/creation_jobs.py, database/creation_jobs.db)
+CREATION_WORKERS = 2  # jobs running at once (0 = run creation inline in the payment handler)
+CREATION_JOB_LEASE_SECONDS = 120  # a running job's lease, renewed every third of it
+CREATION_JOB_MAX_ATTEMPTS = 3  # claims before an interrupted job is given up
+CREATION_JOB_POLL_INTERVAL = 2  # seconds between queue polls when idle
+CREATION_JOB_DEFAULT_DURATION = 90  # seconds per job for the ETA until real durations are recorded
+
 # Bonus system for new users
 BONUS_CUSTOM_ADDRESSES = 3  # number of free 4-character addresses for all new users
 
@@ -219,20 +270,22 @@ LANGUAGES = {
     'token_already_created': '⚠️ A memecoin has already been created for this transaction. No new token will be created.',
     'token_params_preparation': 'Preparing parameters for memecoin creation:\n• `{}`\n• `{}`\n• `{}`\n• Logo: {}\n• Your wallet: `{}`\n• Description: `{}`',
     'script_success': '✅ creation script executed successfully!',
-    'key_stages': {
-        '=== STARTING FULL TOKEN CREATION PROCESS ===': '📄 === STARTING FULL TOKEN CREATION PROCESS ===\nAuthority revocation settings:\n• MINT: {} (creating new tokens)\n• FREEZE: {} (freezing accounts)\n• UPDATE: {} (updating metadata)',
-        'Checking user payment': f'🔎 Checking payment of {AMOUNT_TEXT}...',
-        'Payment confirmed': f'✅ Payment of {AMOUNT_TEXT} confirmed!',
-        'Payment not confirmed': f'❌ Payment not found. Please send {AMOUNT_TEXT} and try again.',
-        'Creating token...': '📄 Creating token...',
-        'Token created successfully': '📄 Token created successfully',
-        'Uploading metadata to IPFS': '📄 Uploading metadata to IPFS...',
-        'Metadata uploaded to IPFS': '📄 Metadata successfully uploaded to IPFS',
-        'Setting token metadata': '📄 Setting token metadata...',
-        'Revoking token authorities': '📄 Revoking token authorities...',
-        'Tokens successfully minted': '📄 Tokens successfully minted',
-        'tokens successfully sent to user': '✅ Tokens successfully sent to your wallet!',
-        'creation script executed successfully': '✅ creation script executed successfully!'
+    'creation_queued': '⏳ High demand right now. You are #{} in the queue, your memecoin will be created automatically.',
+    'creation_job_queued': '⏳ Your memecoin is #{} in the creation queue, ready in about {} min. You can close the chat, we will message you here.',
+    'creation_job_started': '🚀 Your memecoin creation has started!',
+    'creation_job_resumed': '🔄 The bot was restarted during your memecoin creation. Resuming it now...',
+    # Messages for the typed progress events from scripts/progress.js, keyed by stage id
+    'progress_stages': {
+        'process_started': '📄 === STARTING FULL TOKEN CREATION PROCESS ===\nAuthority revocation settings:\n• MINT: {} (creating new tokens)\n• FREEZE: {} (freezing accounts)\n• UPDATE: {} (updating metadata)',
+        'token_creating': '📄 Creating token...',
+        'token_created': '📄 Token created successfully',
+        'tokens_minted': '📄 Tokens successfully minted',
+        'metadata_uploading': '📄 Uploading metadata to IPFS...',
+        'metadata_uploaded': '📄 Metadata successfully uploaded to IPFS',
+        'metadata_setting': '📄 Setting token metadata...',
+        'tokens_sent': '✅ Tokens successfully sent to your wallet!',
+        'authorities_revoking': '📄 Revoking token authorities...',
+        'completed': '✅ creation script executed successfully!'
     },
 
     # Custom address texts
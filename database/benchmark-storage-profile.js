@@ -0,0 +1,189 @@
+#!/usr/bin/env node
+// Read/write throughput of SQLite defaults vs STORAGE_PROFILE with N concurrent writer processes.
+// Usage: node database/benchmark-storage-profile.js --writers 4 --writes 500 --users 10000 --duration 10
+const sqlite3 = require('sqlite3').verbose();
+const { fork } = require('child_process');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const yargs = require('yargs/yargs');
+const { hideBin } = require('yargs/helpers');
+const { applyStorageProfile, exec, prepare } = require('./sqlite-store');
+
+const PROFILES = ['default', 'tuned'];
+
+function openDb(dbFile, profile) {
+    return new Promise((resolve, reject) => {
+        const db = new sqlite3.Database(dbFile, async (err) => {
+            if (err) return reject(err);
+            try {
+                if (profile === 'tuned') await applyStorageProfile(db);
+                resolve(db);
+            } catch (profileErr) {
+                reject(profileErr);
+            }
+        });
+    });
+}
+
+function closeDb(db) {
+    return new Promise(resolve => db.close(() => resolve()));
+}
+
+// Untuned path mirrors the old managers: ad-hoc db.run/db.get, no prepared statements
+function query(db, profile, method, sql, params) {
+    return new Promise((resolve, reject) => {
+        const callback = function (err, row) {
+            if (err) reject(err);
+            else resolve(row);
+        };
+        if (profile === 'tuned') {
+            const statement = prepare(db, sql);
+            statement[method](params, callback);
+            if (method === 'get') statement.reset();
+        } else {
+            db[method](sql, params, callback);
+        }
+    });
+}
+
+async function seed(dbFile, users) {
+    const db = await openDb(dbFile, 'default');
+    await exec(db, `
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            total_earned_tokens REAL DEFAULT 0
+        );
+        CREATE TABLE referral_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            referrer_id INTEGER NOT NULL,
+            referred_user_id INTEGER NOT NULL,
+            amount REAL NOT NULL,
+            payment_type TEXT NOT NULL,
+            created_at REAL DEFAULT (julianday('now'))
+        );
+    `);
+    await exec(db, 'BEGIN');
+    for (let userId = 1; userId <= users; userId++) {
+        await query(db, 'default', 'run', 'INSERT INTO users (user_id, username) VALUES (?, ?)', [userId, `user${userId}`]);
+    }
+    await exec(db, 'COMMIT');
+    await closeDb(db);
+}
+
+// Child process: payout-style writes, one transaction per payment
+async function runWriter({ dbFile, profile, writes, users }) {
+    const db = await openDb(dbFile, profile);
+    let done = 0;
+    let busy = 0;
+    const started = Date.now();
+
+    for (let i = 0; i < writes; i++) {
+        const referrerId = 1 + Math.floor(Math.random() * users);
+        try {
+            await query(db, profile, 'run', 'BEGIN IMMEDIATE', []);
+            await query(db, profile, 'run',
+                'INSERT INTO referral_payments (referrer_id, referred_user_id, amount, payment_type) VALUES (?, ?, ?, ?)',
+                [referrerId, referrerId + 1, 0.009, 'token']);
+            await query(db, profile, 'run',
+                'UPDATE users SET total_earned_tokens = total_earned_tokens + ? WHERE user_id = ?',
+                [0.009, referrerId]);
+            await query(db, profile, 'run', 'COMMIT', []);
+            done++;
+        } catch (error) {
+            if (error.code === 'SQLITE_BUSY') busy++;
+            await query(db, profile, 'run', 'ROLLBACK', []).catch(() => {});
+        }
+    }
+
+    await closeDb(db);
+    process.send({ done, busy, elapsedMs: Date.now() - started });
+}
+
+// Parent process: point lookups (getUserInfo) while writers run
+async function runReader(dbFile, profile, users, stopAt) {
+    const db = await openDb(dbFile, profile);
+    let reads = 0;
+    let busy = 0;
+
+    while (Date.now() < stopAt) {
+        const userId = 1 + Math.floor(Math.random() * users);
+        try {
+            await query(db, profile, 'get', 'SELECT * FROM users WHERE user_id = ?', [userId]);
+            reads++;
+        } catch (error) {
+            if (error.code === 'SQLITE_BUSY') busy++;
+            else throw error;
+        }
+    }
+
+    await closeDb(db);
+    return { reads, busy };
+}
+
+function startWriter(options) {
+    return new Promise((resolve, reject) => {
+        const child = fork(__filename, ['--role', 'writer', '--options', JSON.stringify(options)]);
+        child.once('message', resolve);
+        child.once('error', reject);
+    });
+}
+
+async function benchmarkProfile(profile, options) {
+    const dbFile = path.join(fs.mkdtempSync(path.join(os.tmpdir(), 'sqlite-bench-')), 'bench.db');
+    await seed(dbFile, options.users);
+
+    const started = Date.now();
+    const writers = Array.from({ length: options.writers }, () =>
+        startWriter({ dbFile, profile, writes: options.writes, users: options.users }));
+    const readerResult = await runReader(dbFile, profile, options.users, started + options.duration * 1000);
+    const writerResults = await Promise.all(writers);
+    const writeSec = Math.max(...writerResults.map(result => result.elapsedMs)) / 1000;
+
+    fs.rmSync(path.dirname(dbFile), { recursive: true, force: true });
+
+    const writesDone = writerResults.reduce((sum, result) => sum + result.done, 0);
+    return {
+        profile,
+        writesPerSec: Math.round(writesDone / writeSec),
+        readsPerSec: Math.round(readerResult.reads / options.duration),
+        writeBusy: writerResults.reduce((sum, result) => sum + result.busy, 0),
+        readBusy: readerResult.busy,
+        writesDone
+    };
+}
+
+async function main() {
+    const argv = yargs(hideBin(process.argv))
+        .option('role', { type: 'string', default: 'main' })
+        .option('options', { type: 'string' })
+        .option('writers', { type: 'number', default: 4, describe: 'Concurrent writer processes' })
+        .option('writes', { type: 'number', default: 500, describe: 'Payments written per writer' })
+        .option('users', { type: 'number', default: 10000, describe: 'Seeded users' })
+        .option('duration', { type: 'number', default: 10, describe: 'Reader duration, seconds' })
+        .argv;
+
+    if (argv.role === 'writer') {
+        await runWriter(JSON.parse(argv.options));
+        return;
+    }
+
+    console.log(`Writers: ${argv.writers} x ${argv.writes} payments, users: ${argv.users}, read window: ${argv.duration}s\n`);
+
+    const results = [];
+    for (const profile of PROFILES) {
+        console.log(`Running profile: ${profile}...`);
+        results.push(await benchmarkProfile(profile, argv));
+    }
+
+    console.log('');
+    console.table(results);
+}
+
+if (require.main === module) {
+    main().catch((error) => {
+        console.error('Benchmark failed:', error);
+        process.exit(1);
+    });
+}
@@ -1,7 +1,7 @@
 #!/usr/bin/env node
-const sqlite3 = require('sqlite3').verbose();
 const path = require('path');
 const fs = require('fs');
+const { openDatabase, closeDatabase } = require('./sqlite-store');
 
 function getDebugModeFromConfig() {
     try {
@@ -34,44 +34,37 @@ const DEBUG_MODE = getDebugModeFromConfig();
 const dbPaths = getDbPaths(DEBUG_MODE);
 const DB_PATH = dbPaths.meme;
 
+async function upgradeWalletTables(db) {
+    // Database schema upgrade logic would be here
+    return Promise.resolve();
+}
+
+// Applied once per process by openDatabase(), tracked in schema_version
+const MIGRATIONS = [
+    {
+        version: 1,
+        description: 'upgrade wallet tables',
+        up: upgradeWalletTables
+    }
+];
+
 class WalletManager {
     constructor(dbFile) {
         this.dbFile = dbFile;
         this.db = null;
     }
 
-    async _upgradeTable() {
-        // Database schema upgrade logic would be here
-        return Promise.resolve();
-    }
-
-    connect() {
-        return new Promise(async (resolve, reject) => {
-            this.db = new sqlite3.Database(this.dbFile, async (err) => {
-                if (err) {
-                    reject(new Error(`Database connection error: ${err.message}`));
-                } else {
-                    try {
-                        await this._upgradeTable();
-                        resolve();
-                    } catch (upgradeErr) {
-                        reject(upgradeErr);
-                    }
-                }
-            });
-        });
+    async connect() {
+        if (!this.db) {
+            this.db = await openDatabase(this.dbFile, MIGRATIONS);
+        }
     }
 
-    close() {
-        return new Promise((resolve) => {
-            if (this.db) {
-                this.db.close((err) => {
-                    resolve();
-                });
-            } else {
-                resolve();
-            }
-        });
+    async close() {
+        if (this.db) {
+            this.db = null;
+            await closeDatabase(this.dbFile);
+        }
     }
 
     getRandomMemeKey() {
@@ -90,28 +83,15 @@ class WalletManager {
         });
     }
 
+    // Connection is opened (and migrated) once, then reused by every *WithConnect call
     async getRandomMemeKeyWithConnect() {
-        try {
-            await this.connect();
-            const key = await this.getRandomMemeKey();
-            await this.close();
-            return key;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getRandomMemeKey();
     }
 
     async deleteMemeKeyByPrivateKeyWithConnect(privateKey) {
-        try {
-            await this.connect();
-            const result = await this.deleteMemeKeyByPrivateKey(privateKey);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.deleteMemeKeyByPrivateKey(privateKey);
     }
 }
 
@@ -146,39 +126,18 @@ class CustomAddressManager extends WalletManager {
     }
 
     async getAvailableCustomEndingsWithConnect() {
-        try {
-            await this.connect();
-            const endings = await this.getAvailableCustomEndings();
-            await this.close();
-            return endings;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getAvailableCustomEndings();
     }
 
     async getCustomAddressByEndingWithConnect(ending) {
-        try {
-            await this.connect();
-            const address = await this.getCustomAddressByEnding(ending);
-            await this.close();
-            return address;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getCustomAddressByEnding(ending);
     }
 
     async markCustomAddressAsUsedWithConnect(ending, mintAddress = null) {
-        try {
-            await this.connect();
-            const result = await this.markCustomAddressAsUsed(ending, mintAddress);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.markCustomAddressAsUsed(ending, mintAddress);
     }
 }
 
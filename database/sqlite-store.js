@@ -0,0 +1,227 @@
+const sqlite3 = require('sqlite3').verbose();
+
+// One long-lived connection per database file, opened and migrated once per process
+const connections = new Map();
+const transactionQueues = new WeakMap();
+const statementCaches = new WeakMap();
+
+// Applied to every connection opened here (keep in sync with STORAGE_PROFILE in referrals/dao.py)
+const STORAGE_PROFILE = {
+    journalMode: 'WAL',               // readers don't block behind writers
+    synchronous: 'NORMAL',            // fsync on checkpoint only, safe with WAL
+    busyTimeoutMs: 5000,              // wait for locks instead of failing with SQLITE_BUSY
+    mmapSizeBytes: 256 * 1024 * 1024,
+    cacheSizeKb: 64 * 1024,
+    statementCacheSize: 64            // prepared statements kept per connection
+};
+
+const CREATE_SCHEMA_VERSION_TABLE = `
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at REAL DEFAULT (julianday('now'))
+    )
+`;
+
+function exec(db, sql) {
+    return new Promise((resolve, reject) => {
+        db.exec(sql, (err) => {
+            if (err) reject(err);
+            else resolve();
+        });
+    });
+}
+
+async function applyStorageProfile(db, profile = STORAGE_PROFILE) {
+    db.configure('busyTimeout', profile.busyTimeoutMs);
+    await exec(db, `
+        PRAGMA journal_mode = ${profile.journalMode};
+        PRAGMA synchronous = ${profile.synchronous};
+        PRAGMA mmap_size = ${profile.mmapSizeBytes};
+        PRAGMA cache_size = -${profile.cacheSizeKb};
+        PRAGMA temp_store = MEMORY;
+    `);
+}
+
+/**
+ * Prepared statement for sql, reused across calls on the same connection.
+ * node-sqlite3 queues operations per statement, so concurrent callers can share it.
+ */
+function prepare(db, sql) {
+    let cache = statementCaches.get(db);
+    if (!cache) {
+        cache = new Map();
+        statementCaches.set(db, cache);
+    }
+
+    let statement = cache.get(sql);
+    if (statement) {
+        // Refresh LRU position
+        cache.delete(sql);
+        cache.set(sql, statement);
+        return statement;
+    }
+
+    statement = db.prepare(sql);
+    cache.set(sql, statement);
+
+    if (cache.size > STORAGE_PROFILE.statementCacheSize) {
+        const [oldestSql, oldest] = cache.entries().next().value;
+        cache.delete(oldestSql);
+        oldest.finalize();
+    }
+
+    return statement;
+}
+
+function finalizeStatements(db) {
+    const cache = statementCaches.get(db);
+    if (!cache) return Promise.resolve();
+
+    statementCaches.delete(db);
+    return Promise.all([...cache.values()].map(statement =>
+        new Promise(resolve => statement.finalize(() => resolve()))));
+}
+
+function run(db, sql, params = []) {
+    return new Promise((resolve, reject) => {
+        prepare(db, sql).run(params, function (err) {
+            if (err) reject(err);
+            else resolve({ lastID: this.lastID, changes: this.changes });
+        });
+    });
+}
+
+function get(db, sql, params = []) {
+    return new Promise((resolve, reject) => {
+        const statement = prepare(db, sql);
+        statement.get(params, (err, row) => {
+            if (err) reject(err);
+            else resolve(row || null);
+        });
+        // Release the read cursor so WAL checkpoints aren't held back
+        statement.reset();
+    });
+}
+
+function all(db, sql, params = []) {
+    return new Promise((resolve, reject) => {
+        prepare(db, sql).all(params, (err, rows) => {
+            if (err) reject(err);
+            else resolve(rows || []);
+        });
+    });
+}
+
+/**
+ * Run fn inside BEGIN IMMEDIATE ... COMMIT.
+ * Transactions on the same connection are queued so concurrent callers never nest BEGIN.
+ */
+function transaction(db, fn) {
+    const previous = transactionQueues.get(db) || Promise.resolve();
+
+    const current = previous.then(async () => {
+        await run(db, 'BEGIN IMMEDIATE');
+        try {
+            const result = await fn();
+            await run(db, 'COMMIT');
+            return result;
+        } catch (error) {
+            await run(db, 'ROLLBACK').catch(() => {});
+            throw error;
+        }
+    });
+
+    transactionQueues.set(db, current.catch(() => {}));
+    return current;
+}
+
+/**
+ * Apply pending migrations in version order, each in its own transaction.
+ * A migration is { version, description, up } where up is a list of SQL
+ * statements or an async function receiving the connection.
+ */
+async function runMigrations(db, migrations) {
+    await exec(db, CREATE_SCHEMA_VERSION_TABLE);
+
+    const row = await get(db, 'SELECT MAX(version) AS version FROM schema_version');
+    const currentVersion = (row && row.version) || 0;
+
+    const pending = migrations
+        .filter(migration => migration.version > currentVersion)
+        .sort((a, b) => a.version - b.version);
+
+    for (const migration of pending) {
+        await transaction(db, async () => {
+            // Another process may have applied it while we were waiting for the lock
+            const applied = await get(db, 'SELECT 1 FROM schema_version WHERE version = ?', [migration.version]);
+            if (applied) return;
+
+            if (typeof migration.up === 'function') {
+                await migration.up(db);
+            } else {
+                for (const sql of migration.up) {
+                    await exec(db, sql);
+                }
+            }
+
+            await run(db, 'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                [migration.version, migration.description]);
+        });
+
+        console.log(`Migration ${migration.version} applied: ${migration.description}`);
+    }
+}
+
+function openDatabase(dbFile, migrations = []) {
+    if (!connections.has(dbFile)) {
+        const opening = new Promise((resolve, reject) => {
+            const db = new sqlite3.Database(dbFile, (err) => {
+                if (err) reject(new Error(`DB connection error: ${err.message}`));
+                else resolve(db);
+            });
+        }).then(async (db) => {
+            await applyStorageProfile(db);
+            await runMigrations(db, migrations);
+            return db;
+        });
+
+        // Don't cache a failed open, the next call retries
+        opening.catch(() => connections.delete(dbFile));
+        connections.set(dbFile, opening);
+    }
+
+    return connections.get(dbFile);
+}
+
+async function closeDatabase(dbFile) {
+    const opening = connections.get(dbFile);
+    if (!opening) return;
+
+    connections.delete(dbFile);
+
+    let db;
+    try {
+        db = await opening;
+    } catch (error) {
+        return;
+    }
+
+    await (transactionQueues.get(db) || Promise.resolve());
+    await finalizeStatements(db);
+    await new Promise(resolve => db.close(() => resolve()));
+}
+
+module.exports = {
+    STORAGE_PROFILE,
+    applyStorageProfile,
+    openDatabase,
+    closeDatabase,
+    runMigrations,
+    transaction,
+    prepare,
+    exec,
+    run,
+    get,
+    all
+};
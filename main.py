@@ -73,6 +73,25 @@ async def main():
         else:
             logger.warning("Support bot disabled due to invalid token")
 
+        from referrals.middleware import init_referral_db
+        if await init_referral_db():
+            logger.info("Referral DB ready")
+
+        from utils.blockhash_service import blockhash_service
+        if await blockhash_service.start():
+            logger.info(f"Blockhash service ready on port {blockhash_service.port}")
+
+        from utils.js_worker_pool import js_worker_pool
+        if js_worker_pool.size > 0:
+            await js_worker_pool.start()
+            logger.info(f"Node worker pool ready: {js_worker_pool.stats()['workers']} workers")
+
+        from utils.creation_jobs import creation_jobs
+        if creation_jobs.workers > 0:
+            from bot import run_creation_job, notify_creation_position
+            recovered = await creation_jobs.start(run_creation_job, notify_creation_position)
+            logger.info(f"Creation queue started: {creation_jobs.workers} workers, {recovered} interrupted jobs resumed")
+
         await asyncio.sleep(2)
         logger.info("Starting polling...")
 
@@ -106,6 +125,41 @@ async def main():
         except Exception as e:
             logger.error(f"Error closing payment session: {e}")
 
+        try:
+            from utils.creation_jobs import creation_jobs
+            await creation_jobs.close()
+            logger.info("Creation queue stopped")
+        except Exception as e:
+            logger.error(f"Error stopping creation queue: {e}")
+
+        try:
+            from utils.js_worker_pool import js_worker_pool
+            await js_worker_pool.close()
+            logger.info("Node worker pool stopped")
+        except Exception as e:
+            logger.error(f"Error stopping Node worker pool: {e}")
+
+        try:
+            from utils.blockhash_service import blockhash_service
+            await blockhash_service.close()
+            logger.info("Blockhash service stopped")
+        except Exception as e:
+            logger.error(f"Error stopping blockhash service: {e}")
+
+        try:
+            from referrals.middleware import flush_referral_writes
+            flushed = await flush_referral_writes()
+            logger.info(f"Referral DB pending writes flushed: {flushed}")
+        except Exception as e:
+            logger.error(f"Error flushing referral DB writes: {e}")
+
+        try:
+            from referrals.middleware import close_referral_db
+            await close_referral_db()
+            logger.info("Referral DB closed")
+        except Exception as e:
+            logger.error(f"Error closing referral DB: {e}")
+
         try:
             await bot.session.close()
             logger.info("Main bot session closed")
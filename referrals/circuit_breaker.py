@@ -0,0 +1,110 @@
+"""Circuit breaker for calls to the referral DB bridge"""
+import logging
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the bridge while the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    closed:    calls go through; `failure_threshold` consecutive failures open the circuit.
+    open:      calls fail immediately with CircuitOpenError for `reset_timeout` seconds.
+    half_open: up to `half_open_probes` calls go through as probes; a successful probe
+               closes the circuit, a failed one opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, half_open_probes=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probes_in_flight = 0
+
+        self.rejected = 0
+        self.times_opened = 0
+        self.last_error = None
+
+    def allow(self):
+        """
+        Reserve a call slot; raises CircuitOpenError if the call must fail fast.
+        Returns True when the call is a half-open probe, which must end in record_success,
+        record_failure or release.
+        """
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                raise CircuitOpenError(f"{self.name} circuit is half-open, probe in progress")
+            self._probes_in_flight += 1
+            return True
+        return False
+
+    def release(self, probe):
+        """Free the probe slot of a call that ended without an outcome (cancelled, never sent)"""
+        if probe and self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record_success(self):
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._set_state(CLOSED)
+        self.consecutive_failures = 0
+
+    def record_failure(self, error):
+        self.last_error = str(error) or type(error).__name__
+        self.consecutive_failures += 1
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._open()
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def reset(self):
+        """Force the circuit closed (admin)"""
+        self._probes_in_flight = 0
+        self.consecutive_failures = 0
+        self._set_state(CLOSED)
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        if state != self.state:
+            log = logging.warning if state == OPEN else logging.info
+            log(f"{self.name} circuit {self.state} -> {state}"
+                + (f" after {self.consecutive_failures} failures: {self.last_error}" if state == OPEN else ""))
+            self.state = state
+            if state != HALF_OPEN:
+                self._probes_in_flight = 0
+
+    @property
+    def is_open(self):
+        return self.state == OPEN and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'open_for_s': round(time.monotonic() - self.opened_at, 1) if self.state == OPEN else 0,
+            'times_opened': self.times_opened,
+            'rejected': self.rejected,
+            'last_error': self.last_error,
+        }
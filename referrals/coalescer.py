@@ -0,0 +1,80 @@
+"""Micro-batching of concurrent per-user referral DB reads"""
+import asyncio
+
+
+class ReadCoalescer:
+    """
+    Collects load(key) calls arriving within `window` seconds and resolves them
+    with a single fetch_batch(keys) call, fanning the results back out.
+    Callers asking for the same key in one window share a single slot in the batch.
+
+    fetch_batch must return a dict {key: value}; keys it doesn't return resolve to `default`.
+    """
+
+    def __init__(self, fetch_batch, window=0.005, max_batch_size=100, default=None):
+        self.fetch_batch = fetch_batch
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.default = default
+
+        self._waiting = {}
+        self._flush_handle = None
+
+        self.requests = 0
+        self.batches = 0
+        self.keys_fetched = 0
+        self.largest_batch = 0
+        self.errors = 0
+
+    async def load(self, key):
+        self.requests += 1
+
+        future = self._waiting.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[key] = future
+
+            if len(self._waiting) >= self.max_batch_size:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+
+        # shield: one caller timing out must not cancel the result for the others
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._waiting = self._waiting, {}
+        if batch:
+            asyncio.create_task(self._resolve(batch))
+
+    async def _resolve(self, batch):
+        self.batches += 1
+        self.keys_fetched += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        try:
+            results = await self.fetch_batch(list(batch))
+        except Exception as e:
+            self.errors += 1
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key, self.default))
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'avg_batch_size': round(self.keys_fetched / self.batches, 2) if self.batches else 0,
+            'largest_batch': self.largest_batch,
+            'coalesced': self.requests - self.keys_fetched - len(self._waiting),
+            'errors': self.errors,
+        }
@@ -0,0 +1,36 @@
+"""Referral code derivation (keep in sync with generateReferralCode in db-manager.js)"""
+import hashlib
+from config import REFERRAL_CODE_SECRET
+
+REFERRAL_CODE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+REFERRAL_CODE_LENGTH = 6
+
+
+def generate_referral_code(user_id):
+    """Generate deterministic referral code from user_id - secure version"""
+    combined = f"{REFERRAL_CODE_SECRET}_{user_id}_{REFERRAL_CODE_SECRET}"
+
+    hash_object = hashlib.sha256(combined.encode())
+    hash_hex = hash_object.hexdigest()
+
+    hash_value = int(hash_hex[:12], 16)
+
+    code = ""
+
+    for _ in range(REFERRAL_CODE_LENGTH):
+        code = REFERRAL_CODE_CHARS[hash_value % 36] + code
+        hash_value //= 36
+
+    return code
+
+
+def parse_referral_code(code):
+    """Check if referral code is valid"""
+    if not code or len(code) != REFERRAL_CODE_LENGTH:
+        return None
+
+    for char in code.upper():
+        if char not in REFERRAL_CODE_CHARS:
+            return None
+
+    return code.upper()
@@ -0,0 +1,504 @@
+"""In-process async data access for the referral database (same schema as db-manager.js)"""
+import logging
+import asyncio
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from config import DEBUG_MODE
+from referrals.codes import generate_referral_code
+
+
+def get_referral_db_path(debug_mode):
+    db_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(db_dir, 'referrals_test.db' if debug_mode else 'referrals.db')
+
+
+DB_PATH = get_referral_db_path(DEBUG_MODE)
+
+CREATE_USERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        wallet_address TEXT,
+        referred_by INTEGER,
+        total_earned_tokens REAL DEFAULT 0,
+        total_earned_custom REAL DEFAULT 0,
+        total_referrals INTEGER DEFAULT 0,
+        bonus_custom_addresses INTEGER DEFAULT 3,
+        welcome_message_shown INTEGER DEFAULT 0,
+        created_at REAL DEFAULT (julianday('now')),
+        updated_at REAL DEFAULT (julianday('now')),
+        FOREIGN KEY (referred_by) REFERENCES users (user_id)
+    )
+"""
+
+CREATE_PAYMENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS referral_payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        referrer_id INTEGER NOT NULL,
+        referred_user_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        payment_type TEXT NOT NULL,
+        tx_hash TEXT,
+        created_at REAL DEFAULT (julianday('now')),
+        FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+        FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
+    )
+"""
+
+CREATE_SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at REAL DEFAULT (julianday('now'))
+    )
+"""
+
+# (version, description, statements) - keep in sync with MIGRATIONS in db-manager.js
+MIGRATIONS = [
+    (1, 'create users and referral_payments tables', [CREATE_USERS_TABLE, CREATE_PAYMENTS_TABLE]),
+    (2, 'backfill NULL bonus_custom_addresses',
+     ['UPDATE users SET bonus_custom_addresses = 3 WHERE bonus_custom_addresses IS NULL']),
+    # Existing rows are filled by backfill_referral_codes(), codes can't be computed in SQL
+    (3, 'add users.referral_code with unique index',
+     ['ALTER TABLE users ADD COLUMN referral_code TEXT',
+      'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_referral_code ON users (referral_code)']),
+    # Lamport columns are authoritative, the REAL SOL columns are kept equal to them / 1e9
+    (4, 'lamport amounts, maintained referral aggregates, payment history index',
+     ['ALTER TABLE referral_payments ADD COLUMN amount_lamports INTEGER',
+      'UPDATE referral_payments SET amount_lamports = CAST(ROUND(amount * 1000000000) AS INTEGER)',
+      'ALTER TABLE users ADD COLUMN total_earned_tokens_lamports INTEGER DEFAULT 0',
+      'ALTER TABLE users ADD COLUMN total_earned_custom_lamports INTEGER DEFAULT 0',
+      'ALTER TABLE users ADD COLUMN total_payments INTEGER DEFAULT 0',
+      """UPDATE users SET
+             total_earned_tokens_lamports = COALESCE((SELECT SUM(amount_lamports) FROM referral_payments
+                 WHERE referrer_id = users.user_id AND payment_type = 'token'), 0),
+             total_earned_custom_lamports = COALESCE((SELECT SUM(amount_lamports) FROM referral_payments
+                 WHERE referrer_id = users.user_id AND payment_type = 'custom'), 0),
+             total_payments = (SELECT COUNT(*) FROM referral_payments WHERE referrer_id = users.user_id),
+             total_referrals = (SELECT COUNT(*) FROM users r
+                 WHERE r.referred_by = users.user_id AND r.user_id != users.user_id)""",
+      """UPDATE users SET
+             total_earned_tokens = total_earned_tokens_lamports / 1000000000.0,
+             total_earned_custom = total_earned_custom_lamports / 1000000000.0""",
+      """CREATE INDEX IF NOT EXISTS idx_referral_payments_referrer_created
+             ON referral_payments (referrer_id, created_at, id)"""]),
+]
+
+# Keep in sync with STORAGE_PROFILE in database/sqlite-store.js
+STORAGE_PROFILE = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout_ms': 5000,
+    'mmap_size_bytes': 256 * 1024 * 1024,
+    'cache_size_kb': 64 * 1024,
+    'statement_cache_size': 64,
+}
+
+NO_REFERRER = -1
+REFERRAL_CODE_BACKFILL_BATCH = 1000
+LAMPORTS_PER_SOL = 1_000_000_000
+PAYMENTS_PAGE_SIZE = 10
+
+# payment_type -> users column holding its running total
+EARNINGS_COLUMNS = {
+    'token': 'total_earned_tokens',
+    'custom': 'total_earned_custom',
+}
+
+
+def sol_to_lamports(amount):
+    return round(float(amount) * LAMPORTS_PER_SOL)
+
+
+def parse_payments_cursor(cursor):
+    """Keyset cursor for payment history: "<created_at>:<id>" of the last row on the previous page"""
+    if not cursor:
+        return None
+    try:
+        created_at, payment_id = str(cursor).split(':')
+        return float(created_at), int(payment_id)
+    except ValueError:
+        return None
+
+
+def apply_storage_profile(db, profile=STORAGE_PROFILE):
+    """WAL journal, relaxed fsync, busy timeout and bigger page cache / mmap"""
+    db.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    db.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+    db.execute(f"PRAGMA busy_timeout = {profile['busy_timeout_ms']}")
+    db.execute(f"PRAGMA mmap_size = {profile['mmap_size_bytes']}")
+    db.execute(f"PRAGMA cache_size = -{profile['cache_size_kb']}")
+    db.execute("PRAGMA temp_store = MEMORY")
+
+
+class ReferralDao:
+    """
+    Async counterpart of ReferralDbManager.
+    All queries run on one dedicated thread that owns a single shared connection,
+    so callers never block the event loop and never open/close the DB per call.
+    Method names match db-manager.js, including the *WithConnect variants.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='referral-db')
+
+    # Thread side (only ever called on the executor thread)
+
+    def _connection(self):
+        if self.db is None:
+            db = sqlite3.connect(
+                self.db_file,
+                isolation_level=None,
+                timeout=STORAGE_PROFILE['busy_timeout_ms'] / 1000,
+                cached_statements=STORAGE_PROFILE['statement_cache_size']
+            )
+            db.row_factory = sqlite3.Row
+            self.db = db
+            try:
+                apply_storage_profile(db)
+                self._migrate()
+            except Exception:
+                self.db = None
+                db.close()
+                raise
+        return self.db
+
+    @contextmanager
+    def _transaction(self):
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.db
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+        else:
+            self.db.execute('COMMIT')
+
+    def _migrate(self):
+        """Apply pending migrations once per connection, tracked in schema_version"""
+        self.db.execute(CREATE_SCHEMA_VERSION_TABLE)
+        current_version = self.db.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            with self._transaction() as db:
+                # Another process may have applied it while we were waiting for the lock
+                if db.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                    continue
+                for sql in statements:
+                    db.execute(sql)
+                db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+
+            logging.info(f"Referral DB migration {version} applied: {description}")
+
+    def _close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def _fetch_one(self, sql, params=()):
+        row = self._connection().execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    def _fetch_all(self, sql, params=()):
+        return [dict(row) for row in self._connection().execute(sql, params).fetchall()]
+
+    def _execute(self, sql, params=()):
+        self._connection()
+        with self._transaction() as db:
+            return db.execute(sql, params).rowcount
+
+    def _store_referral_code(self, user_id):
+        """A code colliding with another user's stays NULL and is resolved by the fallback scan"""
+        return self.db.execute(
+            'UPDATE OR IGNORE users SET referral_code = ? WHERE user_id = ?',
+            (generate_referral_code(user_id), user_id)
+        ).rowcount
+
+    def _increment_referrals(self, referrer_id):
+        self.db.execute('UPDATE users SET total_referrals = total_referrals + 1 WHERE user_id = ?', (referrer_id,))
+
+    def _add_or_update_user(self, user_id, username=None, referred_by=None):
+        self._connection()
+        with self._transaction() as db:
+            existing = db.execute('SELECT referred_by FROM users WHERE user_id = ?', (user_id,)).fetchone()
+
+            if existing is None:
+                db.execute(
+                    'INSERT INTO users (user_id, username, referred_by) VALUES (?, ?, ?)',
+                    (user_id, username, referred_by if referred_by is not None else NO_REFERRER)
+                )
+                self._store_referral_code(user_id)
+                if referred_by is not None and referred_by != user_id:
+                    self._increment_referrals(referred_by)
+                return {'updated': True, 'newUser': True, 'referrerSet': referred_by is not None}
+
+            referrer_set = (
+                referred_by is not None and
+                referred_by != user_id and
+                existing['referred_by'] is None
+            )
+            if referrer_set:
+                self._increment_referrals(referred_by)
+
+            db.execute(
+                """UPDATE users SET
+                       username = COALESCE(?, username),
+                       referred_by = CASE WHEN ? THEN ? ELSE referred_by END,
+                       updated_at = julianday('now')
+                   WHERE user_id = ?""",
+                (username, referrer_set, referred_by, user_id)
+            )
+            return {'updated': True, 'newUser': False, 'referrerSet': referrer_set}
+
+    def _update_usernames(self, updates):
+        self._connection()
+        with self._transaction() as db:
+            return db.executemany(
+                "UPDATE users SET username = ?, updated_at = julianday('now') WHERE user_id = ?",
+                [(username, user_id) for user_id, username in updates]
+            ).rowcount
+
+    def _get_referrer(self, user_id):
+        return self._fetch_one(
+            """SELECT r.* FROM users u
+               JOIN users r ON r.user_id = u.referred_by
+               WHERE u.user_id = ? AND u.referred_by > 0""",
+            (user_id,)
+        )
+
+    def _get_bonus_custom_addresses(self, user_id):
+        row = self._fetch_one('SELECT bonus_custom_addresses FROM users WHERE user_id = ?', (user_id,))
+        if row is None or row['bonus_custom_addresses'] is None:
+            return 0
+        return row['bonus_custom_addresses']
+
+    def _find_referrer_by_code(self, referral_code):
+        row = self._fetch_one('SELECT user_id FROM users WHERE referral_code = ?', (referral_code,))
+        if row is not None:
+            return row['user_id']
+
+        # Rows not backfilled yet, or whose code collided with another user's
+        for row in self.db.execute('SELECT user_id FROM users WHERE referral_code IS NULL'):
+            if generate_referral_code(row['user_id']) == referral_code:
+                return row['user_id']
+        return None
+
+    def _backfill_referral_codes(self, batch_size=REFERRAL_CODE_BACKFILL_BATCH):
+        """Fill referral_code for rows created before migration 3, one transaction per batch"""
+        self._connection()
+        last_user_id = -1
+        filled = 0
+
+        while True:
+            rows = self.db.execute(
+                'SELECT user_id FROM users WHERE referral_code IS NULL AND user_id > ? ORDER BY user_id LIMIT ?',
+                (last_user_id, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            with self._transaction():
+                for row in rows:
+                    filled += self._store_referral_code(row['user_id'])
+            last_user_id = rows[-1]['user_id']
+
+        return filled
+
+    def _set_referrer_by_code(self, user_id, referral_code):
+        referrer_id = self._find_referrer_by_code(referral_code)
+
+        if not referrer_id:
+            return {'success': False, 'reason': 'referrer_not_found'}
+        if referrer_id == user_id:
+            return {'success': False, 'reason': 'self_referral'}
+
+        result = self._add_or_update_user(user_id, None, referrer_id)
+        if not result['referrerSet']:
+            return {'success': False, 'reason': 'already_has_referrer'}
+        return {'success': True, 'referrerId': referrer_id}
+
+    def _record_payment(self, referrer_id, referred_user_id, amount, payment_type, tx_hash=None):
+        """Insert a payout and bump the referrer's totals in the same transaction (amount in SOL)"""
+        amount_lamports = sol_to_lamports(amount)
+        earnings_column = EARNINGS_COLUMNS.get(payment_type)
+
+        self._connection()
+        with self._transaction() as db:
+            db.execute(
+                """INSERT INTO referral_payments
+                       (referrer_id, referred_user_id, amount, amount_lamports, payment_type, tx_hash)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (referrer_id, referred_user_id, amount_lamports / LAMPORTS_PER_SOL, amount_lamports,
+                 payment_type, tx_hash)
+            )
+
+            if earnings_column:
+                db.execute(
+                    f"""UPDATE users SET
+                           {earnings_column}_lamports = {earnings_column}_lamports + ?,
+                           {earnings_column} = ({earnings_column}_lamports + ?) / {LAMPORTS_PER_SOL}.0,
+                           total_payments = total_payments + 1
+                       WHERE user_id = ?""",
+                    (amount_lamports, amount_lamports, referrer_id)
+                )
+            else:
+                db.execute('UPDATE users SET total_payments = total_payments + 1 WHERE user_id = ?', (referrer_id,))
+
+    def _get_user_stats(self, user_id, cursor=None, limit=PAYMENTS_PAGE_SIZE):
+        """Totals from the users row plus one page of payment history, newest first"""
+        user_info = self._fetch_one('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        after = parse_payments_cursor(cursor)
+
+        if after:
+            payments = self._fetch_all(
+                """SELECT * FROM referral_payments
+                   WHERE referrer_id = ? AND (created_at, id) < (?, ?)
+                   ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (user_id, after[0], after[1], limit)
+            )
+        else:
+            payments = self._fetch_all(
+                """SELECT * FROM referral_payments
+                   WHERE referrer_id = ?
+                   ORDER BY created_at DESC, id DESC LIMIT ?""",
+                (user_id, limit)
+            )
+
+        next_cursor = None
+        if len(payments) == limit:
+            next_cursor = f"{payments[-1]['created_at']!r}:{payments[-1]['id']}"
+
+        return {
+            'userInfo': user_info,
+            'payments': payments,
+            'paymentsCount': user_info['total_payments'] if user_info else 0,
+            'nextCursor': next_cursor
+        }
+
+    # Async side
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def call(self, method_name, *args):
+        """Call DAO method by its db-manager.js name"""
+        method = getattr(self, method_name, None)
+        if method_name.startswith('_') or not callable(method):
+            raise AttributeError(f"Unknown method: {method_name}")
+        return await method(*args)
+
+    async def connect(self):
+        await self._run(self._connection)
+
+    async def close(self):
+        await self._run(self._close)
+
+    async def markWelcomeMessageShown(self, user_id):
+        await self._run(self._execute, 'UPDATE users SET welcome_message_shown = 1 WHERE user_id = ?', (user_id,))
+        return True
+
+    async def wasWelcomeMessageShown(self, user_id):
+        row = await self._run(self._fetch_one, 'SELECT welcome_message_shown FROM users WHERE user_id = ?', (user_id,))
+        return bool(row and row['welcome_message_shown'])
+
+    async def addOrUpdateUser(self, user_id, username=None, referred_by=None):
+        return await self._run(self._add_or_update_user, user_id, username, referred_by)
+
+    async def updateUsernames(self, updates):
+        """Buffered username refreshes, [[user_id, username], ...] written in one transaction"""
+        return await self._run(self._update_usernames, updates)
+
+    async def setWalletAddress(self, user_id, wallet_address):
+        updated = await self._run(
+            self._execute,
+            "UPDATE users SET wallet_address = ?, updated_at = julianday('now') WHERE user_id = ?",
+            (wallet_address, user_id)
+        )
+        return updated > 0
+
+    async def removeWalletAddress(self, user_id):
+        updated = await self._run(
+            self._execute,
+            "UPDATE users SET wallet_address = NULL, updated_at = julianday('now') WHERE user_id = ?",
+            (user_id,)
+        )
+        return updated > 0
+
+    async def getUserInfo(self, user_id):
+        return await self._run(self._fetch_one, 'SELECT * FROM users WHERE user_id = ?', (user_id,))
+
+    # Batch reads take the ids as one JSON array parameter, so every batch size shares one cached statement
+    async def getUsersInfo(self, user_ids):
+        return await self._run(
+            self._fetch_all,
+            'SELECT * FROM users WHERE user_id IN (SELECT value FROM json_each(?))',
+            (json.dumps(user_ids),)
+        )
+
+    async def getBonusCustomAddressesForUsers(self, user_ids):
+        return await self._run(
+            self._fetch_all,
+            'SELECT user_id, bonus_custom_addresses FROM users WHERE user_id IN (SELECT value FROM json_each(?))',
+            (json.dumps(user_ids),)
+        )
+
+    async def getReferrer(self, user_id):
+        return await self._run(self._get_referrer, user_id)
+
+    async def getBonusCustomAddresses(self, user_id):
+        return await self._run(self._get_bonus_custom_addresses, user_id)
+
+    async def useBonusCustomAddress(self, user_id):
+        updated = await self._run(
+            self._execute,
+            """UPDATE users SET bonus_custom_addresses = bonus_custom_addresses - 1, updated_at = julianday('now')
+               WHERE user_id = ? AND bonus_custom_addresses > 0""",
+            (user_id,)
+        )
+        return updated > 0
+
+    async def findReferrerByCode(self, referral_code):
+        return await self._run(self._find_referrer_by_code, referral_code)
+
+    async def setReferrerByCode(self, user_id, referral_code):
+        return await self._run(self._set_referrer_by_code, user_id, referral_code)
+
+    async def backfillReferralCodes(self, batch_size=REFERRAL_CODE_BACKFILL_BATCH):
+        return await self._run(self._backfill_referral_codes, batch_size)
+
+    async def recordPayment(self, referrer_id, referred_user_id, amount, payment_type, tx_hash=None):
+        await self._run(self._record_payment, referrer_id, referred_user_id, amount, payment_type, tx_hash)
+
+    async def getUserStats(self, user_id, cursor=None, limit=PAYMENTS_PAGE_SIZE):
+        return await self._run(self._get_user_stats, user_id, cursor, limit)
+
+    # The connection is shared and stays open, so *WithConnect is the same call
+    markWelcomeMessageShownWithConnect = markWelcomeMessageShown
+    wasWelcomeMessageShownWithConnect = wasWelcomeMessageShown
+    addOrUpdateUserWithConnect = addOrUpdateUser
+    updateUsernamesWithConnect = updateUsernames
+    setWalletAddressWithConnect = setWalletAddress
+    removeWalletAddressWithConnect = removeWalletAddress
+    getUserInfoWithConnect = getUserInfo
+    getUsersInfoWithConnect = getUsersInfo
+    getBonusCustomAddressesForUsersWithConnect = getBonusCustomAddressesForUsers
+    getReferrerWithConnect = getReferrer
+    getBonusCustomAddressesWithConnect = getBonusCustomAddresses
+    useBonusCustomAddressWithConnect = useBonusCustomAddress
+    findReferrerByCodeWithConnect = findReferrerByCode
+    setReferrerByCodeWithConnect = setReferrerByCode
+    backfillReferralCodesWithConnect = backfillReferralCodes
+    recordPaymentWithConnect = recordPayment
+    getUserStatsWithConnect = getUserStats
+
+
+referral_dao = ReferralDao(DB_PATH)
@@ -1,7 +1,8 @@
 #!/usr/bin/env node
-const sqlite3 = require('sqlite3').verbose();
 const path = require('path');
 const fs = require('fs');
+const crypto = require('crypto');
+const { openDatabase, closeDatabase, transaction, run, get, all } = require('../database/sqlite-store');
 
 function getDebugModeFromConfig() {
     try {
@@ -14,6 +15,18 @@ function getDebugModeFromConfig() {
     }
 }
 
+// Must match REFERRAL_CODE_SECRET used by referrals/codes.py, otherwise links from /referral won't resolve
+function getReferralCodeSecretFromConfig() {
+    try {
+        const configPath = path.join(__dirname, '..', 'config.py');
+        const configContent = fs.readFileSync(configPath, 'utf-8');
+        const secretMatch = configContent.match(/REFERRAL_CODE_SECRET\s*=\s*['"]([^'"]*)['"]/);
+        return secretMatch ? secretMatch[1] : 'your_secret_key_here_change_in_production';
+    } catch (error) {
+        return 'your_secret_key_here_change_in_production';
+    }
+}
+
 function getReferralDbPath(debugMode) {
     const dbDir = __dirname;
     return path.join(dbDir, debugMode ? 'referrals_test.db' : 'referrals.db');
@@ -22,6 +35,123 @@ function getReferralDbPath(debugMode) {
 const DEBUG_MODE = getDebugModeFromConfig();
 const DB_PATH = getReferralDbPath(DEBUG_MODE);
 
+const REFERRAL_CODE_SECRET = getReferralCodeSecretFromConfig();
+
+const NO_REFERRER = -1;
+const REFERRAL_CODE_BACKFILL_BATCH = 1000;
+const LAMPORTS_PER_SOL = 1000000000;
+const PAYMENTS_PAGE_SIZE = 10;
+
+// payment_type -> users column holding its running total
+const EARNINGS_COLUMNS = {
+    token: 'total_earned_tokens',
+    custom: 'total_earned_custom'
+};
+
+// Applied once per process by openDatabase(), tracked in schema_version.
+// Keep in sync with MIGRATIONS in referrals/dao.py
+const MIGRATIONS = [
+    {
+        version: 1,
+        description: 'create users and referral_payments tables',
+        up: [
+            `CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                wallet_address TEXT,
+                referred_by INTEGER,
+                total_earned_tokens REAL DEFAULT 0,
+                total_earned_custom REAL DEFAULT 0,
+                total_referrals INTEGER DEFAULT 0,
+                bonus_custom_addresses INTEGER DEFAULT 3,
+                welcome_message_shown INTEGER DEFAULT 0,
+                created_at REAL DEFAULT (julianday('now')),
+                updated_at REAL DEFAULT (julianday('now')),
+                FOREIGN KEY (referred_by) REFERENCES users (user_id)
+            )`,
+            `CREATE TABLE IF NOT EXISTS referral_payments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                referrer_id INTEGER NOT NULL,
+                referred_user_id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                payment_type TEXT NOT NULL,
+                tx_hash TEXT,
+                created_at REAL DEFAULT (julianday('now')),
+                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+                FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
+            )`
+        ]
+    },
+    {
+        version: 2,
+        description: 'backfill NULL bonus_custom_addresses',
+        up: ['UPDATE users SET bonus_custom_addresses = 3 WHERE bonus_custom_addresses IS NULL']
+    },
+    {
+        // Existing rows are filled by backfillReferralCodes(), codes can't be computed in SQL
+        version: 3,
+        description: 'add users.referral_code with unique index',
+        up: [
+            'ALTER TABLE users ADD COLUMN referral_code TEXT',
+            'CREATE UNIQUE INDEX IF NOT EXISTS idx_users_referral_code ON users (referral_code)'
+        ]
+    },
+    {
+        // Lamport columns are authoritative, the REAL SOL columns are kept equal to them / 1e9
+        version: 4,
+        description: 'lamport amounts, maintained referral aggregates, payment history index',
+        up: [
+            'ALTER TABLE referral_payments ADD COLUMN amount_lamports INTEGER',
+            'UPDATE referral_payments SET amount_lamports = CAST(ROUND(amount * 1000000000) AS INTEGER)',
+            'ALTER TABLE users ADD COLUMN total_earned_tokens_lamports INTEGER DEFAULT 0',
+            'ALTER TABLE users ADD COLUMN total_earned_custom_lamports INTEGER DEFAULT 0',
+            'ALTER TABLE users ADD COLUMN total_payments INTEGER DEFAULT 0',
+            `UPDATE users SET
+                 total_earned_tokens_lamports = COALESCE((SELECT SUM(amount_lamports) FROM referral_payments
+                     WHERE referrer_id = users.user_id AND payment_type = 'token'), 0),
+                 total_earned_custom_lamports = COALESCE((SELECT SUM(amount_lamports) FROM referral_payments
+                     WHERE referrer_id = users.user_id AND payment_type = 'custom'), 0),
+                 total_payments = (SELECT COUNT(*) FROM referral_payments WHERE referrer_id = users.user_id),
+                 total_referrals = (SELECT COUNT(*) FROM users r
+                     WHERE r.referred_by = users.user_id AND r.user_id != users.user_id)`,
+            `UPDATE users SET
+                 total_earned_tokens = total_earned_tokens_lamports / 1000000000.0,
+                 total_earned_custom = total_earned_custom_lamports / 1000000000.0`,
+            `CREATE INDEX IF NOT EXISTS idx_referral_payments_referrer_created
+                 ON referral_payments (referrer_id, created_at, id)`
+        ]
+    }
+];
+
+function solToLamports(amount) {
+    return Math.round(Number(amount) * LAMPORTS_PER_SOL);
+}
+
+// Keyset cursor for payment history: "<created_at>:<id>" of the last row on the previous page
+function parsePaymentsCursor(cursor) {
+    if (!cursor) return null;
+    const [createdAt, id] = String(cursor).split(':').map(Number);
+    if (!Number.isFinite(createdAt) || !Number.isInteger(id)) return null;
+    return { createdAt, id };
+}
+
+function generateReferralCode(userId) {
+    const combined = `${REFERRAL_CODE_SECRET}_${userId}_${REFERRAL_CODE_SECRET}`;
+    const hash = crypto.createHash('sha256').update(combined).digest('hex');
+    const hashValue = parseInt(hash.substring(0, 12), 16);
+
+    const chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789";
+    let code = "";
+    let value = hashValue;
+
+    for (let i = 0; i < 6; i++) {
+        code = chars[value % 36] + code;
+        value = Math.floor(value / 36);
+    }
+
+    return code;
+}
+
 class ReferralDbManager {
     constructor(dbFile) {
         this.dbFile = dbFile;
@@ -29,373 +159,366 @@ class ReferralDbManager {
     }
 
     async connect() {
-        return new Promise(async (resolve, reject) => {
-            this.db = new sqlite3.Database(this.dbFile, async (err) => {
-                if (err) {
-                    reject(new Error(`DB connection error: ${err.message}`));
-                } else {
-                    try {
-                        await this.createTables();
-                        resolve();
-                    } catch (createErr) {
-                        reject(createErr);
-                    }
-                }
-            });
-        });
+        if (!this.db) {
+            this.db = await openDatabase(this.dbFile, MIGRATIONS);
+        }
     }
 
-    async createTables() {
-        return new Promise((resolve, reject) => {
-            const createUsersTable = `
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    wallet_address TEXT,
-                    referred_by INTEGER,
-                    total_earned_tokens REAL DEFAULT 0,
-                    total_earned_custom REAL DEFAULT 0,
-                    total_referrals INTEGER DEFAULT 0,
-                    bonus_custom_addresses INTEGER DEFAULT 3,
-                    welcome_message_shown INTEGER DEFAULT 0,
-                    created_at REAL DEFAULT (julianday('now')),
-                    updated_at REAL DEFAULT (julianday('now')),
-                    FOREIGN KEY (referred_by) REFERENCES users (user_id)
-                )
-            `;
-
-            const createPaymentsTable = `
-                CREATE TABLE IF NOT EXISTS referral_payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER NOT NULL,
-                    referred_user_id INTEGER NOT NULL,
-                    amount REAL NOT NULL,
-                    payment_type TEXT NOT NULL,
-                    tx_hash TEXT,
-                    created_at REAL DEFAULT (julianday('now')),
-                    FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                    FOREIGN KEY (referred_user_id) REFERENCES users (user_id)
-                )
-            `;
-
-            this.db.run(createUsersTable, (err) => {
-                if (err) {
-                    reject(new Error(`Error creating users table: ${err.message}`));
-                    return;
-                }
+    async close() {
+        if (this.db) {
+            this.db = null;
+            await closeDatabase(this.dbFile);
+        }
+    }
 
-                this.db.run(createPaymentsTable, (err) => {
-                    if (err) {
-                        reject(new Error(`Error creating payments table: ${err.message}`));
-                        return;
-                    }
-
-                    this.db.run(
-                        'UPDATE users SET bonus_custom_addresses = 3 WHERE bonus_custom_addresses IS NULL',
-                        (migrationErr) => {
-                            if (migrationErr) {
-                                console.error('Migration warning:', migrationErr.message);
-                            }
-                            resolve();
-                        }
-                    );
-                });
-            });
-        });
+    // A code colliding with another user's stays NULL and is resolved by findReferrerByCode's fallback scan
+    _storeReferralCode(userId) {
+        return run(this.db, 'UPDATE OR IGNORE users SET referral_code = ? WHERE user_id = ?',
+            [generateReferralCode(userId), userId]);
     }
 
-    markWelcomeMessageShown(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would mark welcome message as shown
-            resolve(true);
-        });
+    _incrementReferrals(referrerId) {
+        return run(this.db, 'UPDATE users SET total_referrals = total_referrals + 1 WHERE user_id = ?', [referrerId]);
     }
 
-    wasWelcomeMessageShown(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would check if welcome message was shown
-            resolve(false);
-        });
+    // Single-statement writes share the transaction queue so they never land inside another caller's transaction
+    _write(sql, params) {
+        return transaction(this.db, () => run(this.db, sql, params));
     }
 
-    close() {
-        return new Promise((resolve) => {
-            if (this.db) {
-                this.db.close((err) => {
-                    resolve();
-                });
-            } else {
-                resolve();
-            }
-        });
+    async markWelcomeMessageShown(userId) {
+        await this._write('UPDATE users SET welcome_message_shown = 1 WHERE user_id = ?', [userId]);
+        return true;
+    }
+
+    async wasWelcomeMessageShown(userId) {
+        const row = await get(this.db, 'SELECT welcome_message_shown FROM users WHERE user_id = ?', [userId]);
+        return !!(row && row.welcome_message_shown);
     }
 
     addOrUpdateUser(userId, username = null, referredBy = null) {
-        return new Promise((resolve, reject) => {
-            // Implementation would add or update user in database
-            // This is a placeholder that simulates successful operation
-            resolve({ updated: true, newUser: true, referrerSet: false });
+        return transaction(this.db, async () => {
+            const existing = await get(this.db, 'SELECT referred_by FROM users WHERE user_id = ?', [userId]);
+
+            if (!existing) {
+                await run(this.db,
+                    'INSERT INTO users (user_id, username, referred_by) VALUES (?, ?, ?)',
+                    [userId, username, referredBy !== null ? referredBy : NO_REFERRER]);
+                await this._storeReferralCode(userId);
+                if (referredBy !== null && referredBy !== userId) await this._incrementReferrals(referredBy);
+                return { updated: true, newUser: true, referrerSet: referredBy !== null };
+            }
+
+            const referrerSet = referredBy !== null && referredBy !== userId && existing.referred_by === null;
+            if (referrerSet) await this._incrementReferrals(referredBy);
+
+            await run(this.db,
+                `UPDATE users SET
+                     username = COALESCE(?, username),
+                     referred_by = CASE WHEN ? THEN ? ELSE referred_by END,
+                     updated_at = julianday('now')
+                 WHERE user_id = ?`,
+                [username, referrerSet ? 1 : 0, referredBy, userId]);
+            return { updated: true, newUser: false, referrerSet };
         });
     }
 
-    setWalletAddress(userId, walletAddress) {
-        return new Promise((resolve, reject) => {
-            // Implementation would set wallet address
-            resolve(true);
+    // Buffered username refreshes, [[userId, username], ...] written in one transaction
+    updateUsernames(updates) {
+        return transaction(this.db, async () => {
+            let changes = 0;
+            for (const [userId, username] of updates) {
+                const result = await run(this.db,
+                    "UPDATE users SET username = ?, updated_at = julianday('now') WHERE user_id = ?",
+                    [username, userId]);
+                changes += result.changes;
+            }
+            return changes;
         });
     }
 
-    removeWalletAddress(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would remove wallet address
-            resolve(true);
-        });
+    async setWalletAddress(userId, walletAddress) {
+        const { changes } = await this._write(
+            "UPDATE users SET wallet_address = ?, updated_at = julianday('now') WHERE user_id = ?",
+            [walletAddress, userId]);
+        return changes > 0;
+    }
+
+    async removeWalletAddress(userId) {
+        const { changes } = await this._write(
+            "UPDATE users SET wallet_address = NULL, updated_at = julianday('now') WHERE user_id = ?",
+            [userId]);
+        return changes > 0;
     }
 
     getUserInfo(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would get user info from database
-            resolve(null);
-        });
+        return get(this.db, 'SELECT * FROM users WHERE user_id = ?', [userId]);
+    }
+
+    // Batch reads take the ids as one JSON array parameter, so every batch size shares one prepared statement
+    getUsersInfo(userIds) {
+        return all(this.db, 'SELECT * FROM users WHERE user_id IN (SELECT value FROM json_each(?))',
+            [JSON.stringify(userIds)]);
+    }
+
+    getBonusCustomAddressesForUsers(userIds) {
+        return all(this.db,
+            'SELECT user_id, bonus_custom_addresses FROM users WHERE user_id IN (SELECT value FROM json_each(?))',
+            [JSON.stringify(userIds)]);
     }
 
     getReferrer(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would get referrer info
-            resolve(null);
-        });
+        return get(this.db,
+            `SELECT r.* FROM users u
+             JOIN users r ON r.user_id = u.referred_by
+             WHERE u.user_id = ? AND u.referred_by > 0`,
+            [userId]);
     }
 
-    getBonusCustomAddresses(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would get bonus address count
-            resolve(0);
-        });
+    async getBonusCustomAddresses(userId) {
+        const row = await get(this.db, 'SELECT bonus_custom_addresses FROM users WHERE user_id = ?', [userId]);
+        return (row && row.bonus_custom_addresses) || 0;
     }
 
-    useBonusCustomAddress(userId) {
-        return new Promise((resolve, reject) => {
-            // Implementation would use one bonus address
-            resolve(false);
-        });
+    async useBonusCustomAddress(userId) {
+        const { changes } = await this._write(
+            `UPDATE users SET bonus_custom_addresses = bonus_custom_addresses - 1, updated_at = julianday('now')
+             WHERE user_id = ? AND bonus_custom_addresses > 0`,
+            [userId]);
+        return changes > 0;
     }
 
     generateReferralCode(userId) {
-        const crypto = require('crypto');
-        const secret = 'your_secret_salt_here';
-        const combined = `${secret}_${userId}_${secret}`;
-        const hash = crypto.createHash('sha256').update(combined).digest('hex');
-        const hashValue = parseInt(hash.substring(0, 12), 16);
-
-        const chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789";
-        let code = "";
-        let value = hashValue;
-
-        for (let i = 0; i < 6; i++) {
-            code = chars[value % 36] + code;
-            value = Math.floor(value / 36);
-        }
-
-        return code;
+        return generateReferralCode(userId);
     }
 
-    findReferrerByCode(referralCode) {
+    async findReferrerByCode(referralCode) {
+        const row = await get(this.db, 'SELECT user_id FROM users WHERE referral_code = ?', [referralCode]);
+        if (row) return row.user_id;
+
+        // Rows not backfilled yet, or whose code collided with another user's
         return new Promise((resolve, reject) => {
-            // Implementation would find referrer by code
-            // This is a placeholder
-            resolve(null);
+            let referrerId = null;
+            this.db.each('SELECT user_id FROM users WHERE referral_code IS NULL', [], (err, row) => {
+                if (!err && referrerId === null && generateReferralCode(row.user_id) === referralCode) {
+                    referrerId = row.user_id;
+                }
+            }, (err) => {
+                if (err) reject(err);
+                else resolve(referrerId);
+            });
         });
     }
 
+    /**
+     * Fill referral_code for rows created before migration 3.
+     * Works in user_id order, one transaction per batch, so it can run while the bot is serving.
+     */
+    async backfillReferralCodes(batchSize = REFERRAL_CODE_BACKFILL_BATCH) {
+        let lastUserId = -1;
+        let filled = 0;
+
+        for (;;) {
+            const rows = await all(this.db,
+                'SELECT user_id FROM users WHERE referral_code IS NULL AND user_id > ? ORDER BY user_id LIMIT ?',
+                [lastUserId, batchSize]);
+            if (rows.length === 0) break;
+
+            filled += await transaction(this.db, async () => {
+                let changes = 0;
+                for (const row of rows) {
+                    changes += (await this._storeReferralCode(row.user_id)).changes;
+                }
+                return changes;
+            });
+            lastUserId = rows[rows.length - 1].user_id;
+        }
+
+        return filled;
+    }
+
     async setReferrerByCode(userId, referralCode) {
-        try {
-            const referrerId = await this.findReferrerByCode(referralCode);
+        const referrerId = await this.findReferrerByCode(referralCode);
 
-            if (!referrerId) return { success: false, reason: 'referrer_not_found' };
-            if (referrerId === userId) return { success: false, reason: 'self_referral' };
+        if (!referrerId) return { success: false, reason: 'referrer_not_found' };
+        if (referrerId === userId) return { success: false, reason: 'self_referral' };
 
-            // Implementation would set referrer
-            return { success: false, reason: 'already_has_referrer' };
-        } catch (error) {
-            throw error;
-        }
+        const result = await this.addOrUpdateUser(userId, null, referrerId);
+        if (!result.referrerSet) return { success: false, reason: 'already_has_referrer' };
+        return { success: true, referrerId };
     }
 
+    /**
+     * Insert a payout and bump the referrer's totals in the same transaction.
+     * amount is in SOL, stored as integer lamports.
+     */
     recordPayment(referrerId, referredUserId, amount, paymentType, txHash = null) {
-        return new Promise((resolve, reject) => {
-            // Implementation would record payment in database
-            resolve();
+        const amountLamports = solToLamports(amount);
+        const earningsColumn = EARNINGS_COLUMNS[paymentType];
+
+        return transaction(this.db, async () => {
+            await run(this.db,
+                `INSERT INTO referral_payments (referrer_id, referred_user_id, amount, amount_lamports, payment_type, tx_hash)
+                 VALUES (?, ?, ?, ?, ?, ?)`,
+                [referrerId, referredUserId, amountLamports / LAMPORTS_PER_SOL, amountLamports, paymentType, txHash]);
+
+            if (earningsColumn) {
+                await run(this.db,
+                    `UPDATE users SET
+                         ${earningsColumn}_lamports = ${earningsColumn}_lamports + ?,
+                         ${earningsColumn} = (${earningsColumn}_lamports + ?) / ${LAMPORTS_PER_SOL}.0,
+                         total_payments = total_payments + 1
+                     WHERE user_id = ?`,
+                    [amountLamports, amountLamports, referrerId]);
+            } else {
+                await run(this.db, 'UPDATE users SET total_payments = total_payments + 1 WHERE user_id = ?', [referrerId]);
+            }
         });
     }
 
-    // Methods with connect/disconnect wrappers
+    /**
+     * Totals from the users row plus one page of payment history, newest first.
+     * Pass nextCursor from the previous result to get the following page.
+     */
+    async getUserStats(userId, cursor = null, limit = PAYMENTS_PAGE_SIZE) {
+        const userInfo = await this.getUserInfo(userId);
+        const after = parsePaymentsCursor(cursor);
+
+        const payments = after
+            ? await all(this.db,
+                `SELECT * FROM referral_payments
+                 WHERE referrer_id = ? AND (created_at, id) < (?, ?)
+                 ORDER BY created_at DESC, id DESC LIMIT ?`,
+                [userId, after.createdAt, after.id, limit])
+            : await all(this.db,
+                `SELECT * FROM referral_payments
+                 WHERE referrer_id = ?
+                 ORDER BY created_at DESC, id DESC LIMIT ?`,
+                [userId, limit]);
+
+        const last = payments[payments.length - 1];
+
+        return {
+            userInfo: userInfo,
+            payments: payments,
+            paymentsCount: userInfo ? userInfo.total_payments : 0,
+            nextCursor: payments.length === limit ? `${last.created_at}:${last.id}` : null
+        };
+    }
+
+    // Connection is opened (and migrated) once, then reused by every *WithConnect call
     async markWelcomeMessageShownWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.markWelcomeMessageShown(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.markWelcomeMessageShown(userId);
     }
 
     async wasWelcomeMessageShownWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.wasWelcomeMessageShown(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.wasWelcomeMessageShown(userId);
     }
 
     async addOrUpdateUserWithConnect(userId, username = null, referredBy = null) {
-        try {
-            await this.connect();
-            const result = await this.addOrUpdateUser(userId, username, referredBy);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.addOrUpdateUser(userId, username, referredBy);
+    }
+
+    async updateUsernamesWithConnect(updates) {
+        await this.connect();
+        return this.updateUsernames(updates);
     }
 
     async setWalletAddressWithConnect(userId, walletAddress) {
-        try {
-            await this.connect();
-            const result = await this.setWalletAddress(userId, walletAddress);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.setWalletAddress(userId, walletAddress);
     }
 
     async removeWalletAddressWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.removeWalletAddress(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.removeWalletAddress(userId);
     }
 
     async getUserInfoWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.getUserInfo(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getUserInfo(userId);
+    }
+
+    async getUsersInfoWithConnect(userIds) {
+        await this.connect();
+        return this.getUsersInfo(userIds);
+    }
+
+    async getBonusCustomAddressesForUsersWithConnect(userIds) {
+        await this.connect();
+        return this.getBonusCustomAddressesForUsers(userIds);
     }
 
     async getReferrerWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.getReferrer(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getReferrer(userId);
     }
 
     async getBonusCustomAddressesWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.getBonusCustomAddresses(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.getBonusCustomAddresses(userId);
     }
 
     async useBonusCustomAddressWithConnect(userId) {
-        try {
-            await this.connect();
-            const result = await this.useBonusCustomAddress(userId);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.useBonusCustomAddress(userId);
     }
 
     async findReferrerByCodeWithConnect(referralCode) {
-        try {
-            await this.connect();
-            const result = await this.findReferrerByCode(referralCode);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.findReferrerByCode(referralCode);
     }
 
     async setReferrerByCodeWithConnect(userId, referralCode) {
-        try {
-            await this.connect();
-            const result = await this.setReferrerByCode(userId, referralCode);
-            await this.close();
-            return result;
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+        await this.connect();
+        return this.setReferrerByCode(userId, referralCode);
     }
 
-    async recordPaymentWithConnect(referrerId, referredUserId, amount, paymentType, txHash = null) {
-        try {
-            await this.connect();
-            await this.recordPayment(referrerId, referredUserId, amount, paymentType, txHash);
-            await this.close();
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+    async backfillReferralCodesWithConnect(batchSize = REFERRAL_CODE_BACKFILL_BATCH) {
+        await this.connect();
+        return this.backfillReferralCodes(batchSize);
     }
 
-    async getUserStatsWithConnect(userId) {
-        try {
-            await this.connect();
+    async recordPaymentWithConnect(referrerId, referredUserId, amount, paymentType, txHash = null) {
+        await this.connect();
+        await this.recordPayment(referrerId, referredUserId, amount, paymentType, txHash);
+    }
 
-            const userInfo = await this.getUserInfo(userId);
-            const payments = [];
+    async getUserStatsWithConnect(userId, cursor = null, limit = PAYMENTS_PAGE_SIZE) {
+        await this.connect();
+        return this.getUserStats(userId, cursor, limit);
+    }
+}
 
-            await this.close();
+const referralDbManager = new ReferralDbManager(DB_PATH);
 
-            return {
-                userInfo: userInfo,
-                payments: payments,
-                paymentsCount: payments.length
-            };
-        } catch (error) {
-            await this.close();
-            throw error;
-        }
+// node referrals/db-manager.js backfill-referral-codes [batchSize]
+async function main() {
+    const [command, batchSize] = process.argv.slice(2);
+    if (command !== 'backfill-referral-codes') {
+        console.error('Usage: node referrals/db-manager.js backfill-referral-codes [batchSize]');
+        process.exit(1);
     }
+
+    const filled = await referralDbManager.backfillReferralCodesWithConnect(
+        batchSize ? parseInt(batchSize, 10) : REFERRAL_CODE_BACKFILL_BATCH);
+    console.log(`Referral codes backfilled: ${filled}`);
+    await referralDbManager.close();
 }
 
-const referralDbManager = new ReferralDbManager(DB_PATH);
+if (require.main === module) {
+    main().catch((error) => {
+        console.error('Backfill failed:', error);
+        process.exit(1);
+    });
+}
 
 module.exports = {
     ReferralDbManager,
-    referralDbManager
+    referralDbManager,
+    MIGRATIONS,
+    generateReferralCode
 };
\ No newline at end of file
@@ -0,0 +1,83 @@
+#!/usr/bin/env node
+// Long-lived referral DB process: one JSON request per stdin line, one JSON response per stdout line.
+// Request:  {"id": 1, "method": "getUserInfoWithConnect", "args": [123]}
+// Response: {"id": 1, "result": {...}} or {"id": 1, "error": "message"}
+const readline = require('readline');
+const { ReferralDbManager, referralDbManager } = require('./db-manager');
+
+// stdout carries response frames only, any other logging goes to stderr
+console.log = console.error;
+console.info = console.error;
+
+function writeFrame(frame) {
+    process.stdout.write(JSON.stringify(frame) + '\n');
+}
+
+function isCallableMethod(method) {
+    return typeof method === 'string' &&
+        !method.startsWith('_') &&
+        method !== 'constructor' &&
+        typeof ReferralDbManager.prototype[method] === 'function';
+}
+
+async function handleRequest(request) {
+    const { id, method, args = [] } = request;
+
+    if (method === 'ping') {
+        writeFrame({ id, result: true });
+        return;
+    }
+
+    if (!isCallableMethod(method)) {
+        writeFrame({ id, error: `Unknown method: ${method}` });
+        return;
+    }
+
+    try {
+        const result = await referralDbManager[method](...args);
+        writeFrame({ id, result: result === undefined ? null : result });
+    } catch (error) {
+        writeFrame({ id, error: error.message });
+    }
+}
+
+function main() {
+    const rl = readline.createInterface({ input: process.stdin, terminal: false });
+    const inFlight = new Set();
+    let closing = false;
+
+    const exitWhenIdle = async () => {
+        if (closing && inFlight.size === 0) {
+            await referralDbManager.close();
+            process.stdout.write('', () => process.exit(0));
+        }
+    };
+
+    rl.on('line', (line) => {
+        if (!line.trim()) return;
+
+        let request;
+        try {
+            request = JSON.parse(line);
+        } catch (error) {
+            console.error('Invalid request frame:', error.message);
+            return;
+        }
+
+        const task = handleRequest(request).finally(() => {
+            inFlight.delete(task);
+            exitWhenIdle();
+        });
+        inFlight.add(task);
+    });
+
+    // Parent closed stdin - exit once in-flight requests are answered
+    rl.on('close', () => {
+        closing = true;
+        exitWhenIdle();
+    });
+}
+
+if (require.main === module) {
+    main();
+}
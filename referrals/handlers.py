@@ -1,6 +1,5 @@
 """Referral system handlers for memecoin bot"""
 import logging
-import hashlib
 import asyncio
 from aiogram import types
 from aiogram.fsm.context import FSMContext
@@ -9,47 +8,13 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.handlers import get_user_info, log_user_action
 from utils.input_validators import validate_user_wallet
 from referrals.middleware import call_referral_db_safe, ensure_user_cached
+from referrals.codes import generate_referral_code, parse_referral_code
 
 
 class ReferralStates(StatesGroup):
     waiting_wallet = State()
 
 
-def generate_referral_code(user_id):
-    """Generate deterministic referral code from user_id - secure version"""
-    import hashlib
-
-    secret = 'your_secret_key_here_change_in_production'
-    combined = f"{secret}_{user_id}_{secret}"
-
-    hash_object = hashlib.sha256(combined.encode())
-    hash_hex = hash_object.hexdigest()
-
-    hash_value = int(hash_hex[:12], 16)
-
-    chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    code = ""
-
-    for _ in range(6):
-        code = chars[hash_value % 36] + code
-        hash_value //= 36
-
-    return code
-
-
-def parse_referral_code(code):
-    """Check if referral code is valid"""
-    if not code or len(code) != 6:
-        return None
-
-    chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
-    for char in code.upper():
-        if char not in chars:
-            return None
-
-    return code.upper()
-
-
 def get_referral_keyboard(user_info):
     """Create referral system keyboard"""
     keyboard = []
@@ -80,15 +45,7 @@ async def cmd_referral(message: types.Message, state: FSMContext):
     await ensure_user_cached(message.from_user)
     log_user_action(message.from_user, "opened referral system")
 
-    try:
-        stats = await call_referral_db_safe('getUserStatsWithConnect', user_id)
-        if stats:
-            logging.info(f"DEBUG: User {user_id} stats: {stats}")
-        else:
-            logging.warning(f"DEBUG: No stats found for user {user_id}")
-    except Exception as e:
-        logging.error(f"DEBUG: Error getting stats for user {user_id}: {e}")
-
+    # Totals are maintained on the users row, no payment history needed for this screen
     user_info = await call_referral_db_safe('getUserInfoWithConnect', user_id)
 
     logging.info(f"DEBUG: Raw user_info for {user_id}: {user_info}")
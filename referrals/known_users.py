@@ -0,0 +1,167 @@
+"""Bounded "user already ensured in referral DB" filter, persisted across restarts"""
+import logging
+import asyncio
+import hashlib
+import math
+import os
+import struct
+
+SNAPSHOT_MAGIC = b'KUF1'
+SNAPSHOT_HEADER = struct.Struct('<4sQIQ')  # magic, size_bits, hash_count, count
+
+
+def get_known_users_snapshot_path(debug_mode):
+    snapshot_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(snapshot_dir, 'known_users_test.bin' if debug_mode else 'known_users.bin')
+
+
+class BloomFilter:
+    """Plain Bloom filter sized for `capacity` items at `false_positive_rate`"""
+
+    def __init__(self, capacity, false_positive_rate):
+        self.capacity = capacity
+        self.size_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.size_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(str(key).encode(), digest_size=16).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size_bits
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_false_positive_rate(self):
+        return (1 - math.exp(-self.hash_count * self.count / self.size_bits)) ** self.hash_count
+
+
+class KnownUsersFilter:
+    """
+    Two-generation Bloom filter: when the current generation reaches capacity it
+    becomes the previous one and a fresh generation starts, so memory stays bounded
+    and the false-positive rate stays within ~2x the configured budget.
+    A false positive only means a new user isn't pre-created in the referral DB
+    by the middleware; wallet/referral writes still create the row.
+    """
+
+    def __init__(self, capacity=1_000_000, false_positive_rate=0.001, snapshot_path=None):
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.snapshot_path = snapshot_path
+        self.current = BloomFilter(capacity, false_positive_rate)
+        self.previous = None
+
+        self.hits = 0
+        self.misses = 0
+        self.rotations = 0
+        self.snapshots = 0
+
+    def add(self, user_id):
+        if user_id in self.current:
+            return
+        if self.current.count >= self.capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.false_positive_rate)
+            self.rotations += 1
+        self.current.add(user_id)
+
+    def __contains__(self, user_id):
+        known = user_id in self.current or (self.previous is not None and user_id in self.previous)
+        if known:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return known
+
+    def clear(self):
+        self.current = BloomFilter(self.capacity, self.false_positive_rate)
+        self.previous = None
+
+    # Snapshot format: header + bits for the current generation, then the previous one (if any)
+
+    def _serialize(self):
+        chunks = []
+        for bloom in (self.current, self.previous):
+            if bloom is not None:
+                chunks.append(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, bloom.size_bits, bloom.hash_count, bloom.count))
+                chunks.append(bytes(bloom.bits))
+        return b''.join(chunks)
+
+    def _deserialize(self, data):
+        generations = []
+        offset = 0
+        while offset < len(data):
+            magic, size_bits, hash_count, count = SNAPSHOT_HEADER.unpack_from(data, offset)
+            offset += SNAPSHOT_HEADER.size
+
+            bloom = BloomFilter(self.capacity, self.false_positive_rate)
+            if magic != SNAPSHOT_MAGIC or (size_bits, hash_count) != (bloom.size_bits, bloom.hash_count):
+                raise ValueError("snapshot doesn't match configured capacity / false-positive rate")
+
+            bloom.bits[:] = data[offset:offset + len(bloom.bits)]
+            bloom.count = count
+            offset += len(bloom.bits)
+            generations.append(bloom)
+
+        if generations:
+            self.current = generations[0]
+            self.previous = generations[1] if len(generations) > 1 else None
+
+    def load(self):
+        """Load snapshot from disk; start empty if it's missing or doesn't match the config"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                self._deserialize(f.read())
+            logging.info(f"Known users filter loaded: {self.current.count} users")
+            return True
+        except Exception as e:
+            logging.warning(f"Known users snapshot ignored: {e}")
+            self.clear()
+            return False
+
+    def _write_snapshot(self, data):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    async def snapshot(self):
+        """Write snapshot atomically (tmp file + rename) off the event loop"""
+        if not self.snapshot_path:
+            return
+        data = self._serialize()
+        await asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, data)
+        self.snapshots += 1
+
+    async def run_snapshots(self, interval):
+        """Background task: snapshot every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.snapshot()
+            except Exception as e:
+                logging.warning(f"Known users snapshot failed: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'users': self.current.count + (self.previous.count if self.previous else 0),
+            'hits': self.hits,
+            'misses': self.misses,
+            'miss_ratio': round(self.misses / lookups, 3) if lookups else 0,
+            'estimated_fp_rate': self.current.estimated_false_positive_rate(),
+            'rotations': self.rotations,
+            'snapshots': self.snapshots,
+        }
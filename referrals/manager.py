@@ -5,6 +5,7 @@ import json
 from decimal import Decimal, ROUND_HALF_UP
 from config import AMOUNT, REFERRAL_TOKEN_COMMISSION, REFERRAL_CUSTOM_COMMISSION
 from referrals.middleware import call_referral_db_safe
+from utils.admission import admission
 
 
 def round_sol(value, decimals=6):
@@ -20,17 +21,18 @@ async def send_referral_payment(wallet_address, total_amount_sol, payment_breakd
 
         payment_details_json = json.dumps(payment_breakdown)
 
-        process = await asyncio.create_subprocess_exec(
-            'node', 'referrals/payment-sender.js',
-            wallet_address,
-            str(total_amount_sol),
-            payment_details_json,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd='.'
-        )
-
-        stdout, stderr = await process.communicate()
+        async with admission.slot('payout'):
+            process = await asyncio.create_subprocess_exec(
+                'node', 'referrals/payment-sender.js',
+                wallet_address,
+                str(total_amount_sol),
+                payment_details_json,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd='.'
+            )
+
+            stdout, stderr = await process.communicate()
 
         if process.returncode == 0:
             try:
@@ -1,93 +1,241 @@
 """Middleware for automatic user addition to referral DB"""
 import logging
 import asyncio
-import json
+import sqlite3
+import time
 from utils.handlers import get_user_info
+from utils.admission import admission
+from config import (
+    DEBUG_MODE, REFERRAL_DB_BACKEND, REFERRAL_BATCH_WINDOW_MS, REFERRAL_BATCH_MAX_SIZE,
+    REFERRAL_USER_CACHE_SIZE, REFERRAL_USER_CACHE_TTL,
+    KNOWN_USERS_CAPACITY, KNOWN_USERS_FALSE_POSITIVE_RATE, KNOWN_USERS_SNAPSHOT_INTERVAL,
+    REFERRAL_WRITE_BEHIND_INTERVAL, REFERRAL_WRITE_BEHIND_MAX_PENDING,
+    REFERRAL_BREAKER_FAILURE_THRESHOLD, REFERRAL_BREAKER_RESET_TIMEOUT, REFERRAL_BREAKER_HALF_OPEN_PROBES
+)
+from referrals.sidecar import ReferralDbSidecar, ReferralDbUnavailable, ReferralDbError
+from referrals.coalescer import ReadCoalescer
+from referrals.user_cache import UserRowCache
+from referrals.known_users import KnownUsersFilter, get_known_users_snapshot_path
+from referrals.write_behind import UsernameWriteBehind
+from referrals.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 BOT_IDS = {7637247149, 7671046210}
 
+referral_db_sidecar = ReferralDbSidecar()
+
+
+# Fails calls fast while the bridge keeps failing, instead of each one waiting for its timeout
+referral_db_breaker = CircuitBreaker(
+    'Referral DB',
+    failure_threshold=REFERRAL_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=REFERRAL_BREAKER_RESET_TIMEOUT,
+    half_open_probes=REFERRAL_BREAKER_HALF_OPEN_PROBES
+)
+
+# Failures of the bridge itself; an error returned by the DB method means the bridge works
+BRIDGE_FAILURES = (ReferralDbUnavailable, asyncio.TimeoutError, ConnectionError, sqlite3.OperationalError)
+
+
+async def _call_referral_db(method_name, *args, timeout=10.0):
+    """
+    Call referral DB method on the configured backend (raises on failure, CircuitOpenError when open).
+    timeout covers the wait for a DB admission slot and the call itself.
+    """
+    # Before queueing: while the bridge is down, callers fail at once instead of waiting for a slot
+    probe = referral_db_breaker.allow()
+    recorded = False
+    started = time.monotonic()
+
+    try:
+        async with admission.slot('db', timeout=timeout):
+            remaining = timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            try:
+                if REFERRAL_DB_BACKEND == 'python':
+                    from referrals.dao import referral_dao
+                    result = await asyncio.wait_for(referral_dao.call(method_name, *args), timeout=remaining)
+                else:
+                    result = await referral_db_sidecar.call(method_name, *args, timeout=remaining)
+            except BRIDGE_FAILURES as e:
+                recorded = True
+                referral_db_breaker.record_failure(e)
+                raise
+            except Exception:
+                recorded = True
+                referral_db_breaker.record_success()
+                raise
+
+            recorded = True
+            referral_db_breaker.record_success()
+            return result
+    finally:
+        # Cancelled, or timed out waiting for a slot: free the probe slot or the circuit stays half-open
+        if not recorded:
+            referral_db_breaker.release(probe)
+
+
+def _make_read_coalescer(batch_method, pick, default):
+    async def fetch_batch(user_ids):
+        rows = await _call_referral_db(batch_method, user_ids)
+        return {row['user_id']: pick(row) for row in rows or []}
+
+    return ReadCoalescer(
+        fetch_batch,
+        window=REFERRAL_BATCH_WINDOW_MS / 1000,
+        max_batch_size=REFERRAL_BATCH_MAX_SIZE,
+        default=default
+    )
+
+
+# Per-user reads answered by one WHERE user_id IN (...) query per batch window
+read_coalescers = {
+    'getUserInfoWithConnect': _make_read_coalescer(
+        'getUsersInfoWithConnect', lambda row: row, None),
+    'getBonusCustomAddressesWithConnect': _make_read_coalescer(
+        'getBonusCustomAddressesForUsersWithConnect', lambda row: row['bonus_custom_addresses'] or 0, 0),
+}
+
+
+# Write methods -> ids of the users whose rows they change (args, result) -> [user_id, ...]
+USER_ROW_WRITES = {
+    'addOrUpdateUserWithConnect': lambda args, result: [args[0], args[2] if len(args) > 2 else None],
+    'setWalletAddressWithConnect': lambda args, result: [args[0]],
+    'removeWalletAddressWithConnect': lambda args, result: [args[0]],
+    'useBonusCustomAddressWithConnect': lambda args, result: [args[0]],
+    'markWelcomeMessageShownWithConnect': lambda args, result: [args[0]],
+    'setReferrerByCodeWithConnect': lambda args, result: [args[0], (result or {}).get('referrerId')],
+    'recordPaymentWithConnect': lambda args, result: [args[0]],
+}
+
+user_row_cache = UserRowCache(max_size=REFERRAL_USER_CACHE_SIZE, ttl=REFERRAL_USER_CACHE_TTL)
+
+
+async def _read_user(method_name, user_id):
+    """Per-user read: row cache first, then the (coalesced) DB query"""
+    row = user_row_cache.get(user_id)
+    if row is not None:
+        if method_name == 'getBonusCustomAddressesWithConnect':
+            return row.get('bonus_custom_addresses') or 0
+        return row
+
+    read_token = user_row_cache.begin_read()
+
+    if REFERRAL_BATCH_WINDOW_MS > 0:
+        result = await asyncio.wait_for(read_coalescers[method_name].load(user_id), timeout=10.0)
+    else:
+        result = await _call_referral_db(method_name, user_id)
+
+    if method_name == 'getUserInfoWithConnect':
+        user_row_cache.put(user_id, result, read_token)
+    return result
+
 
 async def call_referral_db_safe(method_name, *args):
     """Safe referral DB method call (no errors if DB unavailable)"""
     try:
-        db_script = 'referrals/db-manager.js'
-
-        js_args = []
-        for arg in args:
-            if arg is None:
-                js_args.append('null')
-            elif isinstance(arg, str):
-                escaped_arg = arg.replace('"', '\\"').replace("'", "\\'")
-                js_args.append(f'"{escaped_arg}"')
-            elif isinstance(arg, (int, float)):
-                js_args.append(str(arg))
-            elif isinstance(arg, bool):
-                js_args.append('true' if arg else 'false')
-            else:
-                escaped_arg = str(arg).replace('"', '\\"').replace("'", "\\'")
-                js_args.append(f'"{escaped_arg}"')
-
-        temp_script = f"""
-const {{ referralDbManager }} = require('./{db_script}');
-
-async function callMethod() {{
-    try {{
-        const result = await referralDbManager.{method_name}({', '.join(js_args)});
-        
-        process.stdout.write(JSON.stringify(result));
-    }} catch (error) {{
-        process.stderr.write('ERROR: ' + error.message);
-        process.exit(1);
-    }}
-}}
-
-callMethod();
-"""
-
-        process = await asyncio.create_subprocess_exec(
-            'node', '-e', temp_script,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd='.'
-        )
+        if method_name in read_coalescers and len(args) == 1 and isinstance(args[0], int):
+            return await _read_user(method_name, args[0])
 
+        result = None
         try:
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=10.0)
-        except asyncio.TimeoutError:
-            process.kill()
-            logging.warning(f"Timeout calling {method_name} in referral DB")
-            return None
+            result = await _call_referral_db(method_name, *args)
+            return result
+        finally:
+            # Also on failure: a timed out write may still have been applied
+            written = USER_ROW_WRITES.get(method_name)
+            if written is not None:
+                user_row_cache.invalidate(*[user_id for user_id in written(args, result) if user_id])
+    except asyncio.TimeoutError:
+        logging.warning(f"Timeout calling {method_name} in referral DB")
+        return None
+    except (ReferralDbUnavailable, ReferralDbError, CircuitOpenError) as e:
+        logging.debug(f"Referral DB unavailable for {method_name}: {e}")
+        return None
+    except Exception as e:
+        logging.debug(f"Referral DB unavailable for {method_name}: {e}")
+        return None
 
-        if process.returncode != 0:
-            error_msg = stderr.decode() if stderr else "Unknown error"
-            logging.debug(f"Referral DB unavailable for {method_name}: {error_msg}")
-            return None
 
-        output = stdout.decode().strip()
+async def _flush_usernames(updates):
+    try:
+        await _call_referral_db('updateUsernamesWithConnect', updates)
+    finally:
+        user_row_cache.invalidate(*[user_id for user_id, _ in updates])
 
-        if output and not output.startswith('ERROR:'):
-            try:
-                json_start = output.find('{')
-                json_end = output.rfind('}')
 
-                if json_start != -1 and json_end != -1 and json_end > json_start:
-                    json_text = output[json_start:json_end + 1]
-                    parsed_result = json.loads(json_text)
-                    return parsed_result
-                else:
-                    parsed_result = json.loads(output)
-                    return parsed_result
-            except json.JSONDecodeError as e:
-                logging.warning(f"Failed to parse JSON response for {method_name}")
-                logging.debug(f"Raw output: {output}")
-                logging.debug(f"JSON error: {e}")
-                return None
+# Username refreshes are not latency-critical, handlers only enqueue them
+username_writes = UsernameWriteBehind(
+    _flush_usernames,
+    interval=REFERRAL_WRITE_BEHIND_INTERVAL,
+    max_pending=REFERRAL_WRITE_BEHIND_MAX_PENDING
+)
 
-        return None
 
+def get_referral_db_stats():
+    """Counters for /ref_db_stats"""
+    return {
+        'breaker': referral_db_breaker.stats(),
+        'coalescers': {method_name: coalescer.stats() for method_name, coalescer in read_coalescers.items()},
+        'user_cache': user_row_cache.stats(),
+        'known_users': known_users.stats(),
+        'write_behind': username_writes.stats(),
+    }
+
+
+_known_users_snapshot_task = None
+
+
+async def init_referral_db():
+    """Open referral DB, apply pending migrations and backfill referral codes once at startup"""
+    global _known_users_snapshot_task
+
+    known_users.load()
+    username_writes.start()
+    if _known_users_snapshot_task is None:
+        _known_users_snapshot_task = asyncio.create_task(known_users.run_snapshots(KNOWN_USERS_SNAPSHOT_INTERVAL))
+
+    try:
+        if REFERRAL_DB_BACKEND == 'python':
+            from referrals.dao import referral_dao
+            await referral_dao.connect()
+            filled = await referral_dao.backfillReferralCodes()
+        else:
+            await referral_db_sidecar.call('connect', timeout=60.0)
+            filled = await referral_db_sidecar.call('backfillReferralCodesWithConnect', timeout=300.0)
+        if filled:
+            logging.info(f"Referral codes backfilled for {filled} users")
+        return True
     except Exception as e:
-        logging.debug(f"Referral DB unavailable for {method_name}: {e}")
-        return None
+        logging.warning(f"Referral DB init failed, will retry on first call: {e}")
+        return False
+
+
+async def flush_referral_writes():
+    """Stop the write-behind loop and write pending updates (graceful shutdown, before close_referral_db)"""
+    return await username_writes.close()
+
+
+async def close_referral_db():
+    """Stop referral DB sidecar / close DAO connection (on shutdown)"""
+    global _known_users_snapshot_task
+
+    await flush_referral_writes()
+
+    if _known_users_snapshot_task is not None:
+        _known_users_snapshot_task.cancel()
+        _known_users_snapshot_task = None
+    try:
+        await known_users.snapshot()
+    except Exception as e:
+        logging.warning(f"Known users snapshot failed: {e}")
+
+    if REFERRAL_DB_BACKEND == 'python':
+        from referrals.dao import referral_dao
+        await referral_dao.close()
+    else:
+        await referral_db_sidecar.close()
 
 
 async def ensure_user_in_referral_db(user):
@@ -127,13 +275,8 @@ async def ensure_user_in_referral_db(user):
                 return False
         else:
             if username and isinstance(existing_user, dict) and existing_user.get('username') != username:
-                await call_referral_db_safe(
-                    'addOrUpdateUserWithConnect',
-                    user_id,
-                    username,
-                    None
-                )
-                logging.debug(f"{user_info_log} updated username in referral DB")
+                username_writes.enqueue(user_id, username)
+                logging.debug(f"{user_info_log} username update queued for referral DB")
 
             bonus_count = existing_user.get('bonus_custom_addresses') if isinstance(existing_user, dict) else 0
             if bonus_count is None:
@@ -148,7 +291,12 @@ async def ensure_user_in_referral_db(user):
         return False
 
 
-_user_check_cache = set()
+# Users already ensured in the referral DB, survives restarts via snapshots
+known_users = KnownUsersFilter(
+    capacity=KNOWN_USERS_CAPACITY,
+    false_positive_rate=KNOWN_USERS_FALSE_POSITIVE_RATE,
+    snapshot_path=get_known_users_snapshot_path(DEBUG_MODE)
+)
 
 
 async def ensure_user_cached(user):
@@ -158,20 +306,19 @@ async def ensure_user_cached(user):
     if user_id in BOT_IDS:
         return False
 
-    if user_id in _user_check_cache:
+    if user_id in known_users:
         return True
 
     success = await ensure_user_in_referral_db(user)
     if success:
-        _user_check_cache.add(user_id)
+        known_users.add(user_id)
 
     return success
 
 
 def clear_user_cache():
     """Clear cache (for periodic refresh)"""
-    global _user_check_cache
-    _user_check_cache.clear()
+    known_users.clear()
 
 
 async def ensure_user_exists_with_retry(user):
@@ -189,15 +336,18 @@ async def ensure_user_exists_with_retry(user):
     if success:
         return True
 
-    if user.id in _user_check_cache:
-        _user_check_cache.remove(user.id)
+    if referral_db_breaker.is_open:
+        logging.warning(f"{user_info_log} referral DB circuit is open, skipping retry")
+        return False
 
+    # Bypass the filter for the retry, it can't forget a single user
     logging.info(f"{user_info_log} retrying user creation in referral DB")
-    success = await ensure_user_cached(user)
+    success = await ensure_user_in_referral_db(user)
 
     if success:
+        known_users.add(user.id)
         logging.info(f"{user_info_log} successfully ensured user exists in referral DB (retry)")
         return True
     else:
         logging.error(f"{user_info_log} failed to ensure user exists in referral DB after retry")
-        return False
\ No newline at end of file
+        return False
@@ -1,5 +1,5 @@
-const { Connection, Keypair, PublicKey, Transaction, SystemProgram, sendAndConfirmTransaction, LAMPORTS_PER_SOL } = require('@solana/web3.js');
-const { updateTransactionBlockhash } = require('../scripts/update-blockhash.js');
+const { Connection, Keypair, PublicKey, Transaction, SystemProgram, LAMPORTS_PER_SOL } = require('@solana/web3.js');
+const { sendLegacyTransaction } = require('../scripts/tx-sender.js');
 const fs = require('fs');
 const { mnemonicToSeedSync } = require('bip39');
 const { derivePath } = require('ed25519-hd-key');
@@ -54,21 +54,7 @@ async function sendReferralPayment(referrerWalletAddress, amountSol, paymentDeta
             })
         );
 
-        await updateTransactionBlockhash(transaction, connection, {
-            feePayer: senderWallet.publicKey,
-            commitment: 'finalized'
-        });
-
-        const signature = await sendAndConfirmTransaction(
-            connection,
-            transaction,
-            [senderWallet],
-            {
-                commitment: 'confirmed',
-                preflightCommitment: 'processed',
-                maxRetries: 5
-            }
-        );
+        const signature = await sendLegacyTransaction(connection, transaction, [senderWallet], 'payout');
 
         return {
             success: true,
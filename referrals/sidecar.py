@@ -0,0 +1,169 @@
+"""Long-lived Node.js sidecar for referral DB calls"""
+import logging
+import asyncio
+import itertools
+import json
+
+SIDECAR_SCRIPT = 'referrals/db-sidecar.js'
+
+
+class ReferralDbUnavailable(Exception):
+    """Raised when the sidecar can't serve a request"""
+
+
+class ReferralDbError(Exception):
+    """Raised when the sidecar answered with an error from the DB method (constraint violation...)"""
+
+
+class ReferralDbSidecar:
+    """
+    Keeps one `node referrals/db-sidecar.js` process alive and multiplexes
+    concurrent calls onto it using request ids.
+    The process is restarted on the next call after it dies, with exponential backoff.
+    """
+
+    def __init__(self, script=SIDECAR_SCRIPT, restart_delay=1.0, max_restart_delay=30.0):
+        self.script = script
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+
+        self.process = None
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._start_lock = None
+        self._restart_failures = 0
+        self._next_start_at = 0.0
+        self._closed = False
+
+    @property
+    def is_running(self):
+        return self.process is not None and self.process.returncode is None
+
+    def _schedule_restart(self):
+        """Push back the next start attempt (exponential backoff)"""
+        self._restart_failures += 1
+        delay = min(self.restart_delay * 2 ** (self._restart_failures - 1), self.max_restart_delay)
+        self._next_start_at = asyncio.get_running_loop().time() + delay
+
+    async def _ensure_started(self):
+        if self.is_running:
+            return
+
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+
+        async with self._start_lock:
+            if self.is_running:
+                return
+
+            if self._closed:
+                raise ReferralDbUnavailable("sidecar is closed")
+
+            if asyncio.get_running_loop().time() < self._next_start_at:
+                raise ReferralDbUnavailable("sidecar is restarting")
+
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    'node', self.script,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    cwd='.',
+                    limit=2 ** 20
+                )
+            except Exception as e:
+                self._schedule_restart()
+                raise ReferralDbUnavailable(f"failed to start sidecar: {e}")
+
+            self.process = process
+            asyncio.create_task(self._read_responses(process))
+            asyncio.create_task(self._drain_stderr(process))
+            logging.info(f"Referral DB sidecar started (pid {process.pid})")
+
+    async def _read_responses(self, process):
+        """Resolve pending futures from response frames until the process exits"""
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+
+                try:
+                    frame = json.loads(line)
+                except json.JSONDecodeError:
+                    logging.debug(f"Referral DB sidecar sent non-JSON line: {line[:200]!r}")
+                    continue
+
+                future = self._pending.pop(frame.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except Exception as e:
+            logging.warning(f"Referral DB sidecar reader error: {e}")
+        finally:
+            returncode = await process.wait()
+            if self.process is process:
+                self.process = None
+
+            for request_id, future in list(self._pending.items()):
+                if not future.done():
+                    future.set_exception(ReferralDbUnavailable(f"sidecar exited with code {returncode}"))
+                self._pending.pop(request_id, None)
+
+            if not self._closed:
+                logging.warning(f"Referral DB sidecar exited with code {returncode}, will restart on next call")
+                self._schedule_restart()
+
+    async def _drain_stderr(self, process):
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                break
+            logging.debug(f"Referral DB sidecar: {line.decode(errors='replace').rstrip()}")
+
+    async def call(self, method_name, *args, timeout=10.0):
+        """
+        Call ReferralDbManager method in the sidecar
+
+        Raises:
+            ReferralDbUnavailable: sidecar not running or pipe closed
+            ReferralDbError: the method failed
+            asyncio.TimeoutError: no response within timeout
+        """
+        await self._ensure_started()
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+
+        try:
+            frame = json.dumps({'id': request_id, 'method': method_name, 'args': list(args)})
+            self.process.stdin.write(frame.encode() + b'\n')
+            await self.process.stdin.drain()
+
+            response = await asyncio.wait_for(future, timeout=timeout)
+        except (ConnectionError, AttributeError) as e:
+            raise ReferralDbUnavailable(f"sidecar pipe closed: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+        self._restart_failures = 0
+
+        if 'error' in response:
+            raise ReferralDbError(response['error'])
+
+        return response.get('result')
+
+    async def close(self, timeout=5.0):
+        """Stop the sidecar, letting in-flight requests finish"""
+        self._closed = True
+        process = self.process
+        if process is None or process.returncode is not None:
+            return
+
+        try:
+            process.stdin.close()
+            await asyncio.wait_for(process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+        logging.info("Referral DB sidecar stopped")
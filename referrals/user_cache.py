@@ -0,0 +1,73 @@
+"""In-process LRU + TTL cache of referral DB user rows"""
+import time
+from collections import OrderedDict
+
+
+class UserRowCache:
+    """
+    Bounded LRU of users rows keyed by user_id, each entry valid for `ttl` seconds.
+    Writers call invalidate(); a read that started before an invalidation
+    doesn't store its (possibly stale) row, see begin_read()/put().
+    """
+
+    def __init__(self, max_size=10000, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rows = OrderedDict()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        entry = self._rows.get(user_id)
+        if entry is not None:
+            row, expires_at = entry
+            if expires_at > time.monotonic():
+                self._rows.move_to_end(user_id)
+                self.hits += 1
+                return dict(row)
+            del self._rows[user_id]
+
+        self.misses += 1
+        return None
+
+    def begin_read(self):
+        """Token to pass to put() for a row fetched after this call"""
+        return self._generation
+
+    def put(self, user_id, row, read_token=None):
+        if self.max_size <= 0 or row is None:
+            return
+        if read_token is not None and read_token != self._generation:
+            return
+
+        self._rows[user_id] = (dict(row), time.monotonic() + self.ttl)
+        self._rows.move_to_end(user_id)
+
+        while len(self._rows) > self.max_size:
+            self._rows.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *user_ids):
+        self._generation += 1
+        for user_id in user_ids:
+            if self._rows.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self._generation += 1
+        self._rows.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._rows),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+        }
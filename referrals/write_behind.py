@@ -0,0 +1,110 @@
+"""Write-behind buffer for non-critical referral DB user updates"""
+import logging
+import asyncio
+import time
+
+
+class UsernameWriteBehind:
+    """
+    Buffers username refreshes, keeping only the latest value per user, and writes
+    them in one transaction via flush_batch([[user_id, username], ...]) every
+    `interval` seconds, as soon as `max_pending` users are waiting, and on close().
+    A failed flush puts its updates back unless a newer one arrived meanwhile.
+    """
+
+    def __init__(self, flush_batch, interval=5.0, max_pending=500):
+        self.flush_batch = flush_batch
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self._pending = {}
+        self._oldest_enqueued_at = None
+        self._task = None
+        self._wakeup = None
+        self._flush_lock = None
+        self._closing = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def enqueue(self, user_id, username):
+        if not self._pending:
+            self._oldest_enqueued_at = time.monotonic()
+        self._pending[user_id] = username
+        self.enqueued += 1
+
+        if len(self._pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write everything pending in one batch; returns number of users written"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            batch, self._pending = self._pending, {}
+            self._oldest_enqueued_at = None
+            started = time.monotonic()
+
+            try:
+                await self.flush_batch([[user_id, username] for user_id, username in batch.items()])
+            except Exception as e:
+                self.failures += 1
+                for user_id, username in batch.items():
+                    self._pending.setdefault(user_id, username)
+                if self._pending and self._oldest_enqueued_at is None:
+                    self._oldest_enqueued_at = started
+                logging.warning(f"Username write-behind flush of {len(batch)} users failed: {e}")
+                return 0
+
+            self.last_flush_ms = (time.monotonic() - started) * 1000
+            self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+            self.flushes += 1
+            self.written += len(batch)
+            return len(batch)
+
+    async def close(self):
+        """Stop the background loop and flush what's left; returns number of users written"""
+        written_before = self.written
+        # Not cancelled: a flush in progress must finish, not lose its batch
+        self._closing = True
+        if self._task is not None:
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+        return self.written - written_before
+
+    def stats(self):
+        return {
+            'queue_depth': len(self._pending),
+            'oldest_pending_s': round(time.monotonic() - self._oldest_enqueued_at, 1) if self._oldest_enqueued_at else 0,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'flushes': self.flushes,
+            'failures': self.failures,
+            'last_flush_ms': round(self.last_flush_ms, 1),
+            'max_flush_ms': round(self.max_flush_ms, 1),
+        }
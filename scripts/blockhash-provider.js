@@ -0,0 +1,282 @@
+// Shared recent-blockhash cache. One provider per RPC endpoint and commitment refreshes the blockhash
+// in the background every BLOCKHASH_REFRESH_MS while transactions are being built, so a transaction
+// takes the cached value instead of waiting on getLatestBlockhash, and moving past an expired
+// blockhash is usually a lookup. Polling stops after IDLE_STOP_MS without requests.
+//
+// Across processes: `node blockhash-provider.js --serve` (started by main.py on BLOCKHASH_SERVICE_PORT)
+// keeps one refresh loop on 127.0.0.1, and providers in other Node processes read from it before
+// falling back to the RPC.
+// GET /blockhash?commitment=finalized -> {"blockhash": "...", "lastValidBlockHeight": 123, "fetchedAt": 1700000000000}
+// POST /signature-statuses {"signatures": [...]} -> {"blockHeight": 123, "statuses": {"<signature>": status|null}}
+//   (confirmation-tracker.js: the signatures of every process go into the service's batched polls)
+const http = require('http');
+const axios = require('axios');
+const config = require('./config');
+
+const IDLE_STOP_MS = 30000;
+const SERVICE_TIMEOUT_MS = 250;
+// The first status request for a signature waits on an RPC round trip
+const STATUS_TIMEOUT_MS = 3000;
+const COMMITMENTS = ['processed', 'confirmed', 'finalized'];
+
+// True inside the --serve process, its providers always go to the RPC
+let serving = false;
+
+function defaultServiceUrl(endpoint) {
+  if (serving || !config.BLOCKHASH_SERVICE_PORT || endpoint !== config.NETWORK_URL) return null;
+  return `http://127.0.0.1:${config.BLOCKHASH_SERVICE_PORT}`;
+}
+
+function fetchFromService(serviceUrl, commitment) {
+  return new Promise((resolve, reject) => {
+    const request = http.get(`${serviceUrl}/blockhash?commitment=${commitment}`, { timeout: SERVICE_TIMEOUT_MS }, (response) => {
+      let body = '';
+      response.setEncoding('utf-8');
+      response.on('data', (chunk) => { body += chunk; });
+      response.on('end', () => {
+        if (response.statusCode !== 200) return reject(new Error(`blockhash service returned ${response.statusCode}`));
+        try {
+          resolve(JSON.parse(body));
+        } catch (error) {
+          reject(error);
+        }
+      });
+    });
+    request.on('timeout', () => request.destroy(new Error('blockhash service timeout')));
+    request.on('error', reject);
+  });
+}
+
+function servicePost(serviceUrl, path, payload) {
+  return new Promise((resolve, reject) => {
+    const body = JSON.stringify(payload);
+    const request = http.request(`${serviceUrl}${path}`, {
+      method: 'POST',
+      timeout: STATUS_TIMEOUT_MS,
+      headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(body) }
+    }, (response) => {
+      let data = '';
+      response.setEncoding('utf-8');
+      response.on('data', (chunk) => { data += chunk; });
+      response.on('end', () => {
+        if (response.statusCode !== 200) return reject(new Error(`local service returned ${response.statusCode}`));
+        try {
+          resolve(JSON.parse(data));
+        } catch (error) {
+          reject(error);
+        }
+      });
+    });
+    request.on('timeout', () => request.destroy(new Error('local service timeout')));
+    request.on('error', reject);
+    request.end(body);
+  });
+}
+
+function readBody(request) {
+  return new Promise((resolve, reject) => {
+    let body = '';
+    request.setEncoding('utf-8');
+    request.on('data', (chunk) => { body += chunk; });
+    request.on('end', () => resolve(body));
+    request.on('error', reject);
+  });
+}
+
+// Registers the signatures with this process's tracker and answers with their last known statuses
+async function signatureStatuses(request) {
+  // Loaded here, confirmation-tracker.js requires this module
+  const { Connection } = require('@solana/web3.js');
+  const { getConfirmationTracker } = require('./confirmation-tracker');
+  const tracker = getConfirmationTracker(new Connection(config.NETWORK_URL, 'confirmed'));
+
+  const { signatures = [] } = JSON.parse(await readBody(request) || '{}');
+  const entries = signatures.map(signature => [signature, tracker.watch(signature)]);
+  // New signatures (or a cold tracker) are looked up now rather than on the next tick
+  if (tracker.blockHeight === null || entries.some(([, entry]) => entry.status === null)) await tracker.poll();
+
+  const statuses = {};
+  for (const [signature, entry] of entries) statuses[signature] = entry.status;
+  return { blockHeight: tracker.blockHeight, statuses };
+}
+
+class BlockhashProvider {
+  constructor(endpoint, commitment = 'finalized', options = {}) {
+    this.endpoint = endpoint;
+    this.commitment = commitment;
+    this.refreshMs = options.refreshMs || config.BLOCKHASH_REFRESH_MS || 400;
+    this.serviceUrl = options.serviceUrl === undefined ? defaultServiceUrl(endpoint) : options.serviceUrl;
+    // Keep refreshing without requests (the --serve process)
+    this.keepAlive = !!options.keepAlive;
+
+    this.current = null; // { blockhash, lastValidBlockHeight, fetchedAt }
+    this.inflight = null;
+    this.timer = null;
+    this.lastUsed = 0;
+    this.failing = false;
+
+    this.rpcFetches = 0;
+    this.serviceFetches = 0;
+    this.hits = 0;
+  }
+
+  // Cached blockhash if it is at most maxAgeMs old, otherwise waits for a fetch
+  async getLatest(maxAgeMs = this.refreshMs * 2) {
+    this.lastUsed = Date.now();
+    this.ensureRunning();
+
+    if (this.current && Date.now() - this.current.fetchedAt <= maxAgeMs) {
+      this.hits++;
+      return this.current;
+    }
+    return this.refresh();
+  }
+
+  // A blockhash other than `expired`: the cached one if it has moved on already, a fresh fetch otherwise
+  async rotate(expired) {
+    const latest = await this.getLatest();
+    if (latest.blockhash !== expired) return latest;
+    return this.refresh();
+  }
+
+  refresh() {
+    // Single flight: concurrent callers share one request
+    if (!this.inflight) {
+      this.inflight = this.fetch()
+        .then((value) => {
+          this.current = value;
+          return value;
+        })
+        .finally(() => { this.inflight = null; });
+    }
+    return this.inflight;
+  }
+
+  async fetch() {
+    if (this.serviceUrl) {
+      try {
+        const value = await fetchFromService(this.serviceUrl, this.commitment);
+        if (value && value.blockhash && Date.now() - value.fetchedAt <= this.refreshMs * 2) {
+          this.serviceFetches++;
+          return value;
+        }
+      } catch (error) {
+        // Service not running, use the RPC
+      }
+    }
+
+    this.rpcFetches++;
+    const response = await axios.post(this.endpoint, {
+      jsonrpc: '2.0',
+      id: 1,
+      method: 'getLatestBlockhash',
+      params: [{ commitment: this.commitment }]
+    }, {
+      headers: { 'Content-Type': 'application/json' },
+      timeout: 10000
+    });
+
+    const value = response.data && response.data.result && response.data.result.value;
+    if (!value) {
+      throw new Error(`getLatestBlockhash failed: ${JSON.stringify(response.data && response.data.error)}`);
+    }
+    return { blockhash: value.blockhash, lastValidBlockHeight: value.lastValidBlockHeight, fetchedAt: Date.now() };
+  }
+
+  ensureRunning() {
+    if (this.timer) return;
+
+    const tick = async () => {
+      if (!this.keepAlive && Date.now() - this.lastUsed > IDLE_STOP_MS) {
+        this.timer = null;
+        return;
+      }
+      try {
+        await this.refresh();
+        if (this.failing) console.log('Blockhash refresh recovered');
+        this.failing = false;
+      } catch (error) {
+        // Once per outage, not every tick
+        if (!this.failing) console.warn(`Blockhash refresh failed: ${error.message}`);
+        this.failing = true;
+      }
+      this.schedule(tick);
+    };
+    this.schedule(tick);
+  }
+
+  schedule(tick) {
+    this.timer = setTimeout(tick, this.refreshMs);
+    // Never keeps a short-lived script alive
+    this.timer.unref();
+  }
+
+  stop() {
+    clearTimeout(this.timer);
+    this.timer = null;
+  }
+
+  stats() {
+    return { hits: this.hits, rpcFetches: this.rpcFetches, serviceFetches: this.serviceFetches };
+  }
+}
+
+// endpoint|commitment -> provider, shared by all scripts in this process
+const providers = new Map();
+
+function getBlockhashProvider(endpoint = config.NETWORK_URL, commitment = 'finalized') {
+  const key = `${endpoint}|${commitment}`;
+  if (!providers.has(key)) {
+    providers.set(key, new BlockhashProvider(endpoint, commitment, { keepAlive: serving }));
+  }
+  return providers.get(key);
+}
+
+function serve(port = config.BLOCKHASH_SERVICE_PORT) {
+  serving = true;
+  // Warm the common commitment so the first client gets a cached value
+  getBlockhashProvider(config.NETWORK_URL, 'finalized').refresh().catch(() => {});
+  getBlockhashProvider(config.NETWORK_URL, 'finalized').ensureRunning();
+
+  const server = http.createServer(async (request, response) => {
+    const url = new URL(request.url, 'http://127.0.0.1');
+    if (request.method === 'POST' && url.pathname === '/signature-statuses') {
+      try {
+        const value = await signatureStatuses(request);
+        response.writeHead(200, { 'Content-Type': 'application/json' });
+        return response.end(JSON.stringify(value));
+      } catch (error) {
+        response.writeHead(503, { 'Content-Type': 'application/json' });
+        return response.end(JSON.stringify({ error: error.message }));
+      }
+    }
+
+    const commitment = url.searchParams.get('commitment') || 'finalized';
+    if (url.pathname !== '/blockhash' || !COMMITMENTS.includes(commitment)) {
+      response.writeHead(404);
+      return response.end();
+    }
+
+    try {
+      const value = await getBlockhashProvider(config.NETWORK_URL, commitment).getLatest();
+      response.writeHead(200, { 'Content-Type': 'application/json' });
+      response.end(JSON.stringify(value));
+    } catch (error) {
+      response.writeHead(503, { 'Content-Type': 'application/json' });
+      response.end(JSON.stringify({ error: error.message }));
+    }
+  });
+
+  server.on('error', (error) => {
+    console.error(`Blockhash service failed: ${error.message}`);
+    process.exit(1);
+  });
+  server.listen(port, '127.0.0.1', () => console.log(`Blockhash service listening on 127.0.0.1:${port}`));
+  return server;
+}
+
+module.exports = { BlockhashProvider, getBlockhashProvider, serve, defaultServiceUrl, servicePost };
+
+if (require.main === module && process.argv.includes('--serve')) {
+  serve();
+}
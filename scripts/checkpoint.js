@@ -0,0 +1,132 @@
+// Stage checkpoints of a creation job. Each finished stage is reported as a
+// {"type": "checkpoint", "stage": ..., "payload": {...}} progress event and stored in the job record
+// (utils/creation_jobs.py). A retried job passes them back as params.CHECKPOINT; verify() re-checks
+// them on-chain and drops every unconfirmed stage together with the stages depending on it, so the
+// pipeline continues from the first unfinished stages instead of recreating what is already on-chain.
+// A stage is only dropped when the chain says it did not happen; when it can't be checked (RPC error,
+// rate limit) verify() throws and the job fails, to be retried later with its checkpoint intact.
+const bs58 = require('bs58');
+const { PublicKey } = require('@solana/web3.js');
+const { getMint, TokenAccountNotFoundError } = require('@solana/spl-token');
+const { emitCheckpoint } = require('./progress');
+const { getMetadataAddress } = require('./tx-packer');
+
+// Stage -> stages it depends on, same graph as creationStages() in solana-token.js (in topological order)
+const STAGE_DEPENDENCIES = {
+  metadata_uploaded: [],
+  token_created: ['metadata_uploaded'],
+  metadata_set: ['token_created'],
+  tokens_sent: ['token_created'],
+  freeze_authority_revoked: ['token_created'],
+  mint_authority_revoked: ['token_created'],
+  update_authority_revoked: ['metadata_set']
+};
+const STAGES = Object.keys(STAGE_DEPENDENCIES);
+
+function isSignature(signature) {
+  try {
+    return bs58.decode(signature).length === 64;
+  } catch (error) {
+    return false;
+  }
+}
+
+// False when the signature is malformed (placeholder), unknown or failed; RPC errors are thrown
+async function isSignatureConfirmed(connection, signature) {
+  if (!signature || !isSignature(signature)) return false;
+  const { value } = await connection.getSignatureStatuses([signature], { searchTransactionHistory: true });
+  const status = value[0];
+  return !!status && !status.err &&
+    (status.confirmationStatus === 'confirmed' || status.confirmationStatus === 'finalized');
+}
+
+async function accountExists(connection, address) {
+  return (await connection.getAccountInfo(new PublicKey(address))) !== null;
+}
+
+// Mint account of the job's token, null when it does not exist
+async function readMint(connection, tokenMint) {
+  try {
+    return await getMint(connection, new PublicKey(tokenMint));
+  } catch (error) {
+    if (error instanceof TokenAccountNotFoundError) return null;
+    throw error;
+  }
+}
+
+// How each stage is confirmed: on-chain state where there is some, signature status otherwise.
+// Only stages without an on-chain effect (IPFS upload) are trusted as recorded. A send is confirmed by
+// its transfer signature; a record without one is redone.
+const VERIFIERS = {
+  token_created: (connection, data) => accountExists(connection, data.tokenMint),
+  metadata_uploaded: async (connection, data) => !!data.uri,
+  metadata_set: (connection, data, state) => accountExists(connection, getMetadataAddress(state.token_created.tokenMint)),
+  tokens_sent: (connection, data) => isSignatureConfirmed(connection, data.signature),
+  freeze_authority_revoked: async (connection, data, state) => {
+    const mint = await readMint(connection, state.token_created.tokenMint);
+    return !!mint && mint.freezeAuthority === null;
+  },
+  mint_authority_revoked: async (connection, data, state) => {
+    const mint = await readMint(connection, state.token_created.tokenMint);
+    return !!mint && mint.mintAuthority === null;
+  },
+  update_authority_revoked: (connection, data) => isSignatureConfirmed(connection, data.signature)
+};
+
+class Checkpoint {
+  constructor(initial = null) {
+    this.state = { ...(initial || {}) };
+    this.resumed = [];
+  }
+
+  has(stage) {
+    return Object.prototype.hasOwnProperty.call(this.state, stage);
+  }
+
+  get(stage) {
+    return this.state[stage];
+  }
+
+  record(stage, data = {}) {
+    this.state[stage] = data;
+    emitCheckpoint(stage, data);
+  }
+
+  // Keep the confirmed stages whose recorded dependencies are confirmed too, returns the stages that will be skipped.
+  // Throws if a stage can't be checked: dropping it (and everything after it) would recreate on-chain work.
+  async verify(connection) {
+    const confirmed = {};
+    const dropped = new Set();
+
+    for (const stage of STAGES) {
+      if (!this.has(stage)) continue;
+
+      if (STAGE_DEPENDENCIES[stage].some(dep => dropped.has(dep))) {
+        dropped.add(stage);
+        continue;
+      }
+
+      let ok;
+      try {
+        ok = await VERIFIERS[stage](connection, this.state[stage], confirmed);
+      } catch (error) {
+        error.message = `Checkpoint ${stage} could not be verified: ${error.message}`;
+        throw error;
+      }
+
+      if (!ok) {
+        console.log(`Checkpoint ${stage} not confirmed on-chain, redoing it`);
+        dropped.add(stage);
+        continue;
+      }
+      confirmed[stage] = this.state[stage];
+    }
+
+    this.state = confirmed;
+    this.resumed = Object.keys(confirmed);
+    if (this.resumed.length) console.log(`Resuming job, confirmed stages: ${this.resumed.join(', ')}`);
+    return this.resumed;
+  }
+}
+
+module.exports = { STAGES, STAGE_DEPENDENCIES, Checkpoint, getMetadataAddress, isSignatureConfirmed };
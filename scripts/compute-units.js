@@ -0,0 +1,168 @@
+// Compute-unit limits from simulation. Each instruction mix (program + instruction discriminator of
+// every instruction, in order) is simulated once; the measured units plus COMPUTE_UNITS.MARGIN become
+// its SetComputeUnitLimit and are kept in database/compute-units.json, so later transactions of the
+// same shape (any process) skip the simulation. A mix that isn't cached, or whose limit turned out too
+// low, is simulated again. Every measurement is logged and emitted as a compute_units progress event
+// per transaction class, with the previous measurement to spot regressions.
+const fs = require('fs');
+const path = require('path');
+const { TransactionMessage, VersionedTransaction, ComputeBudgetProgram } = require('@solana/web3.js');
+const config = require('./config');
+const { emitComputeUnits } = require('./progress');
+const { getBlockhashProvider } = require('./blockhash-provider');
+
+const PROFILES_PATH = path.join(__dirname, '..', 'database', 'compute-units.json');
+// Per-transaction maximum, used while simulating
+const MAX_COMPUTE_UNITS = 1400000;
+// ComputeBudget instruction discriminator of SetComputeUnitLimit
+const SET_COMPUTE_UNIT_LIMIT = 2;
+
+function isComputeBudget(instruction) {
+  return instruction.programId.equals(ComputeBudgetProgram.programId);
+}
+
+// Compute-budget instructions are left out, they are what this sets
+function instructionMix(instructions) {
+  return instructions
+    .filter(instruction => !isComputeBudget(instruction))
+    .map(instruction => `${instruction.programId.toString()}:${instruction.data.length ? instruction.data[0] : '-'}`)
+    .join(',');
+}
+
+function isComputeExceededError(error) {
+  const lines = [String(error && error.message), ...((error && error.logs) || [])];
+  return lines.some(line => line.includes('exceeded CUs') || line.includes('ComputationalBudgetExceeded'));
+}
+
+class ComputeUnitProfiles {
+  constructor(profilesPath = PROFILES_PATH, settings = config.COMPUTE_UNITS) {
+    this.profilesPath = profilesPath;
+    this.settings = settings;
+    this.profiles = null;
+    this.inflight = new Map();
+  }
+
+  load() {
+    if (this.profiles === null) {
+      try {
+        this.profiles = JSON.parse(fs.readFileSync(this.profilesPath, 'utf-8'));
+      } catch (error) {
+        this.profiles = {};
+      }
+    }
+    return this.profiles;
+  }
+
+  save() {
+    try {
+      fs.mkdirSync(path.dirname(this.profilesPath), { recursive: true });
+      const tmpPath = `${this.profilesPath}.${process.pid}.tmp`;
+      fs.writeFileSync(tmpPath, JSON.stringify(this.profiles, null, 2));
+      fs.renameSync(tmpPath, this.profilesPath);
+    } catch (error) {
+      // The in-memory profile still serves this process
+      console.warn(`Compute unit profiles not saved: ${error.message}`);
+    }
+  }
+
+  async simulate(connection, instructions, payerKey) {
+    const { blockhash } = await getBlockhashProvider(connection.rpcEndpoint).getLatest();
+    const message = new TransactionMessage({
+      payerKey,
+      recentBlockhash: blockhash,
+      instructions: [ComputeBudgetProgram.setComputeUnitLimit({ units: MAX_COMPUTE_UNITS }),
+        ...instructions.filter(instruction => !isComputeBudget(instruction))]
+    }).compileToV0Message();
+
+    const { value } = await connection.simulateTransaction(new VersionedTransaction(message), {
+      sigVerify: false,
+      replaceRecentBlockhash: true
+    });
+    if (value.err) throw new Error(`simulation failed: ${JSON.stringify(value.err)}`);
+    if (!value.unitsConsumed) throw new Error('simulation did not report units consumed');
+    return value.unitsConsumed;
+  }
+
+  // Limit for these instructions, null when they can't be simulated (the default budget applies)
+  async getLimit(connection, instructions, payerKey, txClass) {
+    const mix = instructionMix(instructions);
+    const profiles = this.load();
+    if (profiles[mix] && !profiles[mix].stale) return profiles[mix].limit;
+
+    // Concurrent transactions of the same shape share one simulation
+    if (!this.inflight.has(mix)) {
+      const request = (async () => {
+        try {
+          const measured = await this.simulate(connection, instructions, payerKey);
+          const { MARGIN, MIN_UNITS } = this.settings;
+          const limit = Math.min(MAX_COMPUTE_UNITS, Math.max(MIN_UNITS, Math.ceil(measured * (1 + MARGIN))));
+          const previous = profiles[mix] ? profiles[mix].measured : null;
+
+          profiles[mix] = { txClass, measured, limit, updatedAt: Date.now() };
+          this.save();
+
+          const change = previous ? ` (previously ${previous})` : '';
+          console.log(`Compute units for ${txClass}: ${measured} measured${change}, limit ${limit}`);
+          emitComputeUnits(txClass, { mix, measured, limit, previous });
+          return limit;
+        } catch (error) {
+          console.warn(`Compute units for ${txClass} not measured: ${error.message}`);
+          return null;
+        }
+      })().finally(() => this.inflight.delete(mix));
+      this.inflight.set(mix, request);
+    }
+    return this.inflight.get(mix);
+  }
+
+  // The limit was too low (program change, bigger data): simulate again next time, the old
+  // measurement stays for comparison
+  invalidate(instructions) {
+    const mix = instructionMix(instructions);
+    const profiles = this.load();
+    if (!profiles[mix]) return;
+
+    profiles[mix].stale = true;
+    this.save();
+  }
+
+  // For send errors: a compute-budget overrun invalidates the profile of the instructions
+  invalidateOnExceeded(error, instructions) {
+    if (isComputeExceededError(error)) this.invalidate(instructions);
+  }
+
+  // txClass -> measured units of its cached instruction mixes
+  report() {
+    const byClass = {};
+    for (const [mix, profile] of Object.entries(this.load())) {
+      (byClass[profile.txClass] = byClass[profile.txClass] || []).push({ mix, measured: profile.measured, limit: profile.limit });
+    }
+    return byClass;
+  }
+
+  async limitInstruction(connection, instructions, payerKey, txClass) {
+    const units = await this.getLimit(connection, instructions, payerKey, txClass);
+    return units ? ComputeBudgetProgram.setComputeUnitLimit({ units }) : null;
+  }
+}
+
+const computeUnits = new ComputeUnitProfiles();
+
+// Sets (or replaces) the compute-unit limit of a legacy Transaction; keeps the default when
+// the transaction can't be simulated
+async function withComputeUnitLimit(connection, transaction, txClass, payerKey) {
+  const others = transaction.instructions.filter(instruction =>
+    !(isComputeBudget(instruction) && instruction.data[0] === SET_COMPUTE_UNIT_LIMIT));
+  const limitInstruction = await computeUnits.limitInstruction(connection, others, payerKey, txClass);
+  transaction.instructions = limitInstruction ? [limitInstruction, ...others] : others;
+  return transaction;
+}
+
+module.exports = {
+  ComputeUnitProfiles, computeUnits, withComputeUnitLimit, instructionMix, MAX_COMPUTE_UNITS
+};
+
+if (require.main === module) {
+  // node compute-units.js -> measured units per transaction class
+  console.log(JSON.stringify(computeUnits.report(), null, 2));
+}
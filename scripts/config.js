@@ -50,10 +50,18 @@ function getConfigFromPython() {
     USER_WALLET: userWalletMatch[1]
   };
 
-  return { DEBUG_MODE, USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, TEST_MODE, PREDEFINED_MINT_PRIVATE_KEY, TEST_PARAMS };
+  // Optional, older config.py files don't have them
+  const blockhashRefreshMatch = configPy.match(/BLOCKHASH_REFRESH_MS\s*=\s*(\d+)/);
+  const BLOCKHASH_REFRESH_MS = blockhashRefreshMatch ? parseInt(blockhashRefreshMatch[1]) : 400;
+  const blockhashPortMatch = configPy.match(/BLOCKHASH_SERVICE_PORT\s*=\s*(\d+)/);
+  const BLOCKHASH_SERVICE_PORT = blockhashPortMatch ? parseInt(blockhashPortMatch[1]) : 0;
+
+  return { DEBUG_MODE, USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, TEST_MODE, PREDEFINED_MINT_PRIVATE_KEY, TEST_PARAMS,
+    BLOCKHASH_REFRESH_MS, BLOCKHASH_SERVICE_PORT };
 }
 
-const { DEBUG_MODE, USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, TEST_MODE, PREDEFINED_MINT_PRIVATE_KEY, TEST_PARAMS } = getConfigFromPython();
+const { DEBUG_MODE, USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, TEST_MODE, PREDEFINED_MINT_PRIVATE_KEY, TEST_PARAMS,
+  BLOCKHASH_REFRESH_MS, BLOCKHASH_SERVICE_PORT } = getConfigFromPython();
 
 const USE_MAINNET = !DEBUG_MODE;
 
@@ -70,15 +78,63 @@ const DECIMALS = 9;
 
 const REVOKE_AUTHORITIES = { MINT: true, FREEZE: true, UPDATE: true };
 
+// Transfer the whole supply from the service wallet to the job's USER_WALLET once the mint exists
+const SEND_TO_USER_WALLET = true;
+
 const TOKEN_INFO_PATH = 'token-info.json';
 
+// Priority fees (fee-oracle.js): each transaction class pays a percentile of the fees recently paid
+// on its writable accounts, in micro-lamports per compute unit
+const PRIORITY_FEES = {
+  URGENCY: { creation: 'high', revoke: 'medium', nonce: 'medium', payout: 'low' },
+  PERCENTILES: { low: 50, medium: 75, high: 90 },
+  MIN_MICRO_LAMPORTS: 1000,
+  MAX_MICRO_LAMPORTS: 2000000, // cap, a fee spike never costs more than this
+  CACHE_TTL_MS: 5000
+};
+
+// Transaction sender (tx-sender.js): rebroadcast the signed transaction until it confirms or expires
+const SENDER = {
+  REBROADCAST_MS: 1000,
+  MAX_REBUILDS: 2, // new blockhash + signature after an expiry, at most this many times
+  // Wall-clock cap per attempt, in case expiry can't be checked (RPC down); above a blockhash's
+  // lifetime and NONCE_POOL.MAX_WAIT_MS, so it only fires when the normal checks are failing
+  ATTEMPT_TIMEOUT_MS: 90000
+};
+
+// Confirmation tracker (confirmation-tracker.js): one batched getSignatureStatuses poll for every
+// pending signature. WS_URL (e.g. 'ws://127.0.0.1:8900' of a local validator) adds a signature
+// subscription per transaction; subscribed signatures are then only polled every WS_FALLBACK_TICKS ticks
+const TRACKER = {
+  POLL_MS: 500,
+  WS_URL: null,
+  WS_FALLBACK_TICKS: 10
+};
+
+// Durable-nonce pool (nonce-pool.js): creation and revocation transactions use a leased nonce account
+// instead of a recent blockhash, so they don't expire. Off until accounts are created with
+// `node nonce-pool.js bootstrap <count>`
+const NONCE_POOL = {
+  ENABLED: false,
+  LEASE_MS: 120000, // a lease not returned by then (crashed job) is taken over
+  CHECK_MS: 2000, // how often a pending nonce transaction checks whether its nonce moved on
+  MAX_WAIT_MS: 60000 // a nonce transaction not landed by then is cancelled by advancing its nonce
+};
+
+// Compute-unit limits (compute-units.js): simulated units plus MARGIN, cached per instruction mix
+const COMPUTE_UNITS = {
+  MARGIN: 0.15,
+  MIN_UNITS: 1000
+};
+
 // PLACEHOLDER IPFS KEYS - Replace with your own
 const PINATA_API_KEY = 'your-pinata-api-key';
 const PINATA_SECRET_KEY = 'your-pinata-secret-key';
 
 module.exports = {
   DEBUG_MODE, USE_MAINNET, NETWORK_URL, WALLET_TYPE, WALLET_PATH,
-  DECIMALS, REVOKE_AUTHORITIES, TOKEN_INFO_PATH,
+  DECIMALS, REVOKE_AUTHORITIES, SEND_TO_USER_WALLET, TOKEN_INFO_PATH, PRIORITY_FEES, COMPUTE_UNITS, SENDER, TRACKER, NONCE_POOL,
   PINATA_API_KEY, PINATA_SECRET_KEY, TEST_MODE, TEST_PARAMS,
-  USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, PREDEFINED_MINT_PRIVATE_KEY
+  USE_PREDEFINED_MINT, USE_MEME_MINT_DATABASE, PREDEFINED_MINT_PRIVATE_KEY,
+  BLOCKHASH_REFRESH_MS, BLOCKHASH_SERVICE_PORT
 };
\ No newline at end of file
@@ -0,0 +1,213 @@
+// Shared signature-confirmation tracker. Every pending signature in the process is collected and
+// resolved by one poll loop (TRACKER.POLL_MS) that asks getSignatureStatuses for up to 256 signatures
+// per request and reads the block height once for all of them, instead of one loop per transaction.
+// With the local service running (blockhash-provider.js --serve) the poll goes to it, so signatures
+// of all worker and payout processes end up in the service's batches.
+// With TRACKER.WS_URL set (e.g. a local validator's websocket), each signature also gets an
+// onSignature subscription and is only polled every WS_FALLBACK_TICKS ticks as a safety net.
+const { Connection } = require('@solana/web3.js');
+const config = require('./config');
+const { defaultServiceUrl, servicePost } = require('./blockhash-provider');
+
+const MAX_SIGNATURES_PER_REQUEST = 256;
+// A signature nobody asked about for this long is dropped (service side)
+const FORGET_AFTER_MS = 60000;
+
+function reaches(status, commitment) {
+  if (!status || status.err) return false;
+  return commitment === 'finalized'
+    ? status.confirmationStatus === 'finalized'
+    : ['confirmed', 'finalized'].includes(status.confirmationStatus);
+}
+
+class ConfirmationTracker {
+  constructor(connection, options = {}) {
+    const settings = { ...config.TRACKER, ...options };
+    this.connection = connection;
+    this.pollMs = settings.POLL_MS;
+    this.wsFallbackTicks = settings.WS_FALLBACK_TICKS;
+    this.serviceUrl = options.serviceUrl === undefined ? defaultServiceUrl(connection.rpcEndpoint) : options.serviceUrl;
+    this.wsConnection = settings.WS_URL
+      ? new Connection(connection.rpcEndpoint, { wsEndpoint: settings.WS_URL, commitment: 'confirmed' })
+      : null;
+
+    // signature -> { status, commitment, lastRequested, waiters: [{ resolve, reject }], subscription }
+    this.entries = new Map();
+    this.blockHeight = null;
+    this.ticks = 0;
+    this.timer = null;
+    this.inflight = null;
+
+    this.requests = 0;
+    this.signaturesPolled = 0;
+  }
+
+  // Promise of the signature's status once it reaches `commitment`; rejects if it landed with an error
+  track(signature, commitment = 'confirmed') {
+    const entry = this.watch(signature, commitment);
+    if (reaches(entry.status, commitment)) return Promise.resolve(entry.status);
+
+    const promise = new Promise((resolve, reject) => entry.waiters.push({ resolve, reject }));
+    this.subscribe(signature, entry);
+    this.ensureRunning();
+    return promise;
+  }
+
+  // Register a signature without waiting on it (service side), returns its entry
+  watch(signature, commitment = 'confirmed') {
+    let entry = this.entries.get(signature);
+    if (!entry) {
+      entry = { status: null, commitment, lastRequested: Date.now(), waiters: [], subscription: null };
+      this.entries.set(signature, entry);
+    }
+    if (commitment === 'finalized') entry.commitment = 'finalized';
+    entry.lastRequested = Date.now();
+    this.ensureRunning();
+    return entry;
+  }
+
+  // Stop tracking, pending promises are left unsettled (the caller gave up on the transaction)
+  forget(signature) {
+    const entry = this.entries.get(signature);
+    if (!entry) return;
+    this.unsubscribe(entry);
+    this.entries.delete(signature);
+  }
+
+  subscribe(signature, entry) {
+    if (!this.wsConnection || entry.subscription !== null) return;
+    try {
+      entry.subscription = this.wsConnection.onSignature(signature, (result) => {
+        entry.subscription = null;
+        this.settle(signature, { err: result.err, confirmationStatus: entry.commitment });
+      }, entry.commitment);
+    } catch (error) {
+      console.warn(`Signature subscription failed, polling ${signature}: ${error.message}`);
+    }
+  }
+
+  unsubscribe(entry) {
+    if (entry.subscription === null) return;
+    this.wsConnection.removeSignatureListener(entry.subscription).catch(() => {});
+    entry.subscription = null;
+  }
+
+  settle(signature, status) {
+    const entry = this.entries.get(signature);
+    if (!entry || !status) return;
+    entry.status = status;
+
+    if (status.err) {
+      const error = new Error(`Transaction ${signature} failed: ${JSON.stringify(status.err)}`);
+      error.transactionError = status.err;
+      entry.waiters.splice(0).forEach(waiter => waiter.reject(error));
+    } else if (reaches(status, entry.commitment)) {
+      entry.waiters.splice(0).forEach(waiter => waiter.resolve(status));
+    } else {
+      return;
+    }
+    this.unsubscribe(entry);
+  }
+
+  // Signatures due for this tick: not settled yet, and either waited on or recently asked about
+  due() {
+    const now = Date.now();
+    const pollSubscribed = this.ticks % this.wsFallbackTicks === 0;
+    const signatures = [];
+
+    for (const [signature, entry] of this.entries) {
+      const settled = entry.status && (entry.status.err || reaches(entry.status, entry.commitment));
+      if (!entry.waiters.length && now - entry.lastRequested > FORGET_AFTER_MS) {
+        this.forget(signature);
+      } else if (!settled && (entry.subscription === null || pollSubscribed)) {
+        signatures.push(signature);
+      }
+    }
+    return signatures;
+  }
+
+  async fetchStatuses(signatures) {
+    if (this.serviceUrl) {
+      try {
+        return await servicePost(this.serviceUrl, '/signature-statuses', { signatures });
+      } catch (error) {
+        // Service not running, ask the RPC
+      }
+    }
+
+    const chunks = [];
+    for (let i = 0; i < signatures.length; i += MAX_SIGNATURES_PER_REQUEST) {
+      chunks.push(signatures.slice(i, i + MAX_SIGNATURES_PER_REQUEST));
+    }
+    const [blockHeight, ...results] = await Promise.all([
+      this.connection.getBlockHeight('confirmed'),
+      ...chunks.map(chunk => this.connection.getSignatureStatuses(chunk))
+    ]);
+    this.requests += chunks.length;
+    this.signaturesPolled += signatures.length;
+
+    const statuses = {};
+    chunks.forEach((chunk, i) => chunk.forEach((signature, j) => { statuses[signature] = results[i].value[j]; }));
+    return { blockHeight, statuses };
+  }
+
+  // One tick; concurrent callers share it
+  poll() {
+    if (!this.inflight) {
+      this.inflight = (async () => {
+        const signatures = this.due();
+        this.ticks++;
+        if (!signatures.length && !this.waiting()) return;
+
+        const { blockHeight, statuses } = await this.fetchStatuses(signatures);
+        if (blockHeight !== null && blockHeight !== undefined) this.blockHeight = blockHeight;
+        for (const [signature, status] of Object.entries(statuses)) {
+          if (this.entries.has(signature)) this.settle(signature, status);
+        }
+      })().finally(() => { this.inflight = null; });
+    }
+    return this.inflight;
+  }
+
+  waiting() {
+    for (const entry of this.entries.values()) {
+      if (entry.waiters.length) return true;
+    }
+    return false;
+  }
+
+  ensureRunning() {
+    if (this.timer) return;
+    const tick = async () => {
+      try {
+        await this.poll();
+      } catch (error) {
+        console.warn(`Signature status poll failed: ${error.message}`);
+      }
+      if (!this.entries.size) {
+        this.timer = null;
+        return;
+      }
+      this.timer = setTimeout(tick, this.pollMs);
+      this.timer.unref();
+    };
+    this.timer = setTimeout(tick, 0);
+    this.timer.unref();
+  }
+
+  stats() {
+    return { pending: this.entries.size, requests: this.requests, signaturesPolled: this.signaturesPolled };
+  }
+}
+
+// rpcEndpoint -> tracker, shared by every transaction in this process
+const trackers = new Map();
+
+function getConfirmationTracker(connection, options = {}) {
+  if (!trackers.has(connection.rpcEndpoint)) {
+    trackers.set(connection.rpcEndpoint, new ConfirmationTracker(connection, options));
+  }
+  return trackers.get(connection.rpcEndpoint);
+}
+
+module.exports = { ConfirmationTracker, getConfirmationTracker, reaches, MAX_SIGNATURES_PER_REQUEST };
@@ -0,0 +1,115 @@
+// Small dependency-graph executor. Each stage declares the values it needs (inputs) and the values
+// it produces (outputs); a stage starts as soon as all its inputs exist, so independent stages
+// run concurrently. The report has per-stage timings and the critical path (the chain of
+// dependent stages that bounds the total time).
+//
+// Stage: { name, inputs: ['tokenMint'], outputs: ['metadataSignature'], run: async (values) => ({ metadataSignature }) }
+// A stage whose `when(values)` returns false is skipped and its outputs are set to null.
+
+function validateStages(stages, initial) {
+  const producers = {};
+  for (const stage of stages) {
+    for (const output of stage.outputs || []) {
+      if (producers[output]) throw new Error(`Output ${output} produced by both ${producers[output]} and ${stage.name}`);
+      producers[output] = stage.name;
+    }
+  }
+  for (const stage of stages) {
+    for (const input of stage.inputs || []) {
+      if (!producers[input] && !(input in initial)) throw new Error(`Stage ${stage.name}: no producer for ${input}`);
+    }
+  }
+  return producers;
+}
+
+function criticalPath(stages, producers, timings) {
+  // Longest chain of dependent stages by duration, stages finish in dependency order
+  const finish = {};
+  const previous = {};
+  const order = stages.filter(stage => timings[stage.name]).sort((a, b) => timings[a.name].end - timings[b.name].end);
+
+  for (const stage of order) {
+    let best = null;
+    for (const input of stage.inputs || []) {
+      const dep = producers[input];
+      if (dep && finish[dep] !== undefined && (best === null || finish[dep] > finish[best])) best = dep;
+    }
+    finish[stage.name] = timings[stage.name].ms + (best ? finish[best] : 0);
+    previous[stage.name] = best;
+  }
+
+  let last = null;
+  for (const name of Object.keys(finish)) {
+    if (last === null || finish[name] > finish[last]) last = name;
+  }
+
+  const path = [];
+  for (let name = last; name; name = previous[name]) path.unshift(name);
+  return { path, ms: last ? finish[last] : 0 };
+}
+
+async function runDag(stages, initial = {}) {
+  const producers = validateStages(stages, initial);
+  const values = { ...initial };
+  const timings = {};
+  const pending = new Set(stages.map(stage => stage.name));
+  const running = new Map();
+  const startedAt = Date.now();
+  let failure = null;
+
+  const ready = (stage) => (stage.inputs || []).every(input => input in values);
+
+  while (pending.size || running.size) {
+    if (!failure) {
+      for (const stage of stages) {
+        if (!pending.has(stage.name) || !ready(stage)) continue;
+        pending.delete(stage.name);
+
+        const start = Date.now();
+        const skip = !!(stage.when && !stage.when(values));
+        const record = (failed) => {
+          const end = Date.now();
+          timings[stage.name] = { start: start - startedAt, end: end - startedAt, ms: end - start, skipped: skip, failed };
+        };
+
+        const task = (async () => {
+          const produced = skip ? {} : ((await stage.run(values)) || {});
+          record(false);
+          for (const output of stage.outputs || []) {
+            values[output] = output in produced ? produced[output] : null;
+          }
+        })().catch((error) => {
+          record(true);
+          failure = failure || Object.assign(error, { stage: stage.name });
+        }).finally(() => running.delete(stage.name));
+
+        running.set(stage.name, task);
+      }
+    }
+
+    if (!running.size) {
+      if (!failure && pending.size) throw new Error(`Stages can never run: ${[...pending].join(', ')}`);
+      break;
+    }
+    await Promise.race(running.values());
+  }
+
+  const critical = criticalPath(stages, producers, timings);
+  const report = { wallMs: Date.now() - startedAt, timings, criticalPath: critical.path, criticalPathMs: critical.ms };
+
+  if (failure) {
+    failure.dagReport = report;
+    throw failure;
+  }
+  return { values, report };
+}
+
+function formatDagReport(report) {
+  const lines = Object.entries(report.timings)
+    .sort((a, b) => a[1].start - b[1].start)
+    .map(([name, t]) => `  ${name}: ${t.ms} ms (${t.start}-${t.end} ms)${t.skipped ? ' skipped' : ''}${t.failed ? ' failed' : ''}`);
+  return [`Stage timings, wall ${report.wallMs} ms:`, ...lines,
+    `Critical path ${report.criticalPathMs} ms: ${report.criticalPath.join(' -> ')}`].join('\n');
+}
+
+module.exports = { runDag, formatDagReport };
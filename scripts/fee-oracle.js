@@ -0,0 +1,97 @@
+// Priority-fee oracle. Samples getRecentPrioritizationFees for the accounts a transaction writes,
+// caches the fee percentiles for CACHE_TTL_MS, and prices each transaction class by its urgency
+// (config.PRIORITY_FEES): creation pays a high percentile, payouts a low one.
+// Shared by solana-token.js (through tx-packer.js), the revoke scripts and referrals/payment-sender.js.
+const { PublicKey, ComputeBudgetProgram } = require('@solana/web3.js');
+const config = require('./config');
+
+// getRecentPrioritizationFees accepts at most 128 accounts
+const MAX_FEE_ACCOUNTS = 128;
+// ComputeBudget instruction discriminator of SetComputeUnitPrice
+const SET_COMPUTE_UNIT_PRICE = 3;
+
+function percentile(sorted, p) {
+  if (!sorted.length) return 0;
+  // Nearest rank
+  const rank = Math.ceil((p / 100) * sorted.length);
+  return sorted[Math.min(sorted.length, Math.max(1, rank)) - 1];
+}
+
+// Unique writable account keys of a list of instructions, these are what fee markets are local to
+function writableAccounts(instructions) {
+  const keys = new Set();
+  for (const instruction of instructions) {
+    for (const meta of instruction.keys) {
+      if (meta.isWritable) keys.add(meta.pubkey.toString());
+    }
+  }
+  return [...keys].slice(0, MAX_FEE_ACCOUNTS);
+}
+
+function isComputeUnitPrice(instruction) {
+  return instruction.programId.equals(ComputeBudgetProgram.programId) && instruction.data[0] === SET_COMPUTE_UNIT_PRICE;
+}
+
+class FeeOracle {
+  constructor(settings = config.PRIORITY_FEES) {
+    this.settings = settings;
+    // endpoint|accounts -> { fetchedAt, percentiles: { 50: fee, ... } }
+    this.cache = new Map();
+    this.inflight = new Map();
+  }
+
+  // { percentile: micro-lamports } over the recent slots, cached per account set
+  async getPercentiles(connection, accounts = []) {
+    const key = `${connection.rpcEndpoint}|${[...accounts].sort().join(',')}`;
+    const cached = this.cache.get(key);
+    if (cached && Date.now() - cached.fetchedAt <= this.settings.CACHE_TTL_MS) return cached.percentiles;
+
+    if (!this.inflight.has(key)) {
+      const request = (async () => {
+        const recent = await connection.getRecentPrioritizationFees({
+          lockedWritableAccounts: accounts.map(account => new PublicKey(account))
+        });
+        const fees = recent.map(entry => entry.prioritizationFee).sort((a, b) => a - b);
+        const percentiles = {};
+        for (const p of Object.values(this.settings.PERCENTILES)) percentiles[p] = percentile(fees, p);
+        this.cache.set(key, { fetchedAt: Date.now(), percentiles });
+        return percentiles;
+      })().finally(() => this.inflight.delete(key));
+      this.inflight.set(key, request);
+    }
+    return this.inflight.get(key);
+  }
+
+  // Compute-unit price for a transaction class writing `accounts`; the minimum when fees can't be sampled
+  async getPriorityFee(connection, txClass, accounts = []) {
+    const { URGENCY, PERCENTILES, MIN_MICRO_LAMPORTS, MAX_MICRO_LAMPORTS } = this.settings;
+    const urgency = URGENCY[txClass] || 'medium';
+
+    try {
+      const percentiles = await this.getPercentiles(connection, accounts);
+      const fee = percentiles[PERCENTILES[urgency]];
+      return Math.min(MAX_MICRO_LAMPORTS, Math.max(MIN_MICRO_LAMPORTS, Math.ceil(fee)));
+    } catch (error) {
+      console.warn(`Priority fee sampling failed (${error.message}), using the minimum fee`);
+      return MIN_MICRO_LAMPORTS;
+    }
+  }
+
+  async computeUnitPriceInstruction(connection, txClass, instructions) {
+    const microLamports = await this.getPriorityFee(connection, txClass, writableAccounts(instructions));
+    console.log(`Priority fee for ${txClass}: ${microLamports} micro-lamports/CU`);
+    return ComputeBudgetProgram.setComputeUnitPrice({ microLamports });
+  }
+}
+
+const feeOracle = new FeeOracle();
+
+// Adds (or refreshes, on a retry) the compute-unit price of a legacy Transaction
+async function withPriorityFee(connection, transaction, txClass) {
+  const others = transaction.instructions.filter(instruction => !isComputeUnitPrice(instruction));
+  const priceInstruction = await feeOracle.computeUnitPriceInstruction(connection, txClass, others);
+  transaction.instructions = [priceInstruction, ...others];
+  return transaction;
+}
+
+module.exports = { FeeOracle, feeOracle, withPriorityFee, writableAccounts, percentile };
@@ -54,9 +54,11 @@ async function uploadToIPFSWithRetry(formData, metadataName, config, maxRetries
   }
 }
 
-function prepareImageFile(logoSource) {
+// Temp copies go into the job's workspace (workspace.js) so parallel jobs don't overwrite each other
+function prepareImageFile(logoSource, workspace = null) {
+  const workDir = workspace ? workspace.dir : __dirname;
   const isLocalFile = !logoSource.startsWith('http://') && !logoSource.startsWith('https://');
-  let tempImagePath = path.join(__dirname, 'temp_logo.jpg');
+  let tempImagePath = path.join(workDir, 'temp_logo.jpg');
 
   if (isLocalFile) {
     console.log('Using local image file...');
@@ -65,7 +67,7 @@ function prepareImageFile(logoSource) {
     }
 
     const originalExt = path.extname(logoSource);
-    tempImagePath = path.join(__dirname, `temp_logo${originalExt}`);
+    tempImagePath = path.join(workDir, `temp_logo${originalExt}`);
     fs.copyFileSync(logoSource, tempImagePath);
     console.log('Local file prepared for IPFS upload');
 
@@ -105,11 +107,11 @@ function createTokenMetadata(config, logoUrl) {
   };
 }
 
-async function uploadToIPFS(config) {
+async function uploadToIPFS(config, workspace = null) {
   try {
     console.log('Uploading metadata to IPFS...');
 
-    // IPFS upload implementation placeholder
+    // IPFS upload implementation placeholder (prepareImageFile(config.LOGO_URL, workspace) for the logo)
     await new Promise(resolve => setTimeout(resolve, 2000));
     console.log('✅ IPFS upload completed');
 
@@ -0,0 +1,250 @@
+// Durable-nonce pool. Nonce accounts whose authority is the service wallet are kept in
+// database/nonce_pool.db and leased to one transaction at a time (NONCE_POOL in config.js). A
+// transaction built on a nonce (advanceNonce first, the nonce value as its blockhash) has no expiry
+// window: it stays valid until the nonce is advanced, by itself landing or by a cancel.
+// Leases are rows in SQLite, so worker processes never share an account; a lease that is not
+// returned within LEASE_MS (crashed job) is taken over.
+//
+//   node nonce-pool.js bootstrap <count>  -> creates <count> nonce accounts and adds them to the pool
+//   node nonce-pool.js check              -> reconciles the pool with the accounts on chain
+const path = require('path');
+const crypto = require('crypto');
+const { Connection, Keypair, PublicKey, SystemProgram, Transaction, NonceAccount, NONCE_ACCOUNT_LENGTH } = require('@solana/web3.js');
+const config = require('./config');
+const { openDatabase, transaction, run, get, all } = require('../database/sqlite-store');
+const { sendLegacyTransaction } = require('./tx-sender');
+const { loadWallet } = require('./token-utils');
+
+const DB_PATH = path.join(__dirname, '..', 'database', config.DEBUG_MODE ? 'nonce_pool_test.db' : 'nonce_pool.db');
+// getMultipleAccountsInfo accepts at most 100 keys
+const MAX_ACCOUNTS_PER_REQUEST = 100;
+
+const MIGRATIONS = [
+  {
+    version: 1,
+    description: 'create nonce_accounts',
+    up: [`
+      CREATE TABLE IF NOT EXISTS nonce_accounts (
+        address TEXT PRIMARY KEY,
+        authority TEXT NOT NULL,
+        nonce TEXT,                            -- last known value, NULL once used (read again on lease)
+        status TEXT NOT NULL DEFAULT 'ready',  -- ready | leased | broken
+        lease_owner TEXT,
+        lease_expires_at INTEGER,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+      )
+    `, 'CREATE INDEX IF NOT EXISTS idx_nonce_accounts_status ON nonce_accounts (status, updated_at)']
+  }
+];
+
+function advanceInstruction(lease) {
+  return SystemProgram.nonceAdvance({
+    noncePubkey: new PublicKey(lease.address),
+    authorizedPubkey: new PublicKey(lease.authority)
+  });
+}
+
+class NoncePool {
+  constructor(dbFile = DB_PATH, settings = config.NONCE_POOL) {
+    this.dbFile = dbFile;
+    this.settings = settings;
+  }
+
+  open() {
+    return openDatabase(this.dbFile, MIGRATIONS);
+  }
+
+  // Current nonce value on chain, null when the account is gone or not a nonce account
+  async readNonce(connection, address) {
+    const account = await connection.getNonce(new PublicKey(address), 'confirmed');
+    return account ? account.nonce : null;
+  }
+
+  // { address, authority, nonce, owner } of a free account, null when the pool is off or all are leased.
+  // Only accounts whose authority is `authority` (the fee payer that signs the advance) are leased.
+  async lease(connection, authority) {
+    if (!this.settings.ENABLED) return null;
+    const db = await this.open();
+    const owner = `${process.pid}:${crypto.randomUUID()}`;
+    const now = Date.now();
+
+    const row = await transaction(db, async () => {
+      const free = await get(db, `
+        SELECT address, authority, nonce FROM nonce_accounts
+        WHERE authority = ? AND (status = 'ready' OR (status = 'leased' AND lease_expires_at < ?))
+        ORDER BY updated_at LIMIT 1
+      `, [authority.toString(), now]);
+      if (!free) return null;
+
+      await run(db, `
+        UPDATE nonce_accounts SET status = 'leased', lease_owner = ?, lease_expires_at = ?, updated_at = ?
+        WHERE address = ?
+      `, [owner, now + this.settings.LEASE_MS, now, free.address]);
+      return free;
+    });
+    if (!row) {
+      console.log('Nonce pool: no free account, using a recent blockhash');
+      return null;
+    }
+
+    const lease = { address: row.address, authority: row.authority, nonce: row.nonce, owner, sent: false };
+    try {
+      if (!lease.nonce) lease.nonce = await this.readNonce(connection, lease.address);
+    } catch (error) {
+      await this.release(lease);
+      console.warn(`Nonce pool: ${lease.address} not readable (${error.message}), using a recent blockhash`);
+      return null;
+    }
+    if (!lease.nonce) {
+      await this.markBroken(lease.address);
+      return null;
+    }
+    return lease;
+  }
+
+  // Returns the account to the pool. Once a transaction was sent on it, its nonce value has (or may
+  // have) moved on and is read again by the next lease.
+  async release(lease) {
+    const db = await this.open();
+    await run(db, `
+      UPDATE nonce_accounts
+      SET status = 'ready', nonce = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+      WHERE address = ? AND lease_owner = ?
+    `, [lease.sent ? null : lease.nonce, Date.now(), lease.address, lease.owner]);
+  }
+
+  async markBroken(address) {
+    const db = await this.open();
+    await run(db, `UPDATE nonce_accounts SET status = 'broken', lease_owner = NULL, updated_at = ? WHERE address = ?`,
+      [Date.now(), address]);
+    console.warn(`Nonce pool: ${address} is not a usable nonce account, run \`node nonce-pool.js check\``);
+  }
+
+  // Expiry test for tx-sender.js: a nonce transaction is dead once its nonce has moved on. One that
+  // hasn't landed after MAX_WAIT_MS is cancelled by advancing the nonce, so it can never land later.
+  expiryCheck(connection, lease, payer) {
+    const usedNonce = lease.nonce;
+    const sentAt = Date.now();
+    let lastCheck = sentAt;
+
+    return async () => {
+      if (Date.now() - lastCheck < this.settings.CHECK_MS) return false;
+      lastCheck = Date.now();
+
+      if (await this.readNonce(connection, lease.address) !== usedNonce) return true;
+      if (Date.now() - sentAt < this.settings.MAX_WAIT_MS) return false;
+
+      console.warn(`Nonce transaction on ${lease.address} not landed after ${this.settings.MAX_WAIT_MS} ms, cancelling`);
+      await sendLegacyTransaction(connection, new Transaction().add(advanceInstruction(lease)), [payer], 'nonce');
+      return true;
+    };
+  }
+
+  // Creates `count` nonce accounts with the wallet as authority, one transaction each
+  async bootstrap(connection, wallet, count) {
+    const db = await this.open();
+    const lamports = await connection.getMinimumBalanceForRentExemption(NONCE_ACCOUNT_LENGTH);
+    const created = [];
+
+    for (let i = 0; i < count; i++) {
+      const nonceKeypair = Keypair.generate();
+      const createTransaction = SystemProgram.createNonceAccount({
+        fromPubkey: wallet.publicKey,
+        noncePubkey: nonceKeypair.publicKey,
+        authorizedPubkey: wallet.publicKey,
+        lamports
+      });
+      const signature = await sendLegacyTransaction(connection, createTransaction, [wallet, nonceKeypair], 'nonce');
+
+      const now = Date.now();
+      await run(db, `
+        INSERT INTO nonce_accounts (address, authority, nonce, status, created_at, updated_at)
+        VALUES (?, ?, NULL, 'ready', ?, ?)
+      `, [nonceKeypair.publicKey.toString(), wallet.publicKey.toString(), now, now]);
+      console.log(`Nonce account ${i + 1}/${count}: ${nonceKeypair.publicKey.toString()} (${signature})`);
+      created.push(nonceKeypair.publicKey.toString());
+    }
+    return { created, lamportsEach: lamports };
+  }
+
+  // Health check: reads every pooled account, refreshes nonce values, takes over expired leases and
+  // marks accounts that are gone or have another authority as broken (a broken one that is valid
+  // again returns to the pool). Returns the counts.
+  async reconcile(connection) {
+    const db = await this.open();
+    const rows = await all(db, 'SELECT address, authority, status, lease_expires_at FROM nonce_accounts');
+    const report = { total: rows.length, ready: 0, leased: 0, reclaimed: 0, broken: 0 };
+
+    for (let i = 0; i < rows.length; i += MAX_ACCOUNTS_PER_REQUEST) {
+      const chunk = rows.slice(i, i + MAX_ACCOUNTS_PER_REQUEST);
+      const accounts = await connection.getMultipleAccountsInfo(chunk.map(row => new PublicKey(row.address)), 'confirmed');
+
+      for (let j = 0; j < chunk.length; j++) {
+        const row = chunk[j];
+        const info = accounts[j];
+        let nonce = null;
+        if (info && info.owner.equals(SystemProgram.programId) && info.data.length === NONCE_ACCOUNT_LENGTH) {
+          const account = NonceAccount.fromAccountData(info.data);
+          if (account.authorizedPubkey.toString() === row.authority) nonce = account.nonce;
+        }
+
+        const now = Date.now();
+        if (!nonce) {
+          if (row.status !== 'broken') console.warn(`Nonce pool: ${row.address} missing or not owned by ${row.authority}`);
+          await run(db, `UPDATE nonce_accounts SET status = 'broken', lease_owner = NULL, updated_at = ? WHERE address = ?`,
+            [now, row.address]);
+          report.broken++;
+        } else if (row.status === 'leased' && row.lease_expires_at >= now) {
+          // In use, its value is about to change
+          report.leased++;
+        } else {
+          if (row.status === 'leased') report.reclaimed++;
+          await run(db, `
+            UPDATE nonce_accounts
+            SET status = 'ready', nonce = ?, lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+            WHERE address = ?
+          `, [nonce, now, row.address]);
+          report.ready++;
+        }
+      }
+    }
+
+    console.log(`Nonce pool: ${JSON.stringify(report)}`);
+    return report;
+  }
+}
+
+const noncePool = new NoncePool();
+
+module.exports = { NoncePool, noncePool, advanceInstruction };
+
+if (require.main === module) {
+  const [command, countArg] = process.argv.slice(2);
+  const connection = new Connection(config.NETWORK_URL, 'confirmed');
+
+  let task;
+  if (command === 'bootstrap') {
+    const count = parseInt(countArg, 10);
+    if (!(count > 0)) {
+      console.error('Usage: node nonce-pool.js bootstrap <count>');
+      process.exit(1);
+    }
+    task = noncePool.bootstrap(connection, loadWallet(), count);
+  } else if (command === 'check') {
+    task = noncePool.reconcile(connection);
+  } else {
+    console.error('Usage: node nonce-pool.js bootstrap <count> | check');
+    process.exit(1);
+  }
+
+  task
+    .then(result => {
+      console.log(JSON.stringify(result, null, 2));
+      process.exit(0);
+    })
+    .catch(error => {
+      console.error('Nonce pool error:', error.message);
+      process.exit(1);
+    });
+}
@@ -0,0 +1,55 @@
+// Typed progress events for the Python side, kept apart from the human-readable logs on stdout.
+// Stage:  {"type": "stage", "stage": "token_created", "ts": 1700000000000, "payload": {...}}
+// Result: {"type": "result", "ts": 1700000000000, "payload": {...}}
+// Checkpoint: {"type": "checkpoint", "stage": "metadata_set", "ts": 1700000000000, "payload": {...}} (checkpoint.js)
+// Timings: {"type": "timings", "ts": 1700000000000, "payload": {wallMs, timings, criticalPath, criticalPathMs}} (dag.js)
+// Compute units: {"type": "compute_units", "txClass": "creation", "ts": 1700000000000, "payload": {mix, measured, limit, previous}} (compute-units.js)
+// Events go to the file descriptor in PROGRESS_FD (one JSON line each), or to the sink
+// installed by scripts/worker.js. Without either they are dropped.
+const fs = require('fs');
+
+let sink = null;
+
+function fdSink() {
+  const fd = Number(process.env.PROGRESS_FD);
+  if (!Number.isInteger(fd) || fd < 0) return null;
+
+  return (event) => {
+    try {
+      fs.writeSync(fd, JSON.stringify(event) + '\n');
+    } catch (error) {
+      // Reader went away, progress is best-effort
+    }
+  };
+}
+
+function setProgressSink(fn) {
+  sink = fn;
+}
+
+function emit(event) {
+  if (sink === null) sink = fdSink() || (() => {});
+  sink(event);
+}
+
+function emitProgress(stage, payload = {}) {
+  emit({ type: 'stage', stage, ts: Date.now(), payload });
+}
+
+function emitCheckpoint(stage, payload = {}) {
+  emit({ type: 'checkpoint', stage, ts: Date.now(), payload });
+}
+
+function emitTimings(report) {
+  emit({ type: 'timings', ts: Date.now(), payload: report });
+}
+
+function emitComputeUnits(txClass, payload) {
+  emit({ type: 'compute_units', txClass, ts: Date.now(), payload });
+}
+
+function emitResult(payload) {
+  emit({ type: 'result', ts: Date.now(), payload: payload === undefined ? null : payload });
+}
+
+module.exports = { emitProgress, emitCheckpoint, emitTimings, emitComputeUnits, emitResult, setProgressSink };
@@ -1,36 +1,135 @@
 const { revokeMintAuthority } = require('./revoke-mint-authority');
 const { revokeFreezeAuthority } = require('./revoke-freeze-authority');
-const { revokeUpdateAuthority } = require('./revoke-update-authority');
+const { revokeUpdateAuthority, buildRevokeUpdateAuthorityInstruction } = require('./revoke-update-authority');
+const { Connection, PublicKey } = require('@solana/web3.js');
+const { createSetAuthorityInstruction, getMint, AuthorityType, TOKEN_PROGRAM_ID } = require('@solana/spl-token');
+const { Metadata } = require('@metaplex-foundation/mpl-token-metadata');
 const fs = require('fs');
 const config = require('./config');
+const { emitProgress, emitResult } = require('./progress');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('./workspace');
+const { getMetadataAddress, sendPacked } = require('./tx-packer');
+const { loadWallet } = require('./token-utils');
 
-async function revokeAllAuthorities() {
+// REVOKE_AUTHORITIES key -> token-info.json flag and signature field, same fields as the single-authority scripts
+const AUTHORITY_FIELDS = {
+    FREEZE: ['freezeAuthorityRevoked', 'freezeAuthorityRevokeSignature'],
+    MINT: ['mintAuthorityRevoked', 'revokeSignature'],
+    UPDATE: ['updateAuthorityRevoked', 'updateAuthorityRevokeSignature']
+};
+
+// All pending authority changes in a single transaction (one blockhash, one confirmation) instead of
+// one transaction per authority. Authorities that are already revoked are left out.
+// Returns { signature, revoked: { FREEZE, MINT, UPDATE } } for the requested kinds; signature is null
+// when nothing had to be sent. Throws on failure, callers fall back to the single-authority scripts.
+// runtimeConfig and connection are the job's (solana-token.js), config.js and a new connection otherwise.
+async function revokeAuthoritiesBatched(workspace = jobWorkspace(), kinds = ['FREEZE', 'MINT', 'UPDATE'],
+                                        runtimeConfig = config, connection = null) {
+    const wallet = loadWallet(runtimeConfig);
+
+    const tokenInfo = readTokenInfo(workspace);
+    const tokenMint = new PublicKey(tokenInfo.tokenMint);
+
+    connection = connection || new Connection(runtimeConfig.NETWORK_URL, {
+        commitment: 'confirmed',
+        confirmTransactionInitialTimeout: 60000
+    });
+
+    const mint = await getMint(connection, tokenMint);
+    const instructions = [];
+    const revoked = {};
+    const pending = [];
+
+    // Freeze before mint, same order as the separate scripts
+    const setAuthority = { FREEZE: [mint.freezeAuthority, AuthorityType.FreezeAccount], MINT: [mint.mintAuthority, AuthorityType.MintTokens] };
+    for (const kind of ['FREEZE', 'MINT']) {
+        if (!kinds.includes(kind)) continue;
+        const [current, authorityType] = setAuthority[kind];
+        revoked[kind] = true;
+        if (current === null) continue;
+        instructions.push(createSetAuthorityInstruction(tokenMint, wallet.publicKey, authorityType, null, [], TOKEN_PROGRAM_ID));
+        pending.push(kind);
+    }
+
+    if (kinds.includes('UPDATE')) {
+        const metadataPDA = getMetadataAddress(tokenMint);
+        const metadataAccount = await connection.getAccountInfo(metadataPDA);
+        if (!metadataAccount) {
+            console.log('Metadata not found, Update Authority cannot be revoked');
+            revoked.UPDATE = false;
+        } else {
+            revoked.UPDATE = true;
+            if (Metadata.fromAccountInfo(metadataAccount)[0].isMutable) {
+                instructions.push(buildRevokeUpdateAuthorityInstruction(metadataPDA, wallet.publicKey));
+                pending.push('UPDATE');
+            }
+        }
+    }
+
+    if (!instructions.length) {
+        console.log('No authority changes to send');
+        return { signature: null, revoked };
+    }
+
+    console.log(`Revoking ${pending.join(', ')} in one transaction...`);
+    // One group: the changes land together or not at all
+    const [signature] = await sendPacked(connection, [instructions], wallet, { txClass: 'revoke' });
+    console.log('Authorities revoked! Transaction:', signature);
+
+    for (const kind of pending) {
+        const [flagField, signatureField] = AUTHORITY_FIELDS[kind];
+        tokenInfo[flagField] = true;
+        tokenInfo[signatureField] = signature;
+    }
+    if (pending.includes('UPDATE')) tokenInfo.isMutable = false;
+    writeTokenInfo(workspace, tokenInfo);
+
+    return { signature, revoked };
+}
+
+// Batched revocation, falling back to one transaction per authority if the batch fails
+async function revokeAuthorities(workspace, kinds, runtimeConfig = config, connection = null) {
+    try {
+        const { revoked } = await revokeAuthoritiesBatched(workspace, kinds, runtimeConfig, connection);
+        return revoked;
+    } catch (error) {
+        console.warn(`Batched revocation failed (${error.message}), revoking one by one`);
+    }
+
+    const single = { FREEZE: revokeFreezeAuthority, MINT: revokeMintAuthority, UPDATE: revokeUpdateAuthority };
+    const revoked = {};
+    for (const kind of ['FREEZE', 'MINT', 'UPDATE']) {
+        if (kinds.includes(kind)) revoked[kind] = await single[kind](workspace);
+    }
+    return revoked;
+}
+
+async function revokeAllAuthorities(workspace = jobWorkspace()) {
     try {
         console.log('=== REVOKING ALL TOKEN AUTHORITIES ===');
+        emitProgress('authorities_revoking');
 
-        if (!fs.existsSync(config.TOKEN_INFO_PATH)) {
-            throw new Error(`File ${config.TOKEN_INFO_PATH} not found. Create token first.`);
+        if (!fs.existsSync(workspace.tokenInfoPath)) {
+            throw new Error(`File ${workspace.tokenInfoPath} not found. Create token first.`);
         }
 
-        const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+        const tokenInfo = readTokenInfo(workspace);
         if (!tokenInfo.tokenMint) {
             throw new Error('Token info does not contain tokenMint address');
         }
 
-        // IMPORTANT: Revoke Freeze Authority first!
-        console.log('\nRevoking Freeze Authority first:');
-        const freezeResult = await revokeFreezeAuthority();
-
-        // Then revoke other authorities
-        const mintResult = await revokeMintAuthority();
-        const updateResult = await revokeUpdateAuthority();
+        const revoked = await revokeAuthorities(workspace, ['FREEZE', 'MINT', 'UPDATE']);
+        const freezeResult = revoked.FREEZE;
+        const mintResult = revoked.MINT;
+        const updateResult = revoked.UPDATE;
 
         console.log('\n=== AUTHORITY REVOCATION RESULTS ===');
         console.log('Mint Authority:', mintResult ? 'Revoked' : 'Not revoked');
         console.log('Freeze Authority:', freezeResult ? 'Revoked' : 'Not revoked');
         console.log('Update Authority:', updateResult ? 'Revoked' : 'Not revoked');
+        emitProgress('authorities_revoked', { mint: !!mintResult, freeze: !!freezeResult, update: !!updateResult });
 
-        const updatedTokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+        const updatedTokenInfo = readTokenInfo(workspace);
 
         const explorerCluster = config.USE_MAINNET ? 'mainnet' : 'devnet';
         console.log('\nCheck your token in blockchain explorer:');
@@ -48,6 +147,7 @@ async function revokeAllAuthorities() {
             if (!updateResult) console.log('- Update Authority still active');
 
             console.log('\nTo retry revocation run:');
+            if (workspace.jobId) console.log(`node revoke-authorities.js --params '{"JOB_ID": "${workspace.jobId}"}'`);
             if (!mintResult) console.log('node revoke-mint-authority.js');
             if (!freezeResult) console.log('node revoke-freeze-authority.js');
             if (!updateResult) console.log('node revoke-update-authority.js');
@@ -60,10 +160,24 @@ async function revokeAllAuthorities() {
     }
 }
 
-module.exports = { revokeAllAuthorities };
+module.exports = { revokeAllAuthorities, revokeAuthorities, revokeAuthoritiesBatched, AUTHORITY_FIELDS };
 
 if (require.main === module) {
-    revokeAllAuthorities()
-        .then(() => console.log('Authority revocation script completed'))
+    // Same --params convention as solana-token.js, JOB_ID selects the job's workspace
+    const paramsIndex = process.argv.indexOf('--params');
+    let params = {};
+    if (paramsIndex !== -1 && process.argv[paramsIndex + 1]) {
+        try {
+            params = JSON.parse(process.argv[paramsIndex + 1]);
+        } catch (error) {
+            console.error('Error parsing parameters:', error);
+        }
+    }
+
+    revokeAllAuthorities(jobWorkspace(params.JOB_ID))
+        .then((revoked) => {
+            emitResult({ revoked });
+            console.log('Authority revocation script completed');
+        })
         .catch(err => console.error('Error in authority revocation script:', err));
 }
\ No newline at end of file
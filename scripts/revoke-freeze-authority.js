@@ -2,9 +2,10 @@ const { Connection, Keypair, PublicKey, Transaction } = require('@solana/web3.js
 const { createSetAuthorityInstruction, AuthorityType, TOKEN_PROGRAM_ID } = require('@solana/spl-token');
 const fs = require('fs');
 const config = require('./config');
-const { updateTransactionBlockhash } = require('./update-blockhash');
+const { sendLegacyTransaction } = require('./tx-sender');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('./workspace');
 
-async function revokeFreezeAuthority() {
+async function revokeFreezeAuthority(workspace = jobWorkspace()) {
     try {
         console.log('\n=== REVOKING FREEZE AUTHORITY ===');
 
@@ -14,7 +15,7 @@ async function revokeFreezeAuthority() {
 
         console.log('Wallet:', wallet.publicKey.toString());
 
-        const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+        const tokenInfo = readTokenInfo(workspace);
         const tokenMint = new PublicKey(tokenInfo.tokenMint);
 
         console.log('Token address:', tokenMint.toString());
@@ -45,64 +46,14 @@ async function revokeFreezeAuthority() {
             )
         );
 
-        await updateTransactionBlockhash(transaction, connection, {
-            feePayer: wallet.publicKey
-        });
-
-        console.log('Sending transaction with updated blockhash...');
-
-        let signature = null;
-        let success = false;
-
-        for (let attempt = 0; attempt < 2; attempt++) {
-            try {
-                if (attempt > 0) {
-                    await updateTransactionBlockhash(transaction, connection, {
-                        feePayer: wallet.publicKey
-                    });
-                }
-
-                signature = await connection.sendTransaction(transaction, [wallet], {
-                    skipPreflight: false,
-                    preflightCommitment: 'processed',
-                    maxRetries: 3
-                });
-
-                console.log(`Transaction sent, awaiting confirmation: ${signature}`);
-
-                await connection.confirmTransaction({
-                    signature,
-                    blockhash: transaction.recentBlockhash,
-                    lastValidBlockHeight: transaction.lastValidBlockHeight
-                }, 'confirmed');
-
-                success = true;
-                break;
-            } catch (error) {
-                console.warn(`Error on attempt ${attempt + 1}: ${error.message}`);
-                if (attempt < 1 && (
-                    error.message.includes('expired') ||
-                    error.message.includes('blockhash') ||
-                    error.message.includes('block height exceeded')
-                )) {
-                    console.log('Waiting before retry...');
-                    await new Promise(resolve => setTimeout(resolve, 2000));
-                    continue;
-                }
-                throw error;
-            }
-        }
-
-        if (!success) {
-            throw new Error('All transaction attempts exhausted');
-        }
+        const signature = await sendLegacyTransaction(connection, transaction, [wallet], 'revoke');
 
         console.log('FREEZE AUTHORITY SUCCESSFULLY REVOKED!');
         console.log('Transaction signature:', signature);
 
         tokenInfo.freezeAuthorityRevoked = true;
         tokenInfo.freezeAuthorityRevokeSignature = signature;
-        fs.writeFileSync(config.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
+        writeTokenInfo(workspace, tokenInfo);
 
         return true;
     } catch (error) {
@@ -117,9 +68,9 @@ async function revokeFreezeAuthority() {
             error.message.includes('0x5')
         )) {
             console.log('Freeze Authority likely already revoked');
-            const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+            const tokenInfo = readTokenInfo(workspace);
             tokenInfo.freezeAuthorityRevoked = true;
-            fs.writeFileSync(config.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
+            writeTokenInfo(workspace, tokenInfo);
             return true;
         }
 
@@ -130,7 +81,8 @@ async function revokeFreezeAuthority() {
 module.exports = { revokeFreezeAuthority };
 
 if (require.main === module) {
-    revokeFreezeAuthority()
+    // Optional job id (payment signature): node revoke-freeze-authority.js <JOB_ID>
+    revokeFreezeAuthority(jobWorkspace(process.argv[2]))
         .then(result => {
             if (result) {
                 console.log('\n✅ FREEZE AUTHORITY SUCCESSFULLY REVOKED!');
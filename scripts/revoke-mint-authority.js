@@ -2,9 +2,10 @@ const { Connection, Keypair, PublicKey, Transaction } = require('@solana/web3.js
 const { createSetAuthorityInstruction, AuthorityType, TOKEN_PROGRAM_ID } = require('@solana/spl-token');
 const fs = require('fs');
 const config = require('./config');
-const { updateTransactionBlockhash } = require('./update-blockhash');
+const { sendLegacyTransaction } = require('./tx-sender');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('./workspace');
 
-async function revokeMintAuthority() {
+async function revokeMintAuthority(workspace = jobWorkspace()) {
     try {
         console.log('\n=== Revoking Mint Authority ===');
 
@@ -14,7 +15,7 @@ async function revokeMintAuthority() {
 
         console.log('Wallet:', wallet.publicKey.toString());
 
-        const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+        const tokenInfo = readTokenInfo(workspace);
         const tokenMint = new PublicKey(tokenInfo.tokenMint);
 
         console.log('Token address:', tokenMint.toString());
@@ -35,61 +36,13 @@ async function revokeMintAuthority() {
             )
         );
 
-        await updateTransactionBlockhash(transaction, connection, {
-            feePayer: wallet.publicKey
-        });
-
-        let signature = null;
-        let success = false;
-
-        for (let attempt = 0; attempt < 2; attempt++) {
-            try {
-                if (attempt > 0) {
-                    await updateTransactionBlockhash(transaction, connection, {
-                        feePayer: wallet.publicKey
-                    });
-                }
-
-                signature = await connection.sendTransaction(transaction, [wallet], {
-                    skipPreflight: false,
-                    preflightCommitment: 'processed',
-                    maxRetries: 3
-                });
-
-                console.log(`Transaction sent, awaiting confirmation: ${signature}`);
-
-                await connection.confirmTransaction({
-                    signature,
-                    blockhash: transaction.recentBlockhash,
-                    lastValidBlockHeight: transaction.lastValidBlockHeight
-                }, 'confirmed');
-
-                success = true;
-                break;
-            } catch (error) {
-                console.warn(`Error on attempt ${attempt + 1}: ${error.message}`);
-                if (attempt < 1 && (
-                    error.message.includes('expired') ||
-                    error.message.includes('blockhash') ||
-                    error.message.includes('block height exceeded')
-                )) {
-                    console.log('Waiting before retry...');
-                    await new Promise(resolve => setTimeout(resolve, 2000));
-                    continue;
-                }
-                throw error;
-            }
-        }
-
-        if (!success) {
-            throw new Error('All transaction attempts exhausted');
-        }
+        const signature = await sendLegacyTransaction(connection, transaction, [wallet], 'revoke');
 
         console.log('Mint Authority successfully revoked! Transaction:', signature);
 
         tokenInfo.mintAuthorityRevoked = true;
         tokenInfo.revokeSignature = signature;
-        fs.writeFileSync(config.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
+        writeTokenInfo(workspace, tokenInfo);
 
         return true;
     } catch (error) {
@@ -100,9 +53,9 @@ async function revokeMintAuthority() {
 
         if (error.message && error.message.includes('already been revoked')) {
             console.log('Mint Authority already revoked');
-            const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+            const tokenInfo = readTokenInfo(workspace);
             tokenInfo.mintAuthorityRevoked = true;
-            fs.writeFileSync(config.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
+            writeTokenInfo(workspace, tokenInfo);
             return true;
         }
 
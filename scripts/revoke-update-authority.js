@@ -1,10 +1,32 @@
 const { Connection, Keypair, PublicKey, Transaction } = require('@solana/web3.js');
-const { createUpdateMetadataAccountV2Instruction, PROGRAM_ID } = require('@metaplex-foundation/mpl-token-metadata');
+const { createUpdateMetadataAccountV2Instruction } = require('@metaplex-foundation/mpl-token-metadata');
 const fs = require('fs');
 const config = require('./config');
-const { updateTransactionBlockhash } = require('./update-blockhash');
+const { sendLegacyTransaction } = require('./tx-sender');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('./workspace');
+const { getMetadataAddress } = require('./tx-packer');
+
+// Null address as update authority + isMutable false, metadata can never change again
+const NULL_ADDRESS = new PublicKey('11111111111111111111111111111111');
+
+function buildRevokeUpdateAuthorityInstruction(metadataPDA, updateAuthority) {
+    return createUpdateMetadataAccountV2Instruction(
+        {
+            metadata: metadataPDA,
+            updateAuthority,
+        },
+        {
+            updateMetadataAccountArgsV2: {
+                data: null, // Leave data unchanged
+                updateAuthority: NULL_ADDRESS, // Set to null address
+                primarySaleHappened: null,
+                isMutable: false, // Make token immutable
+            },
+        }
+    );
+}
 
-async function revokeUpdateAuthority() {
+async function revokeUpdateAuthority(workspace = jobWorkspace()) {
     try {
         console.log('\n=== Revoking Update Authority ===');
 
@@ -14,7 +36,7 @@ async function revokeUpdateAuthority() {
 
         console.log('Wallet:', wallet.publicKey.toString());
 
-        const tokenInfo = JSON.parse(fs.readFileSync(config.TOKEN_INFO_PATH, 'utf-8'));
+        const tokenInfo = readTokenInfo(workspace);
         const tokenMint = new PublicKey(tokenInfo.tokenMint);
 
         console.log('Token address:', tokenMint.toString());
@@ -24,14 +46,7 @@ async function revokeUpdateAuthority() {
             confirmTransactionInitialTimeout: 60000
         });
 
-        const [metadataPDA] = PublicKey.findProgramAddressSync(
-            [
-                Buffer.from('metadata'),
-                PROGRAM_ID.toBuffer(),
-                tokenMint.toBuffer(),
-            ],
-            PROGRAM_ID
-        );
+        const metadataPDA = getMetadataAddress(tokenMint);
 
         console.log('Metadata address:', metadataPDA.toString());
 
@@ -41,82 +56,18 @@ async function revokeUpdateAuthority() {
             return false;
         }
 
-        const nullAddress = new PublicKey('11111111111111111111111111111111');
-        console.log('Null address for Update Authority revocation:', nullAddress.toString());
-
-        const transaction = new Transaction().add(
-            createUpdateMetadataAccountV2Instruction(
-                {
-                    metadata: metadataPDA,
-                    updateAuthority: wallet.publicKey,
-                },
-                {
-                    updateMetadataAccountArgsV2: {
-                        data: null, // Leave data unchanged
-                        updateAuthority: nullAddress, // Set to null address
-                        primarySaleHappened: null,
-                        isMutable: false, // Make token immutable
-                    },
-                }
-            )
-        );
-
-        await updateTransactionBlockhash(transaction, connection, {
-            feePayer: wallet.publicKey
-        });
+        console.log('Null address for Update Authority revocation:', NULL_ADDRESS.toString());
 
-        let signature = null;
-        let success = false;
-
-        for (let attempt = 0; attempt < 2; attempt++) {
-            try {
-                if (attempt > 0) {
-                    await updateTransactionBlockhash(transaction, connection, {
-                        feePayer: wallet.publicKey
-                    });
-                }
-
-                signature = await connection.sendTransaction(transaction, [wallet], {
-                    skipPreflight: false,
-                    preflightCommitment: 'processed',
-                    maxRetries: 3
-                });
-
-                console.log(`Transaction sent, awaiting confirmation: ${signature}`);
-
-                await connection.confirmTransaction({
-                    signature,
-                    blockhash: transaction.recentBlockhash,
-                    lastValidBlockHeight: transaction.lastValidBlockHeight
-                }, 'confirmed');
-
-                success = true;
-                break;
-            } catch (error) {
-                console.warn(`Error on attempt ${attempt + 1}: ${error.message}`);
-                if (attempt < 1 && (
-                    error.message.includes('expired') ||
-                    error.message.includes('blockhash') ||
-                    error.message.includes('block height exceeded')
-                )) {
-                    console.log('Waiting before retry...');
-                    await new Promise(resolve => setTimeout(resolve, 2000));
-                    continue;
-                }
-                throw error;
-            }
-        }
+        const transaction = new Transaction().add(buildRevokeUpdateAuthorityInstruction(metadataPDA, wallet.publicKey));
 
-        if (!success) {
-            throw new Error('All transaction attempts exhausted');
-        }
+        const signature = await sendLegacyTransaction(connection, transaction, [wallet], 'revoke');
 
         console.log('Update Authority successfully revoked! Transaction:', signature);
 
         tokenInfo.updateAuthorityRevoked = true;
         tokenInfo.updateAuthorityRevokeSignature = signature;
         tokenInfo.isMutable = false;
-        fs.writeFileSync(config.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
+        writeTokenInfo(workspace, tokenInfo);
 
         return true;
     } catch (error) {
@@ -128,4 +79,4 @@ async function revokeUpdateAuthority() {
     }
 }
 
-module.exports = { revokeUpdateAuthority };
\ No newline at end of file
+module.exports = { revokeUpdateAuthority, buildRevokeUpdateAuthorityInstruction, NULL_ADDRESS };
\ No newline at end of file
@@ -1,23 +1,25 @@
-const {Connection, Keypair, PublicKey, Transaction, SystemProgram, sendAndConfirmTransaction} = require('@solana/web3.js');
-const { updateTransactionBlockhash } = require('./update-blockhash.js');
+const {Connection, Keypair, PublicKey, Transaction, SystemProgram} = require('@solana/web3.js');
 const {createInitializeMintInstruction, getMinimumBalanceForRentExemptMint, createAssociatedTokenAccountInstruction,
   getAssociatedTokenAddress, createMintToInstruction, MINT_SIZE, TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID} = require('@solana/spl-token');
 const {createCreateMetadataAccountV3Instruction, PROGRAM_ID} = require('@metaplex-foundation/mpl-token-metadata');
 const fs = require('fs');
-const {mnemonicToSeedSync} = require('bip39');
-const {derivePath} = require('ed25519-hd-key');
 const bs58 = require('bs58');
 const config = require('./config.js');
-const { revokeAllAuthorities } = require('./revoke-authorities.js');
-const { revokeMintAuthority } = require('./revoke-mint-authority.js');
-const { revokeFreezeAuthority } = require('./revoke-freeze-authority.js');
-const { revokeUpdateAuthority } = require('./revoke-update-authority.js');
+const { revokeAuthorities, AUTHORITY_FIELDS } = require('./revoke-authorities.js');
+const { NULL_ADDRESS } = require('./revoke-update-authority.js');
+const { getRentExemptMint, getMetadataAddress, getAssociatedAddress, sendPacked } = require('./tx-packer.js');
+const { sendLegacyTransaction } = require('./tx-sender.js');
 const { uploadToIPFS } = require('./ipfs-utils.js');
+const { emitProgress, emitResult, emitTimings } = require('./progress.js');
+const { runDag, formatDagReport } = require('./dag.js');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('./workspace.js');
+const { Checkpoint } = require('./checkpoint.js');
 const {
   isAccountAlreadyExistsError,
   getExplorerLinks,
   sleep,
   sendTokensToUser,
+  loadWallet,
   logTokenCreationType,
   shouldRetryWithDatabase,
   shouldRetryWithRandom,
@@ -31,43 +33,43 @@ const { hideBin } = require('yargs/helpers');
 const { walletManager } = require('../database/db-wallet-manager.js');
 const { customAddressManager } = require('../database/db-wallet-manager.js');
 
-let dbPrivateKey = null;
-
-const argv = yargs(hideBin(process.argv))
-  .option('params', {
-    describe: 'JSON string with parameters to override config settings',
-    type: 'string',
-  })
-  .argv;
-
-let runtimeConfig = { ...config };
-if (argv.params) {
-  try {
-    const params = JSON.parse(argv.params);
-    runtimeConfig = { ...config, ...params };
+// Merge job parameters over config.js; in TEST_MODE the test parameters win
+function buildRuntimeConfig(params = null) {
+  let merged = { ...config };
+  if (params) {
+    merged = { ...config, ...params };
     console.log('Parameters overridden:', params);
-  } catch (error) {
-    console.error('Error parsing parameters:', error);
   }
-}
 
-if (runtimeConfig.TEST_MODE) {
-  console.log('Running in test mode, using test parameters');
-  runtimeConfig = { ...runtimeConfig, ...runtimeConfig.TEST_PARAMS };
+  if (merged.TEST_MODE) {
+    console.log('Running in test mode, using test parameters');
+    merged = { ...merged, ...merged.TEST_PARAMS };
+  }
+
+  return merged;
 }
 
-function loadWallet() {
-  const walletData = JSON.parse(fs.readFileSync(runtimeConfig.WALLET_PATH, 'utf-8'));
-  if (runtimeConfig.WALLET_TYPE === 'privateKey')
-    return Keypair.fromSecretKey(Buffer.from(walletData.privateKey, 'hex'));
-  if (runtimeConfig.WALLET_TYPE === 'mnemonic') {
-    const seed = mnemonicToSeedSync(walletData.mnemonic);
-    return Keypair.fromSeed(derivePath("m/44'/501'/0'/0'", seed.toString('hex')).key);
-  }
-  throw new Error('Unknown wallet type in config');
+// REVOKE_AUTHORITIES key -> checkpoint stage
+const AUTHORITY_STAGES = {
+  FREEZE: 'freeze_authority_revoked',
+  MINT: 'mint_authority_revoked',
+  UPDATE: 'update_authority_revoked'
+};
+
+// Everything one creation needs, passed explicitly so concurrent jobs never share state.
+// JOB_ID (the payment signature) selects the job's workspace, see workspace.js
+function createJobContext(params = null) {
+  const runtimeConfig = buildRuntimeConfig(params);
+  return {
+    config: runtimeConfig,
+    workspace: jobWorkspace(runtimeConfig.JOB_ID),
+    // Stages finished by an earlier attempt of this job (params.CHECKPOINT), see checkpoint.js
+    checkpoint: new Checkpoint(runtimeConfig.CHECKPOINT),
+    dbPrivateKey: null
+  };
 }
 
-function loadWalletPublicKey() {
+function loadWalletPublicKey(runtimeConfig = config) {
   const walletData = JSON.parse(fs.readFileSync(runtimeConfig.WALLET_PATH, 'utf-8'));
   return new PublicKey(walletData.publicKey);
 }
@@ -81,59 +83,68 @@ async function createMintKeypair(forceRandom = false) {
   return keypair;
 }
 
-const getConnection = () => new Connection(runtimeConfig.NETWORK_URL, {
+const getConnection = (runtimeConfig = config) => new Connection(runtimeConfig.NETWORK_URL, {
   commitment: 'confirmed',
   confirmTransactionInitialTimeout: 60000
 });
 
+// maxRetries: rebuilds with a new blockhash after an expiry, see tx-sender.js
 async function sendTransactionWithRetry(connection, transaction, signers, maxRetries = 2) {
-  let lastError;
-
-  for (let attempt = 0; attempt < maxRetries; attempt++) {
-    try {
-      await updateTransactionBlockhash(transaction, connection, {
-        feePayer: signers[0].publicKey,
-        commitment: 'finalized'
-      });
-
-      console.log(`Sending transaction attempt ${attempt + 1}/${maxRetries}...`);
+  const signature = await sendLegacyTransaction(connection, transaction, signers, 'creation', { MAX_REBUILDS: maxRetries });
+  console.log(`Transaction successfully executed: ${signature}`);
+  return signature;
+}
 
-      const signature = await sendAndConfirmTransaction(
-        connection, transaction, signers,
-        { commitment: 'confirmed', preflightCommitment: 'processed', maxRetries: 5 }
-      );
+function updateTokenInfo(ctx, tokenInfo, updates) {
+  Object.assign(tokenInfo, updates);
+  writeTokenInfo(ctx.workspace, tokenInfo);
+  return tokenInfo;
+}
 
-      console.log(`Transaction successfully executed: ${signature}`);
-      return signature;
-    } catch (error) {
-      console.warn(`Error on attempt ${attempt + 1}: ${error.message}`);
-      lastError = error;
-
-      if (error.message.includes('expired') || error.message.includes('blockhash') ||
-          error.message.includes('block height exceeded')) {
-        await sleep(2000);
-        continue;
-      } else {
-        throw error;
+// With revokeUpdate the metadata is created immutable with the null address as update authority,
+// which saves the separate update-authority transaction
+function buildCreateMetadataInstruction(runtimeConfig, tokenMint, wallet, uri, revokeUpdate) {
+  return createCreateMetadataAccountV3Instruction(
+    {
+      metadata: getMetadataAddress(tokenMint),
+      mint: tokenMint,
+      mintAuthority: wallet.publicKey,
+      payer: wallet.publicKey,
+      updateAuthority: revokeUpdate ? NULL_ADDRESS : wallet.publicKey
+    },
+    {
+      createMetadataAccountArgsV3: {
+        data: {
+          name: runtimeConfig.TOKEN_NAME,
+          symbol: runtimeConfig.TOKEN_SYMBOL,
+          uri,
+          sellerFeeBasisPoints: 0,
+          creators: null,
+          collection: null,
+          uses: null
+        },
+        isMutable: !revokeUpdate,
+        collectionDetails: null
       }
     }
-  }
-
-  throw lastError;
+  );
 }
 
-function updateTokenInfo(tokenInfo, updates) {
-  Object.assign(tokenInfo, updates);
-  fs.writeFileSync(runtimeConfig.TOKEN_INFO_PATH, JSON.stringify(tokenInfo, null, 2));
-  return tokenInfo;
+function shouldFoldUpdateRevoke(ctx) {
+  const revoke = ctx.config.REVOKE_AUTHORITIES || {};
+  return !!revoke.UPDATE && !ctx.checkpoint.has('update_authority_revoked');
 }
 
-async function createMemeCoin(retryWithRandom = false, dbRetryCount = 0) {
+// Mint account, ATA and mint-to form one group (never a mint without supply), the metadata another;
+// tx-packer puts both in one transaction when they fit. onStage(stage, data) is called as soon as the
+// transaction carrying a stage is confirmed, so a failure in a later transaction keeps it checkpointed.
+async function createMemeCoin(ctx, metadataUri = null, onStage = () => {}, retryWithRandom = false, dbRetryCount = 0) {
+  const runtimeConfig = ctx.config;
   try {
     console.log('Creating token...');
 
-    const wallet = loadWallet();
-    const connection = getConnection();
+    const wallet = loadWallet(runtimeConfig);
+    const connection = getConnection(runtimeConfig);
 
     // Check balance
     const balance = await connection.getBalance(wallet.publicKey);
@@ -143,11 +154,25 @@ async function createMemeCoin(retryWithRandom = false, dbRetryCount = 0) {
     const tokenMintKeypair = await createMintKeypair(retryWithRandom);
     const tokenMintPubkey = tokenMintKeypair.publicKey;
 
-    // Token creation logic placeholder
-    console.log('Processing token creation...');
-    await sleep(1000);
-
-    console.log('Token creation process completed');
+    const associatedAddress = getAssociatedAddress(tokenMintPubkey, wallet.publicKey);
+    const supply = BigInt(runtimeConfig.TOTAL_SUPPLY) * 10n ** BigInt(runtimeConfig.DECIMALS);
+    const groups = [[
+      SystemProgram.createAccount({
+        fromPubkey: wallet.publicKey,
+        newAccountPubkey: tokenMintPubkey,
+        space: MINT_SIZE,
+        lamports: await getRentExemptMint(connection),
+        programId: TOKEN_PROGRAM_ID
+      }),
+      createInitializeMintInstruction(tokenMintPubkey, runtimeConfig.DECIMALS, wallet.publicKey, wallet.publicKey, TOKEN_PROGRAM_ID),
+      createAssociatedTokenAccountInstruction(wallet.publicKey, associatedAddress, wallet.publicKey, tokenMintPubkey),
+      createMintToInstruction(tokenMintPubkey, associatedAddress, wallet.publicKey, supply)
+    ]];
+
+    const revokeUpdate = shouldFoldUpdateRevoke(ctx);
+    if (metadataUri) {
+      groups.push([buildCreateMetadataInstruction(runtimeConfig, tokenMintPubkey, wallet, metadataUri, revokeUpdate)]);
+    }
 
     const tokenInfo = {
       name: runtimeConfig.TOKEN_NAME,
@@ -155,12 +180,31 @@ async function createMemeCoin(retryWithRandom = false, dbRetryCount = 0) {
       tokenMint: tokenMintPubkey.toString(),
       totalSupply: runtimeConfig.TOTAL_SUPPLY,
       decimals: runtimeConfig.DECIMALS,
-      mintSignature: 'placeholder-mint-signature',
-      usedMemeDatabase: !!dbPrivateKey,
+      mintSignature: null,
+      usedMemeDatabase: !!ctx.dbPrivateKey,
       dbRetryCount,
       wasRetryWithRandom: retryWithRandom
     };
 
+    console.log('Processing token creation...');
+    const onConfirmed = (signature, sent) => {
+      if (sent.includes(0)) {
+        tokenInfo.mintSignature = signature;
+        emitProgress('tokens_minted', { tokenMint: tokenInfo.tokenMint, totalSupply: runtimeConfig.TOTAL_SUPPLY });
+        onStage('token_created', { ...tokenInfo });
+      }
+      if (sent.includes(1)) {
+        tokenInfo.metadataSignature = signature;
+        onStage('metadata_set', { signature });
+        if (revokeUpdate) {
+          Object.assign(tokenInfo, { updateAuthorityRevoked: true, updateAuthorityRevokeSignature: signature, isMutable: false });
+          onStage('update_authority_revoked', { signature });
+        }
+      }
+    };
+    await sendPacked(connection, groups, wallet, { signers: [wallet, tokenMintKeypair], onConfirmed });
+
+    console.log('Token creation process completed');
     return tokenInfo;
   } catch (error) {
     console.error('Error creating token:', error);
@@ -168,55 +212,171 @@ async function createMemeCoin(retryWithRandom = false, dbRetryCount = 0) {
   }
 }
 
-async function setupMetadata() {
+// Metadata for a mint created by an earlier attempt without it (resumed job)
+async function setupMetadata(ctx, tokenInfo, metadataUri) {
   try {
     console.log('Setting up token metadata...');
 
-    // Metadata setup logic placeholder
-    await sleep(500);
+    const wallet = loadWallet(ctx.config);
+    const connection = getConnection(ctx.config);
+    const revokeUpdate = shouldFoldUpdateRevoke(ctx);
+    const instruction = buildCreateMetadataInstruction(ctx.config, new PublicKey(tokenInfo.tokenMint), wallet, metadataUri, revokeUpdate);
+
+    const [signature] = await sendPacked(connection, [[instruction]], wallet);
     console.log('Metadata setup completed');
 
-    return 'metadata-signature-placeholder';
+    if (revokeUpdate) {
+      updateTokenInfo(ctx, tokenInfo, { updateAuthorityRevoked: true, updateAuthorityRevokeSignature: signature, isMutable: false });
+      ctx.checkpoint.record('update_authority_revoked', { signature });
+    }
+    return signature;
   } catch (error) {
     console.error('Error setting up metadata:', error);
     throw error;
   }
 }
 
-async function runFullProcess() {
-  try {
-    console.log('=== STARTING TOKEN CREATION PROCESS ===');
-
-    // Step 1: Create token
-    const tokenInfo = await createMemeCoin();
+// The creation pipeline as a dependency graph (dag.js). The IPFS upload comes first so the metadata
+// goes into the mint's transaction (see createMemeCoin); sending tokens to the user and setting a
+// missing metadata account run side by side, and the remaining authorities are revoked in one
+// transaction (revoke-authorities.js) once the metadata is set. Revocation doesn't wait for the transfer.
+// Stages finished by an earlier attempt (checkpoint.js) return their recorded outputs.
+function creationStages(ctx) {
+  const runtimeConfig = ctx.config;
+  const checkpoint = ctx.checkpoint;
+  const revoke = runtimeConfig.REVOKE_AUTHORITIES || {};
+
+  const pendingAuthorities = () => Object.keys(AUTHORITY_STAGES)
+    .filter(key => revoke[key] && !checkpoint.has(AUTHORITY_STAGES[key]));
+
+  return [
+    {
+      name: 'metadata_uploaded', inputs: [], outputs: ['metadataUrl'],
+      run: async () => {
+        if (!checkpoint.has('metadata_uploaded')) {
+          emitProgress('metadata_uploading');
+          checkpoint.record('metadata_uploaded', { uri: await uploadToIPFS(runtimeConfig, ctx.workspace) });
+        }
+        const metadataUrl = checkpoint.get('metadata_uploaded').uri;
+        emitProgress('metadata_uploaded', { uri: metadataUrl });
+        return { metadataUrl };
+      }
+    },
+    {
+      name: 'token_created', inputs: ['metadataUrl'], outputs: ['tokenInfo'],
+      run: async ({ metadataUrl }) => {
+        let tokenInfo;
+        if (checkpoint.has('token_created')) {
+          tokenInfo = { ...checkpoint.get('token_created') };
+          console.log(`Token already created: ${tokenInfo.tokenMint}`);
+        } else {
+          emitProgress('token_creating');
+          tokenInfo = await createMemeCoin(ctx, metadataUrl, (stage, data) => checkpoint.record(stage, data));
+        }
+        // The revoke scripts pick the mint up from the job's token-info.json
+        updateTokenInfo(ctx, tokenInfo, { jobId: ctx.workspace.jobId });
+        emitProgress('token_created', { tokenMint: tokenInfo.tokenMint });
+        return { tokenInfo };
+      }
+    },
+    {
+      name: 'metadata_set', inputs: ['tokenInfo', 'metadataUrl'], outputs: ['metadataSignature'],
+      run: async ({ tokenInfo, metadataUrl }) => {
+        if (!checkpoint.has('metadata_set')) {
+          emitProgress('metadata_setting');
+          checkpoint.record('metadata_set', { signature: await setupMetadata(ctx, tokenInfo, metadataUrl) });
+        }
+        return { metadataSignature: checkpoint.get('metadata_set').signature };
+      }
+    },
+    {
+      name: 'tokens_sent', inputs: ['tokenInfo'], outputs: ['tokensSent'],
+      // USER_WALLET is the job's recipient (bot.py), SEND_TO_USER_WALLET (config.js) turns the transfer off
+      when: () => !!(runtimeConfig.SEND_TO_USER_WALLET && runtimeConfig.USER_WALLET),
+      run: async ({ tokenInfo }) => {
+        if (!checkpoint.has('tokens_sent')) {
+          console.log('Sending tokens to user...');
+          const sent = await sendTokensToUser(getConnection(runtimeConfig), loadWallet(runtimeConfig),
+            runtimeConfig.USER_WALLET, tokenInfo.tokenMint, tokenInfo.totalSupply, tokenInfo.decimals,
+            sendTransactionWithRetry);
+          if (!sent.success) throw new Error(`Tokens not sent: ${sent.error}`);
+
+          checkpoint.record('tokens_sent', { wallet: runtimeConfig.USER_WALLET, signature: sent.signature });
+          emitProgress('tokens_sent', { wallet: runtimeConfig.USER_WALLET, signature: sent.signature });
+        }
+        return { tokensSent: true };
+      }
+    },
+    {
+      name: 'authorities_revoked', inputs: ['tokenInfo', 'metadataSignature'], outputs: ['authoritiesRevoked'],
+      when: () => pendingAuthorities().length > 0,
+      run: async () => {
+        const kinds = pendingAuthorities();
+        emitProgress('authorities_revoking');
+
+        const revoked = await revokeAuthorities(ctx.workspace, kinds, runtimeConfig, getConnection(runtimeConfig));
+        const tokenInfo = readTokenInfo(ctx.workspace);
+        for (const key of kinds) {
+          if (!revoked[key]) {
+            console.warn(`${key} authority not revoked`);
+            continue;
+          }
+          checkpoint.record(AUTHORITY_STAGES[key], { signature: tokenInfo[AUTHORITY_FIELDS[key][1]] || null });
+        }
+        return { authoritiesRevoked: kinds.every(key => revoked[key]) };
+      }
+    }
+  ];
+}
 
-    // Step 2: Upload to IPFS
-    const metadataUrl = await uploadToIPFS(runtimeConfig);
+async function runFullProcess(params = null) {
+  const ctx = createJobContext(params);
+  const runtimeConfig = ctx.config;
 
-    // Step 3: Set metadata
-    const metadataSignature = await setupMetadata();
+  try {
+    console.log('=== STARTING TOKEN CREATION PROCESS ===');
+    emitProgress('process_started', { revoke: runtimeConfig.REVOKE_AUTHORITIES });
 
-    // Step 4: Send tokens to user (if specified)
-    if (runtimeConfig.SEND_TO_USER_WALLET && runtimeConfig.USER_WALLET_ADDRESS) {
-      console.log('Sending tokens to user...');
-      await sleep(500);
+    const checkpoint = ctx.checkpoint;
+    if (runtimeConfig.CHECKPOINT) {
+      await checkpoint.verify(getConnection(runtimeConfig));
     }
 
-    // Step 5: Revoke authorities
-    if (runtimeConfig.REVOKE_AUTHORITIES) {
-      console.log('Revoking authorities...');
-      await sleep(500);
-    }
+    const { values, report } = await runDag(creationStages(ctx));
+    const { tokenInfo, metadataUrl, metadataSignature, tokensSent } = values;
+
+    console.log(formatDagReport(report));
+    emitTimings(report);
 
     console.log('Token creation process completed');
-    return tokenInfo;
+    emitProgress('completed', { tokenMint: tokenInfo.tokenMint, resumedStages: checkpoint.resumed });
+
+    return {
+      ...tokenInfo,
+      uri: metadataUrl,
+      metadataSignature,
+      // Skipped stages output null: nothing reached the user's wallet
+      userTokenAmount: tokensSent ? tokenInfo.totalSupply : 0,
+      userWallet: tokensSent ? runtimeConfig.USER_WALLET : null,
+      network: runtimeConfig.USE_MAINNET ? 'mainnet-beta' : 'devnet',
+      timings: report
+    };
   } catch (error) {
+    if (error.dagReport) {
+      console.error(`Stage ${error.stage} failed`);
+      console.log(formatDagReport(error.dagReport));
+      emitTimings(error.dagReport);
+    }
     console.error('Error in token creation process:', error);
     throw error;
   }
 }
 
 module.exports = {
+  buildRuntimeConfig,
+  createJobContext,
+  creationStages,
+  runFullProcess,
   getConnection,
   loadWallet,
   loadWalletPublicKey,
@@ -226,5 +386,28 @@ module.exports = {
 };
 
 if (require.main === module) {
-  runFullProcess();
+  const argv = yargs(hideBin(process.argv))
+    .option('params', {
+      describe: 'JSON string with parameters to override config settings',
+      type: 'string',
+    })
+    .argv;
+
+  let params = null;
+  if (argv.params) {
+    try {
+      params = JSON.parse(argv.params);
+    } catch (error) {
+      console.error('Error parsing parameters:', error);
+    }
+  }
+
+  // Structured result goes to the progress channel, not token-info.json; a failure is reported the
+  // same way as worker.js's error frame, with a non-zero exit code
+  runFullProcess(params)
+    .then(emitResult)
+    .catch((error) => {
+      emitResult({ success: false, error: error.message });
+      process.exitCode = 1;
+    });
 }
\ No newline at end of file
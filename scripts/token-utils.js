@@ -1,5 +1,11 @@
-const {PublicKey, Transaction} = require('@solana/web3.js');
-const {createAssociatedTokenAccountInstruction, getAssociatedTokenAddress, createMintToInstruction, TOKEN_PROGRAM_ID, ASSOCIATED_TOKEN_PROGRAM_ID} = require('@solana/spl-token');
+const fs = require('fs');
+const {Keypair, PublicKey, Transaction} = require('@solana/web3.js');
+const {createAssociatedTokenAccountInstruction, createAssociatedTokenAccountIdempotentInstruction, getAssociatedTokenAddress,
+  getAssociatedTokenAddressSync, createMintToInstruction, createTransferCheckedInstruction, TOKEN_PROGRAM_ID,
+  ASSOCIATED_TOKEN_PROGRAM_ID} = require('@solana/spl-token');
+const {mnemonicToSeedSync} = require('bip39');
+const {derivePath} = require('ed25519-hd-key');
+const config = require('./config.js');
 
 function isAccountAlreadyExistsError(error) {
   const errorMessage = error.message || '';
@@ -22,16 +28,38 @@ function getExplorerLinks(address, useMainnet) {
   };
 }
 
+// Service wallet from WALLET_PATH, as a hex private key or a mnemonic (WALLET_TYPE)
+function loadWallet(runtimeConfig = config) {
+  const walletData = JSON.parse(fs.readFileSync(runtimeConfig.WALLET_PATH, 'utf-8'));
+  if (runtimeConfig.WALLET_TYPE === 'privateKey')
+    return Keypair.fromSecretKey(Buffer.from(walletData.privateKey, 'hex'));
+  if (runtimeConfig.WALLET_TYPE === 'mnemonic') {
+    const seed = mnemonicToSeedSync(walletData.mnemonic);
+    return Keypair.fromSeed(derivePath("m/44'/501'/0'/0'", seed.toString('hex')).key);
+  }
+  throw new Error('Unknown wallet type in config');
+}
+
 const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
 
+// Transfers `amount` whole tokens from the wallet's token account to the recipient's, creating the
+// recipient's token account if needed. sendTransactionWithRetry(connection, transaction, signers) sends it.
 async function sendTokensToUser(connection, wallet, recipientWallet, tokenMint, amount, decimals, sendTransactionWithRetry) {
   try {
     console.log(`Sending ${amount} tokens to user wallet: ${recipientWallet}`);
 
-    // Token sending logic placeholder
-    await new Promise(resolve => setTimeout(resolve, 1000));
+    const mint = new PublicKey(tokenMint);
+    const recipient = new PublicKey(recipientWallet);
+    const source = getAssociatedTokenAddressSync(mint, wallet.publicKey);
+    const destination = getAssociatedTokenAddressSync(mint, recipient);
+    const rawAmount = BigInt(amount) * 10n ** BigInt(decimals);
+
+    const transaction = new Transaction().add(
+      createAssociatedTokenAccountIdempotentInstruction(wallet.publicKey, destination, recipient, mint),
+      createTransferCheckedInstruction(source, mint, destination, wallet.publicKey, rawAmount, decimals, [], TOKEN_PROGRAM_ID)
+    );
+    const signature = await sendTransactionWithRetry(connection, transaction, [wallet]);
 
-    const signature = 'placeholder-send-signature';
     console.log(`Tokens successfully sent. Signature: ${signature}`);
     return { success: true, signature };
   } catch (error) {
@@ -116,6 +144,7 @@ function logRevokeResults(tokenInfo) {
 module.exports = {
   isAccountAlreadyExistsError,
   getExplorerLinks,
+  loadWallet,
   sleep,
   sendTokensToUser,
   logTokenCreationType,
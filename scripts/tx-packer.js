@@ -0,0 +1,186 @@
+// Packs instructions into as few transactions as fit the packet size limit and sends them.
+// Instructions come in groups that must land in the same transaction (createAccount + initializeMint,
+// the authority changes); groups are packed greedily in order into v0 transactions, so a creation
+// needs one or two confirmations instead of one per step.
+// With the durable-nonce pool on (nonce-pool.js), each transaction is built on a leased nonce instead
+// of a recent blockhash and does not expire.
+// Also caches the values every creation recomputes: rent-exempt mint balance, metadata PDA, ATA address.
+const { Keypair, PublicKey, TransactionMessage, VersionedTransaction, ComputeBudgetProgram, PACKET_DATA_SIZE } = require('@solana/web3.js');
+const { getMinimumBalanceForRentExemptMint, getAssociatedTokenAddressSync } = require('@solana/spl-token');
+const { PROGRAM_ID } = require('@metaplex-foundation/mpl-token-metadata');
+const { getBlockhashProvider } = require('./blockhash-provider');
+const { feeOracle } = require('./fee-oracle');
+const { computeUnits, MAX_COMPUTE_UNITS } = require('./compute-units');
+const { sendWithRebroadcast } = require('./tx-sender');
+const { noncePool, advanceInstruction } = require('./nonce-pool');
+const config = require('./config');
+
+// Stands in for a nonce account while packing, so every transaction has room for an advanceNonce
+const NONCE_PLACEHOLDER = Keypair.generate().publicKey;
+
+// rpcEndpoint -> Promise<lamports>, the rent of a mint account only changes with a cluster feature gate
+const rentExemptMintCache = new Map();
+const metadataAddressCache = new Map();
+const associatedAddressCache = new Map();
+
+function getRentExemptMint(connection) {
+  const key = connection.rpcEndpoint;
+  if (!rentExemptMintCache.has(key)) {
+    const lamports = getMinimumBalanceForRentExemptMint(connection);
+    // Don't keep a failed lookup around
+    lamports.catch(() => rentExemptMintCache.delete(key));
+    rentExemptMintCache.set(key, lamports);
+  }
+  return rentExemptMintCache.get(key);
+}
+
+function getMetadataAddress(tokenMint) {
+  const key = tokenMint.toString();
+  if (!metadataAddressCache.has(key)) {
+    metadataAddressCache.set(key, PublicKey.findProgramAddressSync(
+      [Buffer.from('metadata'), PROGRAM_ID.toBuffer(), new PublicKey(tokenMint).toBuffer()],
+      PROGRAM_ID
+    )[0]);
+  }
+  return metadataAddressCache.get(key);
+}
+
+function getAssociatedAddress(tokenMint, owner) {
+  const key = `${tokenMint.toString()}:${owner.toString()}`;
+  if (!associatedAddressCache.has(key)) {
+    associatedAddressCache.set(key, getAssociatedTokenAddressSync(new PublicKey(tokenMint), new PublicKey(owner)));
+  }
+  return associatedAddressCache.get(key);
+}
+
+function compileMessage(instructions, payerKey, recentBlockhash) {
+  return new TransactionMessage({ payerKey, recentBlockhash, instructions }).compileToV0Message();
+}
+
+function signMessage(message, signers) {
+  const required = message.staticAccountKeys.slice(0, message.header.numRequiredSignatures);
+  const transaction = new VersionedTransaction(message);
+  transaction.sign(signers.filter(signer => required.some(key => key.equals(signer.publicKey))));
+  return transaction;
+}
+
+function fits(instructions, payerKey, recentBlockhash) {
+  try {
+    // Unsigned serialization has the same size as the signed one (signatures are zero-filled)
+    const message = compileMessage(instructions, payerKey, recentBlockhash);
+    return new VersionedTransaction(message).serialize().length <= PACKET_DATA_SIZE;
+  } catch (error) {
+    // Too many accounts / instruction data for the encoder
+    return false;
+  }
+}
+
+function normalizeGroups(groups) {
+  return groups.map(group => (Array.isArray(group) ? group : [group]));
+}
+
+// Greedy packing in order: returns batches of group indexes, one batch per transaction.
+// prefix (compute-budget instructions) starts every transaction and counts towards its size.
+function packGroups(groups, payerKey, recentBlockhash, prefix = []) {
+  const batches = [];
+  let batch = [];
+  let current = [...prefix];
+
+  groups.forEach((group, index) => {
+    if (!group.length) return;
+    const candidate = [...current, ...group];
+    if (fits(candidate, payerKey, recentBlockhash)) {
+      batch.push(index);
+      current = candidate;
+      return;
+    }
+    if (!fits([...prefix, ...group], payerKey, recentBlockhash)) {
+      throw new Error(`Instruction group ${index} (${group.length} instructions) does not fit in one transaction`);
+    }
+    if (batch.length) batches.push(batch);
+    batch = [index];
+    current = [...prefix, ...group];
+  });
+
+  if (batch.length) batches.push(batch);
+  return batches;
+}
+
+// groups: array of instruction arrays (a bare instruction counts as its own group). Returns v0 messages
+function packInstructions(groups, payerKey, recentBlockhash, prefix = []) {
+  const normalized = normalizeGroups(groups);
+  return packGroups(normalized, payerKey, recentBlockhash, prefix)
+    .map(batch => compileMessage([...prefix, ...batch.flatMap(index => normalized[index])], payerKey, recentBlockhash));
+}
+
+// Sends the packed transactions in order (later ones may use accounts created by earlier ones),
+// each signed by the signers its message requires, priced for txClass (fee-oracle.js) and limited to
+// its simulated compute units (compute-units.js), and rebroadcast until confirmed (tx-sender.js).
+// onConfirmed(signature, groupIndexes) runs after each confirmation, so a caller can checkpoint
+// what landed before a later transaction fails. Returns one signature per transaction.
+async function sendPacked(connection, groups, payer, { signers = [payer], onConfirmed = null, txClass = 'creation' } = {}) {
+  const normalized = normalizeGroups(groups);
+  const provider = getBlockhashProvider(connection.rpcEndpoint);
+  const [{ blockhash }, priceInstruction] = await Promise.all([
+    provider.getLatest(),
+    feeOracle.computeUnitPriceInstruction(connection, txClass, normalized.flat())
+  ]);
+  // Packed with room for a limit instruction (and an advanceNonce), each transaction gets its own limit below
+  const reserved = [priceInstruction, ComputeBudgetProgram.setComputeUnitLimit({ units: MAX_COMPUTE_UNITS })];
+  if (config.NONCE_POOL.ENABLED) {
+    reserved.unshift(advanceInstruction({ address: NONCE_PLACEHOLDER, authority: payer.publicKey }));
+  }
+  const batches = packGroups(normalized, payer.publicKey, blockhash, reserved);
+  console.log(`Sending ${normalized.length} instruction groups in ${batches.length} transaction(s)`);
+
+  const signatures = [];
+  for (const batch of batches) {
+    const lease = await noncePool.lease(connection, payer.publicKey).catch((error) => {
+      console.warn(`Nonce pool unavailable (${error.message}), using a recent blockhash`);
+      return null;
+    });
+    // advanceNonce has to be the first instruction of a nonce transaction
+    const instructions = [...(lease ? [advanceInstruction(lease)] : []), ...batch.flatMap(index => normalized[index])];
+    // Simulated here, after the previous transactions landed, since it may use their accounts
+    const limitInstruction = await computeUnits.limitInstruction(connection, instructions, payer.publicKey, txClass);
+    const budget = limitInstruction ? [priceInstruction, limitInstruction] : [priceInstruction];
+    const ordered = lease ? [instructions[0], ...budget, ...instructions.slice(1)] : [...budget, ...instructions];
+
+    let previousBlockhash = null;
+    const build = async (attempt) => {
+      if (lease) {
+        // The previous attempt's nonce has moved on (landed elsewhere or cancelled)
+        if (attempt > 0) lease.nonce = await noncePool.readNonce(connection, lease.address);
+        if (!lease.nonce) throw new Error(`Nonce account ${lease.address} not readable`);
+        lease.sent = true;
+        return {
+          transaction: signMessage(compileMessage(ordered, payer.publicKey, lease.nonce), signers),
+          lastValidBlockHeight: null,
+          isExpired: noncePool.expiryCheck(connection, lease, payer)
+        };
+      }
+
+      const latest = previousBlockhash ? await provider.rotate(previousBlockhash) : await provider.getLatest();
+      previousBlockhash = latest.blockhash;
+      return {
+        transaction: signMessage(compileMessage(ordered, payer.publicKey, latest.blockhash), signers),
+        lastValidBlockHeight: latest.lastValidBlockHeight
+      };
+    };
+
+    let signature;
+    try {
+      signature = await sendWithRebroadcast(connection, build);
+    } catch (error) {
+      computeUnits.invalidateOnExceeded(error, instructions);
+      throw error;
+    } finally {
+      if (lease) await noncePool.release(lease).catch(error => console.warn(`Nonce lease not returned: ${error.message}`));
+    }
+    signatures.push(signature);
+    if (onConfirmed) onConfirmed(signature, batch);
+  }
+  return signatures;
+}
+
+module.exports = { getRentExemptMint, getMetadataAddress, getAssociatedAddress, packInstructions, sendPacked };
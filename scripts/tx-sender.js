@@ -0,0 +1,122 @@
+// Shared transaction sender. A transaction is signed once and the same raw bytes are rebroadcast every
+// SENDER.REBROADCAST_MS while the shared confirmation tracker watches its signature, until it is
+// confirmed or its lastValidBlockHeight has passed (an attempt gives up after SENDER.ATTEMPT_TIMEOUT_MS
+// in any case). Only an expired transaction is rebuilt (new blockhash, re-signed), and only after the
+// old one can no longer land, so the same transfer is never in flight twice.
+const bs58 = require('bs58');
+const config = require('./config');
+const { updateTransactionBlockhash } = require('./update-blockhash');
+const { withPriorityFee } = require('./fee-oracle');
+const { computeUnits, withComputeUnitLimit } = require('./compute-units');
+const { getConfirmationTracker } = require('./confirmation-tracker');
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+function transactionSignature(transaction) {
+  // VersionedTransaction keeps raw signatures, legacy Transaction exposes the fee payer's as .signature
+  return bs58.encode(transaction.version !== undefined ? transaction.signatures[0] : transaction.signature);
+}
+
+function isExpiredError(error) {
+  const message = String(error && error.message);
+  return message.includes('Blockhash not found') || message.includes('block height exceeded') || message.includes('expired');
+}
+
+// Block height from the tracker's last batched poll, read directly while the tracker has none; null if unknown
+async function currentBlockHeight(connection, tracker) {
+  if (tracker.blockHeight !== null) return tracker.blockHeight;
+  try {
+    return await connection.getBlockHeight('confirmed');
+  } catch (error) {
+    console.warn(`Block height check failed: ${error.message}`);
+    return null;
+  }
+}
+
+// Sends until one attempt confirms, returns its signature.
+// build(attempt) -> { transaction (signed), lastValidBlockHeight, isExpired }; attempt > 0 means the previous
+// one expired. isExpired() (optional, durable-nonce transactions) replaces the block-height check.
+async function sendWithRebroadcast(connection, build, options = {}) {
+  const settings = { ...config.SENDER, ...options };
+  const commitment = settings.commitment || 'confirmed';
+  const tracker = getConfirmationTracker(connection);
+
+  for (let attempt = 0; attempt <= settings.MAX_REBUILDS; attempt++) {
+    const { transaction, lastValidBlockHeight, isExpired = null } = await build(attempt);
+    const raw = transaction.serialize();
+    const signature = transactionSignature(transaction);
+
+    try {
+      // Preflight on the first send only: program errors surface here, before any rebroadcast
+      await connection.sendRawTransaction(raw, { skipPreflight: false, preflightCommitment: 'processed', maxRetries: 0 });
+    } catch (error) {
+      if (!isExpiredError(error)) throw error;
+      console.warn(`Attempt ${attempt + 1}: blockhash rejected, rebuilding`);
+      continue;
+    }
+    console.log(`Transaction sent, awaiting confirmation: ${signature}`);
+
+    // Resolves once confirmed, rejects if it landed with an error; the guard keeps a rejection that
+    // arrives between waits from going unhandled
+    const confirmation = tracker.track(signature, commitment);
+    confirmation.catch(() => {});
+    const deadline = Date.now() + settings.ATTEMPT_TIMEOUT_MS;
+
+    try {
+      while (true) {
+        if (await Promise.race([confirmation, sleep(settings.REBROADCAST_MS).then(() => null)])) {
+          console.log(`Transaction confirmed: ${signature}`);
+          return signature;
+        }
+
+        if (Date.now() > deadline) {
+          // Expiry could not be established (RPC failing): give up rather than hold the job forever
+          throw new Error(`Transaction ${signature} not confirmed after ${settings.ATTEMPT_TIMEOUT_MS} ms`);
+        }
+
+        let expired;
+        if (isExpired) {
+          expired = await isExpired().catch(error => { console.warn(`Expiry check failed: ${error.message}`); return false; });
+        } else {
+          const blockHeight = await currentBlockHeight(connection, tracker);
+          expired = blockHeight !== null && blockHeight > lastValidBlockHeight;
+        }
+        if (expired) {
+          // One last look, it may have landed in the final blocks
+          await tracker.poll().catch(() => {});
+          if (await Promise.race([confirmation, Promise.resolve(null)])) return signature;
+          const reason = isExpired ? 'nonce advanced' : `block height exceeded ${lastValidBlockHeight}`;
+          console.warn(`Attempt ${attempt + 1}: ${signature} expired (${reason})`);
+          break;
+        }
+
+        connection.sendRawTransaction(raw, { skipPreflight: true, maxRetries: 0 })
+          .catch(error => console.warn(`Rebroadcast failed: ${error.message}`));
+      }
+    } finally {
+      tracker.forget(signature);
+    }
+  }
+
+  throw new Error(`Transaction not confirmed: block height exceeded on ${settings.MAX_REBUILDS + 1} attempts`);
+}
+
+// Sends a legacy Transaction: every attempt gets the priority fee, compute-unit limit and a newer
+// blockhash, then is signed by `signers` (the first one pays)
+async function sendLegacyTransaction(connection, transaction, signers, txClass, options = {}) {
+  const feePayer = signers[0].publicKey;
+  try {
+    return await sendWithRebroadcast(connection, async () => {
+      await withPriorityFee(connection, transaction, txClass);
+      await withComputeUnitLimit(connection, transaction, txClass, feePayer);
+      await updateTransactionBlockhash(transaction, connection, { feePayer, commitment: 'finalized' });
+      transaction.sign(...signers);
+      return { transaction, lastValidBlockHeight: transaction.lastValidBlockHeight };
+    }, options);
+  } catch (error) {
+    computeUnits.invalidateOnExceeded(error, transaction.instructions);
+    throw error;
+  }
+}
+
+module.exports = { sendWithRebroadcast, sendLegacyTransaction, transactionSignature };
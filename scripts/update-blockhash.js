@@ -1,7 +1,8 @@
-const { Connection } = require('@solana/web3.js');
-const axios = require('axios');
 const config = require('./config');
+const { getBlockhashProvider } = require('./blockhash-provider');
 
+// Sets a recent blockhash from the shared provider (blockhash-provider.js), normally without an RPC
+// round trip. A transaction that already has a blockhash is being retried and gets a newer one.
 async function updateTransactionBlockhash(transaction, connection, options = {}) {
     try {
         const commitment = options.commitment || 'finalized';
@@ -11,47 +12,18 @@ async function updateTransactionBlockhash(transaction, connection, options = {})
             console.log('Getting new blockhash...');
         }
 
-        // Try using Helius API first
+        let blockhash, lastValidBlockHeight;
         try {
-            const heliusUrl = config.NETWORK_URL;
-
-            const rpcRequest = {
-                jsonrpc: '2.0',
-                id: 1,
-                method: 'getLatestBlockhash',
-                params: [{ commitment }]
-            };
-
-            const response = await axios.post(heliusUrl, rpcRequest, {
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                timeout: 10000
-            });
-
-            if (response.data && response.data.result && response.data.result.value) {
-                const { blockhash, lastValidBlockHeight } = response.data.result.value;
-
-                transaction.recentBlockhash = blockhash;
-                transaction.lastValidBlockHeight = lastValidBlockHeight;
-
-                if (options.feePayer) {
-                    transaction.feePayer = options.feePayer;
-                }
-
-                if (logEnabled) {
-                    console.log(`Transaction updated with blockhash: ${blockhash}`);
-                }
-
-                return transaction;
-            }
-        } catch (heliusError) {
-            console.warn('Helius API error, falling back to standard method:', heliusError.message);
+            const provider = getBlockhashProvider(connection ? connection.rpcEndpoint : config.NETWORK_URL, commitment);
+            ({ blockhash, lastValidBlockHeight } = transaction.recentBlockhash
+                ? await provider.rotate(transaction.recentBlockhash)
+                : await provider.getLatest());
+        } catch (providerError) {
+            // Fallback to standard Connection method
+            console.warn('Blockhash provider error, falling back to standard method:', providerError.message);
+            ({ blockhash, lastValidBlockHeight } = await connection.getLatestBlockhash(commitment));
         }
 
-        // Fallback to standard Connection method
-        const { blockhash, lastValidBlockHeight } = await connection.getLatestBlockhash(commitment);
-
         transaction.recentBlockhash = blockhash;
         transaction.lastValidBlockHeight = lastValidBlockHeight;
 
@@ -60,7 +32,7 @@ async function updateTransactionBlockhash(transaction, connection, options = {})
         }
 
         if (logEnabled) {
-            console.log(`Transaction updated with blockhash (standard method): ${blockhash}`);
+            console.log(`Transaction updated with blockhash: ${blockhash}`);
         }
 
         return transaction;
@@ -70,4 +42,4 @@ async function updateTransactionBlockhash(transaction, connection, options = {})
     }
 }
 
-module.exports = { updateTransactionBlockhash };
\ No newline at end of file
+module.exports = { updateTransactionBlockhash };
@@ -0,0 +1,98 @@
+#!/usr/bin/env node
+// Pre-warmed script worker: keeps web3 / spl-token / metaplex and config.js loaded across jobs.
+// Runs one job at a time, jobs arrive as JSON lines on stdin, everything it sends is a JSON line on stdout.
+// Job:    {"id": 1, "action": "create", "params": {...}}
+// Frames: {"id": 1, "type": "log", "stream": "stdout" | "stderr", "line": "..."}
+//         {"id": 1, "type": "progress", "event": {"type": "stage", "stage": "...", "ts": 123, "payload": {...}}}
+//         {"id": 1, "type": "result", "success": true, "result": {...}, "rssBytes": 123}
+//         {"id": 1, "type": "result", "success": false, "error": "message", "rssBytes": 123}
+const readline = require('readline');
+const util = require('util');
+
+function writeFrame(frame) {
+    process.stdout.write(JSON.stringify(frame) + '\n');
+}
+
+let currentJobId = null;
+
+// Script output becomes log frames of the running job
+function emitLog(stream) {
+    return (...args) => {
+        const text = util.format(...args);
+        for (const line of text.split('\n')) {
+            writeFrame({ id: currentJobId, type: 'log', stream, line });
+        }
+    };
+}
+
+console.log = emitLog('stdout');
+console.info = emitLog('stdout');
+console.warn = emitLog('stderr');
+console.error = emitLog('stderr');
+
+// Progress events travel as frames of the running job instead of PROGRESS_FD
+require('./progress.js').setProgressSink((event) => writeFrame({ id: currentJobId, type: 'progress', event }));
+
+// Loaded once per worker, this is what the pool saves on every job
+const { runFullProcess } = require('./solana-token.js');
+const { revokeAllAuthorities } = require('./revoke-authorities.js');
+const { jobWorkspace } = require('./workspace.js');
+
+const ACTIONS = {
+    create: (params) => runFullProcess(params),
+    revoke: async (params) => ({ revoked: await revokeAllAuthorities(jobWorkspace(params && params.JOB_ID)) })
+};
+
+async function runJob(job) {
+    const { id, action, params = null } = job;
+    currentJobId = id;
+
+    try {
+        const handler = ACTIONS[action];
+        if (!handler) throw new Error(`Unknown action: ${action}`);
+
+        const result = await handler(params);
+        writeFrame({ id, type: 'result', success: true, result: result === undefined ? null : result,
+            rssBytes: process.memoryUsage().rss });
+    } catch (error) {
+        console.error(`Job ${action} failed:`, error);
+        writeFrame({ id, type: 'result', success: false, error: error.message,
+            rssBytes: process.memoryUsage().rss });
+    } finally {
+        currentJobId = null;
+    }
+}
+
+function main() {
+    const rl = readline.createInterface({ input: process.stdin, terminal: false });
+    let queue = Promise.resolve();
+
+    rl.on('line', (line) => {
+        if (!line.trim()) return;
+
+        let job;
+        try {
+            job = JSON.parse(line);
+        } catch (error) {
+            console.error('Invalid job frame:', error.message);
+            return;
+        }
+
+        queue = queue.then(() => runJob(job));
+    });
+
+    // Pool retired this worker: finish the current job, then exit
+    rl.on('close', () => {
+        queue.then(() => process.stdout.write('', () => process.exit(0)));
+    });
+
+    process.on('unhandledRejection', (reason) => {
+        console.error('Unhandled rejection in worker:', reason);
+    });
+
+    writeFrame({ id: null, type: 'ready', pid: process.pid });
+}
+
+if (require.main === module) {
+    main();
+}
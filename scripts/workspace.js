@@ -0,0 +1,49 @@
+// Per-job workspace: each paid creation gets its own directory (keyed by the payment signature)
+// for token-info.json and temporary files, so several creations can run at the same time.
+// Without a job id the legacy shared paths are used (manual CLI runs).
+const fs = require('fs');
+const path = require('path');
+const config = require('./config');
+
+const JOBS_DIR = path.join(__dirname, '..', 'jobs');
+
+// Payment signatures are base58, anything else is dropped so the id is always a safe directory name
+function sanitizeJobId(jobId) {
+  return String(jobId).replace(/[^A-Za-z0-9_-]/g, '').slice(0, 128);
+}
+
+function jobWorkspace(jobId = null) {
+  const safeId = jobId ? sanitizeJobId(jobId) : '';
+
+  if (!safeId) {
+    return {
+      jobId: null,
+      dir: __dirname,
+      tokenInfoPath: config.TOKEN_INFO_PATH,
+      file: (name) => path.join(__dirname, name)
+    };
+  }
+
+  const dir = path.join(JOBS_DIR, safeId);
+  fs.mkdirSync(dir, { recursive: true });
+
+  return {
+    jobId: safeId,
+    dir,
+    tokenInfoPath: path.join(dir, 'token-info.json'),
+    file: (name) => path.join(dir, name)
+  };
+}
+
+function readTokenInfo(workspace) {
+  return JSON.parse(fs.readFileSync(workspace.tokenInfoPath, 'utf-8'));
+}
+
+function writeTokenInfo(workspace, tokenInfo) {
+  // Write-then-rename so a concurrent reader never sees a half-written file
+  const tmpPath = `${workspace.tokenInfoPath}.${process.pid}.tmp`;
+  fs.writeFileSync(tmpPath, JSON.stringify(tokenInfo, null, 2));
+  fs.renameSync(tmpPath, workspace.tokenInfoPath);
+}
+
+module.exports = { JOBS_DIR, jobWorkspace, readTokenInfo, writeTokenInfo };
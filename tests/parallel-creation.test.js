@@ -0,0 +1,118 @@
+// Two creations with different JOB_IDs running at the same time must keep their files apart:
+// jobs/<id>/token-info.json, the temporary logo copies and the revocation results.
+// RPC is stubbed: the connection serves the mint accounts and sendPacked is replaced, so no network is used.
+//   npm test
+const { test, after } = require('node:test');
+const assert = require('node:assert');
+const fs = require('fs');
+const os = require('os');
+const path = require('path');
+const crypto = require('crypto');
+const { Keypair } = require('@solana/web3.js');
+const { MintLayout, MINT_SIZE, TOKEN_PROGRAM_ID } = require('@solana/spl-token');
+
+const config = require('../scripts/config');
+const { jobWorkspace, readTokenInfo, writeTokenInfo } = require('../scripts/workspace');
+const { prepareImageFile, cleanupTempFiles } = require('../scripts/ipfs-utils');
+
+// revoke-authorities.js takes sendPacked when it is loaded, so the stub goes in first
+const txPacker = require('../scripts/tx-packer');
+const sent = [];
+txPacker.sendPacked = async (connection, groups, wallet, options) => {
+  await new Promise(resolve => setImmediate(resolve));
+  const signature = `sig-${crypto.randomBytes(8).toString('hex')}`;
+  sent.push({ connection, groups, wallet, options, signature });
+  return [signature];
+};
+const { revokeAuthoritiesBatched } = require('../scripts/revoke-authorities');
+
+const tmpDir = fs.mkdtempSync(path.join(os.tmpdir(), 'parallel-creation-'));
+const wallet = Keypair.generate();
+const walletPath = path.join(tmpDir, 'wallet.json');
+fs.writeFileSync(walletPath, JSON.stringify({ privateKey: Buffer.from(wallet.secretKey).toString('hex') }));
+const runtimeConfig = { ...config, WALLET_TYPE: 'privateKey', WALLET_PATH: walletPath };
+
+const jobIds = [`test-${crypto.randomUUID()}`, `test-${crypto.randomUUID()}`];
+
+after(() => {
+  for (const jobId of jobIds) fs.rmSync(jobWorkspace(jobId).dir, { recursive: true, force: true });
+  fs.rmSync(tmpDir, { recursive: true, force: true });
+});
+
+// Connection stub answering getAccountInfo for one mint (authorities still held by the wallet), no metadata account
+function stubConnection(tokenMint) {
+  const data = Buffer.alloc(MINT_SIZE);
+  MintLayout.encode({
+    mintAuthorityOption: 1,
+    mintAuthority: wallet.publicKey,
+    supply: 1000000000n,
+    decimals: 9,
+    isInitialized: true,
+    freezeAuthorityOption: 1,
+    freezeAuthority: wallet.publicKey
+  }, data);
+
+  return {
+    rpcEndpoint: `http://stub/${tokenMint.toString()}`,
+    getAccountInfo: async (address) => {
+      await new Promise(resolve => setImmediate(resolve));
+      if (!address.equals(tokenMint)) return null;
+      return { data, owner: TOKEN_PROGRAM_ID, lamports: 1461600, executable: false, rentEpoch: 0 };
+    }
+  };
+}
+
+async function runCreation(jobId, index) {
+  const workspace = jobWorkspace(jobId);
+  const tokenMint = Keypair.generate().publicKey;
+  const connection = stubConnection(tokenMint);
+
+  const logoSource = path.join(tmpDir, `logo-${index}.png`);
+  fs.writeFileSync(logoSource, `logo of ${jobId}`);
+  const image = prepareImageFile(logoSource, workspace);
+
+  writeTokenInfo(workspace, { jobId, tokenMint: tokenMint.toString(), tokenName: `Token ${index}` });
+  const result = await revokeAuthoritiesBatched(workspace, ['FREEZE', 'MINT'], runtimeConfig, connection);
+
+  return { workspace, tokenMint, connection, image, result };
+}
+
+test('parallel creations keep separate workspaces', async () => {
+  const jobs = await Promise.all(jobIds.map(runCreation));
+  const [first, second] = jobs;
+
+  assert.notStrictEqual(first.workspace.dir, second.workspace.dir);
+  assert.notStrictEqual(first.workspace.tokenInfoPath, second.workspace.tokenInfoPath);
+  assert.notStrictEqual(first.image.tempImagePath, second.image.tempImagePath);
+
+  for (const [index, job] of jobs.entries()) {
+    const jobId = jobIds[index];
+    assert.strictEqual(job.workspace.tokenInfoPath, path.join(job.workspace.dir, 'token-info.json'));
+    assert.strictEqual(path.dirname(job.image.tempImagePath), job.workspace.dir);
+    assert.strictEqual(fs.readFileSync(job.image.tempImagePath, 'utf-8'), `logo of ${jobId}`);
+
+    // Each job's revocation went out on its own connection and landed in its own token-info.json
+    const call = sent.find(entry => entry.connection === job.connection);
+    assert.ok(call, `no transaction sent for ${jobId}`);
+    assert.ok(call.wallet.publicKey.equals(wallet.publicKey));
+    assert.deepStrictEqual(job.result, { signature: call.signature, revoked: { FREEZE: true, MINT: true } });
+
+    const tokenInfo = readTokenInfo(job.workspace);
+    assert.strictEqual(tokenInfo.jobId, jobId);
+    assert.strictEqual(tokenInfo.tokenMint, job.tokenMint.toString());
+    assert.strictEqual(tokenInfo.freezeAuthorityRevokeSignature, call.signature);
+    assert.strictEqual(tokenInfo.revokeSignature, call.signature);
+  }
+  assert.strictEqual(sent.length, 2);
+  assert.notStrictEqual(first.result.signature, second.result.signature);
+
+  // No leftover write-then-rename temp files
+  for (const job of jobs) {
+    assert.deepStrictEqual(fs.readdirSync(job.workspace.dir).filter(name => name.endsWith('.tmp')), []);
+  }
+
+  // Cleaning up one job leaves the other's logo in place
+  cleanupTempFiles(first.image.tempImagePath, first.image.isLocalFile, first.image.originalPath);
+  assert.ok(!fs.existsSync(first.image.tempImagePath));
+  assert.ok(fs.existsSync(second.image.tempImagePath));
+});
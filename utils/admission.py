@@ -0,0 +1,154 @@
+"""Central admission control for subprocess / RPC heavy work"""
+import logging
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from config import ADMISSION_LIMITS
+
+
+class _WorkClass:
+    """Concurrency limit plus priority queue of waiters for one class of work"""
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._waiters = []  # heap of [priority, seq, future, on_position, last_notified_position]
+
+        self.admitted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def positions(self):
+        """[(position, entry), ...] for live waiters, 1 = next to run"""
+        live = sorted(entry for entry in self._waiters if not entry[2].done())
+        return list(enumerate(live, start=1))
+
+    def queue_depth(self):
+        """Waiters still waiting (handed-over or cancelled entries not popped yet are left out)"""
+        return sum(1 for entry in self._waiters if not entry[2].done())
+
+    def stats(self):
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'queue_depth': self.queue_depth(),
+            'max_queue_depth': self.max_queue_depth,
+            'admitted': self.admitted,
+            'queued': self.queued,
+            'timeouts': self.timeouts,
+            'avg_wait_ms': round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0,
+            'max_wait_ms': round(self.max_wait * 1000, 1),
+        }
+
+
+class AdmissionController:
+    """
+    Per-class concurrency limits ('db', 'creation', 'payout').
+    Work over the limit waits in a priority queue (lower priority value runs first,
+    FIFO within a priority); on_position(position) is awaited when a caller is queued
+    and every time its queue position changes.
+    """
+
+    def __init__(self, limits):
+        self.classes = {name: _WorkClass(name, limit) for name, limit in limits.items()}
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def slot(self, work_class, priority=0, on_position=None, timeout=None):
+        """
+        async with admission.slot('creation', on_position=notify): ...
+
+        Raises asyncio.TimeoutError if no slot frees up within timeout.
+        """
+        cls = self.classes[work_class]
+        await self._acquire(cls, priority, on_position, timeout)
+        try:
+            yield
+        finally:
+            self._release(cls)
+
+    async def _acquire(self, cls, priority, on_position, timeout):
+        started = time.monotonic()
+
+        if cls.active < cls.limit and not cls.queue_depth():
+            cls.active += 1
+            self._record_admitted(cls, started)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future, on_position, None]
+        heapq.heappush(cls._waiters, entry)
+        cls.queued += 1
+        cls.max_queue_depth = max(cls.max_queue_depth, cls.queue_depth())
+
+        # Everything after the push is inside the try, so a caller cancelled while its position
+        # is being reported still takes its entry out (or passes on a slot it was handed)
+        try:
+            if on_position is not None:
+                position = next(pos for pos, waiter in cls.positions() if waiter is entry)
+                entry[4] = position
+                logging.info(f"Admission '{cls.name}': queued at position {position}")
+                await self._notify(on_position, position)
+
+            remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - started))
+            await asyncio.wait_for(asyncio.shield(future), timeout=remaining)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we gave up: pass it on
+                self._release(cls)
+            else:
+                future.cancel()
+                if entry in cls._waiters:
+                    cls._waiters.remove(entry)
+                    heapq.heapify(cls._waiters)
+                self._notify_positions(cls)
+            if isinstance(e, asyncio.TimeoutError):
+                cls.timeouts += 1
+            raise
+
+        self._record_admitted(cls, started)
+
+    def _record_admitted(self, cls, started):
+        waited = time.monotonic() - started
+        cls.admitted += 1
+        cls.total_wait += waited
+        cls.max_wait = max(cls.max_wait, waited)
+
+    def _release(self, cls):
+        cls.active -= 1
+
+        while cls._waiters and cls.active < cls.limit:
+            future = heapq.heappop(cls._waiters)[2]
+            if future.done():
+                continue
+            # Hand the slot straight to the next waiter
+            cls.active += 1
+            future.set_result(None)
+
+        self._notify_positions(cls)
+
+    def _notify_positions(self, cls):
+        for position, entry in cls.positions():
+            on_position, last_position = entry[3], entry[4]
+            if on_position is not None and position != last_position:
+                entry[4] = position
+                asyncio.create_task(self._notify(on_position, position))
+
+    @staticmethod
+    async def _notify(on_position, position):
+        try:
+            await on_position(position)
+        except Exception as e:
+            logging.debug(f"Queue position callback failed: {e}")
+
+    def stats(self):
+        return {name: cls.stats() for name, cls in self.classes.items()}
+
+
+admission = AdmissionController(ADMISSION_LIMITS)
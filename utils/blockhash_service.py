@@ -0,0 +1,92 @@
+"""Local blockhash endpoint (node scripts/blockhash-provider.js --serve) shared by every Node script"""
+import asyncio
+import logging
+import os
+from config import BLOCKHASH_SERVICE_PORT
+
+SERVICE_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts',
+                              'blockhash-provider.js')
+
+RESTART_DELAY = 5  # seconds before restarting a service that exited
+
+
+class BlockhashService:
+    """
+    Keeps the blockhash service process running. Scripts fall back to their own RPC polling
+    while it is down, so a crash only costs latency; it is restarted after RESTART_DELAY.
+    """
+
+    def __init__(self, script, port):
+        self.script = script
+        self.port = port
+        self.process = None
+        self.restarts = 0
+        self._task = None
+        self._closed = False
+
+    @property
+    def is_running(self):
+        return self.process is not None and self.process.returncode is None
+
+    async def _spawn(self):
+        self.process = await asyncio.create_subprocess_exec(
+            'node', self.script, '--serve',
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
+        )
+        # Wait for the listening line so scripts started right after find it
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"blockhash service exited with code {await self.process.wait()}")
+            text = line.decode('utf-8', errors='replace').rstrip()
+            logging.info(f"Blockhash service: {text}")
+            if 'listening' in text:
+                return
+
+    async def _supervise(self):
+        while not self._closed:
+            if self.is_running:
+                line = await self.process.stdout.readline()
+                if line:
+                    logging.info(f"Blockhash service: {line.decode('utf-8', errors='replace').rstrip()}")
+                    continue
+                code = await self.process.wait()
+                if self._closed:
+                    return
+                logging.warning(f"Blockhash service exited with code {code}, restarting in {RESTART_DELAY}s")
+
+            await asyncio.sleep(RESTART_DELAY)
+            try:
+                await self._spawn()
+                self.restarts += 1
+            except Exception as e:
+                logging.error(f"Failed to restart blockhash service: {e}")
+
+    async def start(self):
+        """Start the service (call once at startup); returns False when it is disabled or failed to start"""
+        if not self.port:
+            return False
+        try:
+            await self._spawn()
+        except Exception as e:
+            logging.error(f"Failed to start blockhash service: {e}")
+            return False
+        self._task = asyncio.create_task(self._supervise())
+        return True
+
+    async def close(self, timeout=5.0):
+        self._closed = True
+        if self._task:
+            self._task.cancel()
+        if not self.is_running:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+
+blockhash_service = BlockhashService(SERVICE_SCRIPT, BLOCKHASH_SERVICE_PORT)
@@ -0,0 +1,451 @@
+"""Durable token-creation job queue: SQLite-backed, claimed by a fixed pool of async workers under leases"""
+import logging
+import asyncio
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import (DEBUG_MODE, CREATION_WORKERS, CREATION_JOB_LEASE_SECONDS, CREATION_JOB_MAX_ATTEMPTS,
+                    CREATION_JOB_POLL_INTERVAL, CREATION_JOB_DEFAULT_DURATION)
+from referrals.dao import STORAGE_PROFILE, CREATE_SCHEMA_VERSION_TABLE, apply_storage_profile
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Recent successful jobs used for the ETA
+ETA_SAMPLE_SIZE = 20
+
+
+def get_creation_jobs_db_path(debug_mode):
+    db_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database')
+    return os.path.join(db_dir, 'creation_jobs_test.db' if debug_mode else 'creation_jobs.db')
+
+
+CREATE_JOBS_TABLE = """
+    CREATE TABLE IF NOT EXISTS creation_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job_key TEXT NOT NULL UNIQUE,
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires_at REAL,
+        status_message_id INTEGER,
+        error TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )
+"""
+
+CREATE_JOBS_STATUS_INDEX = "CREATE INDEX IF NOT EXISTS idx_creation_jobs_status ON creation_jobs (status, id)"
+
+# (version, description, statements), tracked in schema_version like the referral DB
+MIGRATIONS = [
+    (1, 'create creation_jobs table', [CREATE_JOBS_TABLE, CREATE_JOBS_STATUS_INDEX]),
+    # JSON {stage: data} written by scripts/checkpoint.js, passed back to the pipeline on retry
+    (2, 'add creation_jobs.checkpoint', ['ALTER TABLE creation_jobs ADD COLUMN checkpoint TEXT']),
+]
+
+
+def _job_from_row(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['checkpoint'] = json.loads(job['checkpoint']) if job.get('checkpoint') else {}
+    return job
+
+
+class CreationJobStore:
+    """
+    Job records in SQLite. Like ReferralDao, all queries run on one dedicated thread
+    owning a single connection, so the event loop never blocks on the DB.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.db = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='creation-jobs')
+
+    # Thread side (only ever called on the executor thread)
+
+    def _connection(self):
+        if self.db is None:
+            db = sqlite3.connect(self.db_file, isolation_level=None,
+                                 timeout=STORAGE_PROFILE['busy_timeout_ms'] / 1000)
+            db.row_factory = sqlite3.Row
+            try:
+                apply_storage_profile(db)
+                self._migrate(db)
+            except Exception:
+                db.close()
+                raise
+            self.db = db
+        return self.db
+
+    def _migrate(self, db):
+        db.execute(CREATE_SCHEMA_VERSION_TABLE)
+        current_version = db.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+
+        for version, description, statements in MIGRATIONS:
+            if version <= current_version:
+                continue
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                for sql in statements:
+                    db.execute(sql)
+                db.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+            logging.info(f"Creation jobs DB migration {version} applied: {description}")
+
+    def _in_transaction(self, func, *args):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(db, *args)
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    def _enqueue(self, db, job_key, chat_id, user_id, payload):
+        job = _job_from_row(db.execute('SELECT * FROM creation_jobs WHERE job_key = ?', (job_key,)).fetchone())
+
+        if job is None:
+            db.execute(
+                'INSERT INTO creation_jobs (job_key, chat_id, user_id, payload, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_key, chat_id, user_id, json.dumps(payload, default=str), time.time())
+            )
+        elif job['status'] == FAILED:
+            # Paid job that failed earlier: the user asked again, so it goes back in line,
+            # keeping its checkpoint so the retry resumes after the stages already on-chain
+            db.execute(
+                """UPDATE creation_jobs SET status = ?, attempts = 0, error = NULL, lease_owner = NULL,
+                       payload = ?, created_at = ? WHERE id = ?""",
+                (QUEUED, json.dumps(payload, default=str), time.time(), job['id'])
+            )
+        else:
+            return job, False
+
+        return _job_from_row(db.execute('SELECT * FROM creation_jobs WHERE job_key = ?', (job_key,)).fetchone()), True
+
+    def _claim(self, db, owner, lease_seconds, max_attempts):
+        """Oldest queued job, or a running one whose lease ran out (its worker died)"""
+        now = time.time()
+        while True:
+            row = db.execute(
+                """SELECT * FROM creation_jobs
+                   WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+                   ORDER BY id LIMIT 1""",
+                (QUEUED, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row['attempts'] >= max_attempts:
+                db.execute('UPDATE creation_jobs SET status = ?, error = ?, lease_owner = NULL, finished_at = ? '
+                           'WHERE id = ?', (FAILED, f"gave up after {row['attempts']} attempts", now, row['id']))
+                logging.error(f"Creation job {row['id']} failed: gave up after {row['attempts']} attempts")
+                continue
+
+            db.execute(
+                """UPDATE creation_jobs SET status = ?, lease_owner = ?, lease_expires_at = ?,
+                       attempts = attempts + 1, started_at = ? WHERE id = ?""",
+                (RUNNING, owner, now + lease_seconds, now, row['id'])
+            )
+            return _job_from_row(db.execute('SELECT * FROM creation_jobs WHERE id = ?', (row['id'],)).fetchone())
+
+    def _renew(self, db, job_id, owner, lease_seconds):
+        return db.execute(
+            'UPDATE creation_jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = ?',
+            (time.time() + lease_seconds, job_id, owner, RUNNING)
+        ).rowcount > 0
+
+    def _finish(self, db, job_id, owner, status, error):
+        return db.execute(
+            """UPDATE creation_jobs SET status = ?, error = ?, lease_owner = NULL, lease_expires_at = NULL,
+                   finished_at = ? WHERE id = ? AND lease_owner = ?""",
+            (status, error, time.time(), job_id, owner)
+        ).rowcount > 0
+
+    def _recover(self, db, owner):
+        """Jobs left running by a previous process go back to the front of the queue"""
+        return db.execute(
+            'UPDATE creation_jobs SET status = ?, lease_owner = NULL, lease_expires_at = NULL '
+            'WHERE status = ? AND (lease_owner IS NULL OR lease_owner != ?)',
+            (QUEUED, RUNNING, owner)
+        ).rowcount
+
+    def _save_checkpoint(self, db, job_id, owner, stage, data):
+        """Merge one finished stage into the job's checkpoint; ignored if the lease was lost"""
+        row = db.execute('SELECT checkpoint FROM creation_jobs WHERE id = ? AND lease_owner = ?',
+                         (job_id, owner)).fetchone()
+        if row is None:
+            return False
+        checkpoint = json.loads(row['checkpoint']) if row['checkpoint'] else {}
+        checkpoint[stage] = data
+        db.execute('UPDATE creation_jobs SET checkpoint = ? WHERE id = ?',
+                   (json.dumps(checkpoint, default=str), job_id))
+        return True
+
+    def _set_status_message(self, db, job_id, message_id):
+        db.execute('UPDATE creation_jobs SET status_message_id = ? WHERE id = ?', (message_id, job_id))
+
+    def _queue_snapshot(self):
+        db = self._connection()
+        queued = [_job_from_row(row) for row in
+                  db.execute('SELECT * FROM creation_jobs WHERE status = ? ORDER BY id', (QUEUED,)).fetchall()]
+        running = db.execute('SELECT COUNT(*) FROM creation_jobs WHERE status = ?', (RUNNING,)).fetchone()[0]
+        durations = [row[0] for row in db.execute(
+            """SELECT finished_at - started_at FROM creation_jobs
+               WHERE status = ? AND started_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?""",
+            (DONE, ETA_SAMPLE_SIZE)
+        ).fetchall()]
+        return queued, running, durations
+
+    def _counts(self):
+        rows = self._connection().execute('SELECT status, COUNT(*) FROM creation_jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def _close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    # Async side
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _transaction(self, func, *args):
+        return await self._run(self._in_transaction, func, *args)
+
+    async def enqueue(self, job_key, chat_id, user_id, payload):
+        """Returns (job, created); an existing job with the same key is returned as is unless it failed"""
+        return await self._transaction(self._enqueue, job_key, chat_id, user_id, payload)
+
+    async def claim(self, owner, lease_seconds, max_attempts):
+        return await self._transaction(self._claim, owner, lease_seconds, max_attempts)
+
+    async def renew(self, job_id, owner, lease_seconds):
+        return await self._transaction(self._renew, job_id, owner, lease_seconds)
+
+    async def finish(self, job_id, owner, status, error=None):
+        return await self._transaction(self._finish, job_id, owner, status, error)
+
+    async def recover(self, owner):
+        return await self._transaction(self._recover, owner)
+
+    async def save_checkpoint(self, job_id, owner, stage, data):
+        return await self._transaction(self._save_checkpoint, job_id, owner, stage, data)
+
+    async def set_status_message(self, job_id, message_id):
+        await self._transaction(self._set_status_message, job_id, message_id)
+
+    async def queue_snapshot(self):
+        return await self._run(self._queue_snapshot)
+
+    async def counts(self):
+        return await self._run(self._counts)
+
+    async def close(self):
+        await self._run(self._close)
+
+
+class CreationJobQueue:
+    """
+    Payment confirmation enqueues a job; `workers` async workers claim jobs one at a time
+    under a lease of `lease_seconds`, renewed while the job runs. Jobs left running by a
+    crashed / restarted process are queued again on start; a job is given up after
+    `max_attempts` claims. The queue assumes one bot process per jobs DB.
+
+    handler(job) runs the job and raises if it failed; job['checkpoint'] holds the stages
+    finished by earlier attempts (save_checkpoint). on_position(job, position, eta_seconds)
+    is awaited for every queued job whenever the queue moves.
+    """
+
+    def __init__(self, store, workers=2, lease_seconds=120, max_attempts=3, poll_interval=2.0,
+                 default_duration=90.0):
+        self.store = store
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.default_duration = default_duration
+
+        self.owner = uuid.uuid4().hex
+        self._handler = None
+        self._on_position = None
+        self._tasks = []
+        self._wakeup = None
+        self._closing = False
+        self._notified = {}  # job id -> last position sent to on_position
+
+        self.completed = 0
+        self.failed = 0
+        self.recovered = 0
+
+    @property
+    def is_running(self):
+        return bool(self._tasks)
+
+    async def start(self, handler, on_position=None):
+        """Requeue jobs interrupted by the previous run and start the workers; returns the recovered count"""
+        self._handler = handler
+        self._on_position = on_position
+        self._wakeup = asyncio.Event()
+        self._closing = False
+
+        self.recovered = await self.store.recover(self.owner)
+        if self.recovered:
+            logging.warning(f"Creation queue: {self.recovered} interrupted jobs queued again")
+
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        return self.recovered
+
+    async def enqueue(self, job_key, chat_id, user_id, payload):
+        """Returns (job, created, position, eta_seconds); position 0 means a worker picks it up right away"""
+        job, created = await self.store.enqueue(job_key, chat_id, user_id, payload)
+        if created and self._wakeup is not None:
+            self._wakeup.set()
+
+        position, eta = 0, None
+        if job['status'] == QUEUED:
+            position, eta = await self.estimate(job['id'])
+        return job, created, position, eta
+
+    def _estimate(self, index, running, durations):
+        """Position (1 = next) and ETA until done for the queued job at `index`, 0 / None if it starts now"""
+        average = sum(durations) / len(durations) if durations else self.default_duration
+        rounds_before_start = (index + running) // max(self.workers, 1)
+        if rounds_before_start == 0:
+            return 0, None
+        return index + 1, math.ceil((rounds_before_start + 1) * average)
+
+    async def estimate(self, job_id):
+        queued, running, durations = await self.store.queue_snapshot()
+        for index, job in enumerate(queued):
+            if job['id'] == job_id:
+                return self._estimate(index, running, durations)
+        return 0, None
+
+    async def save_checkpoint(self, job, stage, data):
+        """Record a finished pipeline stage of a running job (scripts/checkpoint.js events)"""
+        job['checkpoint'][stage] = data
+        if not await self.store.save_checkpoint(job['id'], self.owner, stage, data):
+            logging.warning(f"Creation job {job['id']}: checkpoint {stage} not saved, lease lost")
+
+    async def _notify_positions(self):
+        if self._on_position is None:
+            return
+        try:
+            queued, running, durations = await self.store.queue_snapshot()
+        except Exception as e:
+            logging.debug(f"Creation queue snapshot failed: {e}")
+            return
+
+        notified, self._notified = self._notified, {}
+        for index, job in enumerate(queued):
+            position, eta = self._estimate(index, running, durations)
+            self._notified[job['id']] = position
+            if notified.get(job['id']) == position:
+                continue
+            try:
+                await self._on_position(job, position, eta)
+            except Exception as e:
+                logging.debug(f"Creation queue position callback failed: {e}")
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await self.store.renew(job_id, self.owner, self.lease_seconds):
+                    logging.warning(f"Creation job {job_id}: lease lost")
+                    return
+            except Exception as e:
+                logging.error(f"Creation job {job_id}: lease renewal failed: {e}")
+
+    async def _run_job(self, job):
+        heartbeat = asyncio.create_task(self._heartbeat(job['id']))
+        try:
+            await self._handler(job)
+        except asyncio.CancelledError:
+            # Shutdown: the job stays running and is picked up again on the next start
+            raise
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Creation job {job['id']} failed: {e}")
+            await self.store.finish(job['id'], self.owner, FAILED, str(e) or type(e).__name__)
+        else:
+            self.completed += 1
+            await self.store.finish(job['id'], self.owner, DONE)
+        finally:
+            heartbeat.cancel()
+
+    async def _worker(self, index):
+        while not self._closing:
+            try:
+                job = await self.store.claim(self.owner, self.lease_seconds, self.max_attempts)
+            except Exception as e:
+                logging.error(f"Creation queue worker {index}: claim failed: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            logging.info(f"Creation queue worker {index}: job {job['id']} (attempt {job['attempts']})")
+            asyncio.create_task(self._notify_positions())
+            await self._run_job(job)
+            asyncio.create_task(self._notify_positions())
+
+    async def close(self, timeout=30.0):
+        """Stop claiming; running jobs get `timeout` seconds, then stay in the DB for the next start"""
+        self._closing = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self._tasks = []
+
+        await self.store.close()
+
+    async def stats(self):
+        return {
+            'workers': self.workers if self.is_running else 0,
+            'jobs': await self.store.counts(),
+            'completed': self.completed,
+            'failed': self.failed,
+            'recovered': self.recovered,
+        }
+
+
+creation_jobs = CreationJobQueue(
+    CreationJobStore(get_creation_jobs_db_path(DEBUG_MODE)),
+    workers=CREATION_WORKERS,
+    lease_seconds=CREATION_JOB_LEASE_SECONDS,
+    max_attempts=CREATION_JOB_MAX_ATTEMPTS,
+    poll_interval=CREATION_JOB_POLL_INTERVAL,
+    default_duration=CREATION_JOB_DEFAULT_DURATION
+)
@@ -0,0 +1,121 @@
+"""Small dependency-graph executor, the Python counterpart of scripts/dag.js"""
+import asyncio
+import time
+
+
+class Stage:
+    """run(values) -> dict with the stage's outputs; it starts once all its inputs exist"""
+
+    def __init__(self, name, run, inputs=(), outputs=()):
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+
+class DagStageError(Exception):
+    """A stage failed; `stage` is its name and `report` the timings up to the failure"""
+
+    def __init__(self, stage, error, report):
+        super().__init__(f"stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.report = report
+
+
+def _validate(stages, initial):
+    producers = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"Output {output} produced by both {producers[output]} and {stage.name}")
+            producers[output] = stage.name
+    for stage in stages:
+        for name in stage.inputs:
+            if name not in producers and name not in initial:
+                raise ValueError(f"Stage {stage.name}: no producer for {name}")
+    return producers
+
+
+def _critical_path(stages, producers, timings):
+    """Longest chain of dependent stages by duration"""
+    finish, previous = {}, {}
+    for stage in sorted((s for s in stages if s.name in timings), key=lambda s: timings[s.name]['end']):
+        deps = [producers[name] for name in stage.inputs if producers.get(name) in finish]
+        best = max(deps, key=lambda dep: finish[dep], default=None)
+        finish[stage.name] = timings[stage.name]['ms'] + (finish[best] if best else 0)
+        previous[stage.name] = best
+
+    last = max(finish, key=finish.get, default=None)
+    path = []
+    while last:
+        path.insert(0, last)
+        last = previous[last]
+    return path, (finish[path[-1]] if path else 0)
+
+
+def _ms(seconds):
+    return round(seconds * 1000)
+
+
+async def run_dag(stages, initial=None):
+    """
+    Run stages as their inputs become available, independent ones concurrently.
+    Returns (values, report); report = {wall_ms, timings: {stage: {start, end, ms, failed}}, critical_path, critical_path_ms}.
+    Raises DagStageError once the running stages have finished if one of them failed.
+    """
+    values = dict(initial or {})
+    producers = _validate(stages, values)
+    timings = {}
+    pending = {stage.name: stage for stage in stages}
+    running = {}
+    failure = None
+    started = time.monotonic()
+
+    async def run_stage(stage):
+        start = time.monotonic()
+        failed = True
+        try:
+            produced = await stage.run(values) or {}
+            failed = False
+        finally:
+            end = time.monotonic()
+            timings[stage.name] = {'start': _ms(start - started), 'end': _ms(end - started), 'ms': _ms(end - start),
+                                   'failed': failed}
+        for output in stage.outputs:
+            values[output] = produced.get(output)
+
+    while pending or running:
+        if failure is None:
+            for name, stage in list(pending.items()):
+                if all(dep in values for dep in stage.inputs):
+                    del pending[name]
+                    running[asyncio.create_task(run_stage(stage))] = name
+
+        if not running:
+            if failure is None and pending:
+                raise ValueError(f"Stages can never run: {', '.join(pending)}")
+            break
+
+        done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            name = running.pop(task)
+            if task.exception() is not None and failure is None:
+                failure = (name, task.exception())
+
+    path, path_ms = _critical_path(stages, producers, timings)
+    report = {'wall_ms': _ms(time.monotonic() - started), 'timings': timings,
+              'critical_path': path, 'critical_path_ms': path_ms}
+
+    if failure is not None:
+        raise DagStageError(failure[0], failure[1], report)
+    return values, report
+
+
+def format_dag_report(report):
+    lines = [f"Stage timings, wall {report['wall_ms']} ms:"]
+    for name, timing in sorted(report['timings'].items(), key=lambda item: item[1]['start']):
+        lines.append(f"  {name}: {timing['ms']} ms ({timing['start']}-{timing['end']} ms)"
+                     + (" failed" if timing.get('failed') else ""))
+    lines.append(f"Critical path {report['critical_path_ms']} ms: {' -> '.join(report['critical_path'])}")
+    return '\n'.join(lines)
@@ -1,5 +1,5 @@
 """Utility functions and main handlers for memecoin bot"""
-import logging, asyncio, unicodedata, os, json, datetime
+import logging, asyncio, unicodedata, os, json, datetime, math
 from aiogram import types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
@@ -176,14 +176,33 @@ async def animate_checking(message, animation_symbols):
 
 
 async def message_after_payment(message, state, user_data, tx_info):
-    """Message after payment confirmation"""
+    """Message after payment confirmation: the creation goes into the durable job queue"""
     from bot import BotStates, start_token_creation
+    from utils.creation_jobs import creation_jobs, DONE
 
     user_info = user_data.get('user_info', '[unknown_user]')
     logging.info(f"{user_info} sending payment confirmation message")
     await message.answer(LANGUAGES['payment_confirmed_start_creation'])
     await state.set_state(BotStates.creating_token)
-    await start_token_creation(message, state, user_data, tx_info)
+
+    if not creation_jobs.is_running:
+        await start_token_creation(message, state, user_data, tx_info)
+        return
+
+    job, created, position, eta = await creation_jobs.enqueue(
+        tx_info['signature'], state.key.chat_id, state.key.user_id,
+        {'user_data': user_data, 'tx_info': tx_info}
+    )
+    logging.info(f"{user_info} creation job {job['id']} {'queued' if created else job['status']}, position {position}")
+
+    if not created and job['status'] == DONE:
+        await message.answer(LANGUAGES['token_already_created'])
+        await state.set_state(BotStates.token_name)
+        return
+
+    if position:
+        queued_message = await message.answer(LANGUAGES['creation_job_queued'].format(position, math.ceil(eta / 60)))
+        await creation_jobs.store.set_status_message(job['id'], queued_message.message_id)
 
 
 async def cleanup_user_files(user_data):
@@ -1,4 +1,7 @@
-import os, sys, subprocess, re, json, asyncio, argparse
+import os, sys, subprocess, re, json, asyncio, argparse, shutil
+from utils.js_worker_pool import js_worker_pool, WORKER_ACTIONS
+from utils.admission import admission
+from utils.dag import Stage, DagStageError, run_dag, format_dag_report
 
 
 def find_project_files():
@@ -17,9 +20,30 @@ def find_project_files():
     return paths['config.js'], paths['token-info.json'], scripts_dir
 
 
-def get_token_info():
+# Per-job workspaces of scripts/workspace.js, one directory per payment signature
+JOBS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobs')
+
+
+def get_job_workspace(job_id):
+    """Workspace directory of a creation job (same sanitizing as scripts/workspace.js), None without an id"""
+    safe_id = re.sub(r'[^A-Za-z0-9_-]', '', str(job_id or ''))[:128]
+    return os.path.join(JOBS_DIR, safe_id) if safe_id else None
+
+
+def remove_job_workspace(job_id):
+    workspace = get_job_workspace(job_id)
+    if workspace and os.path.isdir(workspace):
+        shutil.rmtree(workspace, ignore_errors=True)
+        print(f"🧹 Job workspace removed: {workspace}")
+
+
+def get_token_info(job_id=None):
     try:
-        _, token_path, _ = find_project_files()
+        workspace = get_job_workspace(job_id)
+        if workspace:
+            token_path = os.path.join(workspace, 'token-info.json')
+        else:
+            _, token_path, _ = find_project_files()
         print(f"🔍 Searching for token-info.json: {token_path}")
         if token_path and os.path.exists(token_path):
             with open(token_path, 'r', encoding='utf-8') as f:
@@ -34,39 +58,61 @@ def get_token_info():
         return None
 
 
-async def _process_output(process, log_callback=None, is_async=True):
-    stdout_lines = []
-    stderr_lines = []
+async def _emit_line(text, log_callback, is_async):
+    print(text)
+    if log_callback:
+        await log_callback(text) if is_async else log_callback(text)
 
-    while True:
-        if is_async:
-            line = await process.stdout.readline()
-            if not line: break
-            text = line.decode('utf-8', errors='replace').strip()
-        else:
+
+async def _process_output(process, log_callback=None, is_async=True):
+    """Stream stdout/stderr lines to log_callback as they arrive; returns (stdout_count, stderr_count)"""
+    if not is_async:
+        stdout_count = 0
+        while True:
             text = process.stdout.readline()
             if text == '' and process.poll() is not None: break
             text = text.strip()
+            if text:
+                stdout_count += 1
+                await _emit_line(text, log_callback, False)
+
+        stderr_count = 0
+        for text in process.stderr:
+            if text.strip():
+                stderr_count += 1
+                await _emit_line(f"STDERR: {text.rstrip()}", log_callback, False)
+        return stdout_count, stderr_count
+
+    async def pump(stream, prefix=''):
+        count = 0
+        while True:
+            line = await stream.readline()
+            if not line: break
+            text = line.decode('utf-8', errors='replace').strip()
+            if text:
+                count += 1
+                await _emit_line(f"{prefix}{text}", log_callback, True)
+        return count
 
-        if text:
-            print(text)
-            stdout_lines.append(text)
-            if log_callback:
-                await log_callback(text) if is_async else log_callback(text)
-
-    stderr = await process.stderr.read() if is_async else process.stderr.read()
-    if stderr:
-        error_text = stderr.decode('utf-8', errors='replace') if is_async else stderr
-        error = f"STDERR: {error_text}"
-        print(error)
-        stderr_lines.append(error_text)
-        if log_callback:
-            await log_callback(error) if is_async else log_callback(error)
-
-    return stdout_lines, stderr_lines
+    stdout_count, stderr_count = await asyncio.gather(pump(process.stdout), pump(process.stderr, 'STDERR: '))
+    return stdout_count, stderr_count
 
 
-async def run_js_file_async(js_file, params=None, log_callback=None):
+async def _read_progress(reader, progress_callback):
+    """Parse progress events (one JSON object per line) as they arrive and pass them on"""
+    while True:
+        line = await reader.readline()
+        if not line: break
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(event, dict) and progress_callback:
+            await progress_callback(event)
+
+
+async def run_js_file_async(js_file, params=None, log_callback=None, progress_callback=None):
+    read_fd = write_fd = None
     try:
         cmd = ['node', js_file]
         if params:
@@ -76,23 +122,41 @@ async def run_js_file_async(js_file, params=None, log_callback=None):
         if log_callback:
             await log_callback(f"Running file: {js_file}" + (f" with params: {params}" if params else ""))
 
+        # Dedicated pipe for typed progress events (scripts/progress.js), stdout stays human-readable
+        read_fd, write_fd = os.pipe()
         process = await asyncio.create_subprocess_exec(*cmd,
                                                        stdout=asyncio.subprocess.PIPE,
                                                        stderr=asyncio.subprocess.PIPE,
+                                                       env={**os.environ, 'PROGRESS_FD': str(write_fd)},
+                                                       pass_fds=(write_fd,),
                                                        universal_newlines=False)
-
-        stdout_lines, stderr_lines = await _process_output(process, log_callback, True)
+        os.close(write_fd)
+        write_fd = None
+
+        loop = asyncio.get_running_loop()
+        progress_reader = asyncio.StreamReader(limit=2 ** 20)
+        progress_transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(progress_reader), os.fdopen(read_fd, 'rb'))
+        read_fd = None
+
+        try:
+            (stdout_count, stderr_count), _ = await asyncio.gather(
+                _process_output(process, log_callback, True),
+                _read_progress(progress_reader, progress_callback)
+            )
+        finally:
+            progress_transport.close()
         return_code = await process.wait()
 
         print(f"📊 Execution result:")
         print(f"   - Return code: {return_code}")
-        print(f"   - Stdout lines: {len(stdout_lines)}")
-        print(f"   - Stderr lines: {len(stderr_lines)}")
+        print(f"   - Stdout lines: {stdout_count}")
+        print(f"   - Stderr lines: {stderr_count}")
 
         if log_callback:
             await log_callback(f"JavaScript return code: {return_code}")
-            if stderr_lines:
-                await log_callback(f"STDERR contains {len(stderr_lines)} error lines")
+            if stderr_count:
+                await log_callback(f"STDERR contains {stderr_count} error lines")
 
         success = return_code == 0
         print(f"✅ Success: {success}" if success else f"❌ Failure: {success}")
@@ -103,6 +167,10 @@ async def run_js_file_async(js_file, params=None, log_callback=None):
         print(error_msg)
         if log_callback: await log_callback(error_msg)
         return False
+    finally:
+        for fd in (read_fd, write_fd):
+            if fd is not None:
+                os.close(fd)
 
 
 def run_js_file(js_file, params=None, log_callback=None):
@@ -115,13 +183,13 @@ def run_js_file(js_file, params=None, log_callback=None):
         process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                    encoding='utf-8', errors='replace', universal_newlines=True)
 
-        stdout_lines, stderr_lines = asyncio.run(_process_output(process, log_callback, False))
-        return_code = process.poll()
+        stdout_count, stderr_count = asyncio.run(_process_output(process, log_callback, False))
+        return_code = process.wait()
 
         print(f"📊 Execution result:")
         print(f"   - Return code: {return_code}")
-        print(f"   - Stdout lines: {len(stdout_lines)}")
-        print(f"   - Stderr lines: {len(stderr_lines)}")
+        print(f"   - Stdout lines: {stdout_count}")
+        print(f"   - Stderr lines: {stderr_count}")
 
         success = return_code == 0
         print(f"✅ Success: {success}" if success else f"❌ Failure: {success}")
@@ -134,7 +202,23 @@ def run_js_file(js_file, params=None, log_callback=None):
         return False
 
 
-async def _run_scripts(action=None, params=None, log_callback=None, is_async=True):
+# action -> (inputs, outputs); actions whose inputs are ready run concurrently (utils/dag.py)
+ACTION_GRAPH = {
+    'create': ((), ('token_mint',)),
+    'upload': ((), ('metadata_uri',)),
+    'metadata': (('token_mint', 'metadata_uri'), ('metadata_set',)),
+    'revoke': (('token_mint', 'metadata_set'), ('authorities_revoked',)),
+    'distribute': (('token_mint',), ('tokens_distributed',)),
+}
+
+
+async def _report_timings(report, progress_callback=None):
+    print(format_dag_report(report))
+    if progress_callback:
+        await progress_callback({'type': 'timings', 'scope': 'actions', 'payload': report})
+
+
+async def _run_scripts(action=None, params=None, log_callback=None, is_async=True, progress_callback=None):
     _, _, scripts_dir = find_project_files()
     if not scripts_dir:
         msg = "❌ Scripts directory not found"
@@ -162,42 +246,52 @@ async def _run_scripts(action=None, params=None, log_callback=None, is_async=Tru
 
         print(f"🎯 Actions to execute: {actions}")
 
+        async def emit(msg):
+            print(msg)
+            if log_callback:
+                await log_callback(msg) if is_async else log_callback(msg)
+
         for act in actions:
             if act not in action_files:
-                msg = f"❌ Action '{act}' not executed: file not found"
-                print(msg)
-                if log_callback:
-                    await log_callback(msg) if is_async else log_callback(msg)
-                continue
+                await emit(f"❌ Action '{act}' not executed: file not found")
 
+        async def run_action(act):
             js_file = action_files[act]
-            msg = f"\n--- Running: {act} ({js_file}) ---"
-            print(msg)
-            if log_callback:
-                await log_callback(msg) if is_async else log_callback(msg)
+            await emit(f"\n--- Running: {act} ({js_file}) ---")
 
             print(f"📂 Checking file: {js_file}")
             print(f"   - File exists: {os.path.exists(js_file)}")
             if params:
                 print(f"📋 Parameters: {json.dumps(params, ensure_ascii=False, indent=2)}")
 
-            if is_async:
-                result = await run_js_file_async(js_file, params, log_callback)
+            if is_async and act in WORKER_ACTIONS and js_worker_pool.size > 0:
+                result = await js_worker_pool.run(act, params, log_callback, progress_callback)
+            elif is_async:
+                result = await run_js_file_async(js_file, params, log_callback, progress_callback)
             else:
-                result = run_js_file(js_file, params, log_callback)
+                # Blocking runner on a thread so independent actions still overlap
+                result = await asyncio.to_thread(run_js_file, js_file, params, log_callback)
 
             print(f"🎯 Action '{act}' result: {result}")
-
             if not result:
-                msg = f"❌ Action '{act}' failed"
-                print(msg)
-                if log_callback:
-                    await log_callback(msg) if is_async else log_callback(msg)
-                return False
-            else:
-                msg = f"✅ Action '{act}' completed successfully"
-                print(msg)
-
+                raise RuntimeError(f"Action '{act}' failed")
+            print(f"✅ Action '{act}' completed successfully")
+            return {output: True for output in ACTION_GRAPH[act][1]}
+
+        selected = [act for act in actions if act in action_files]
+        stages = [Stage(act, lambda values, act=act: run_action(act), *ACTION_GRAPH[act]) for act in selected]
+        # Inputs of actions that were not requested count as already there
+        initial = {output: None for act, (_, outputs) in ACTION_GRAPH.items() if act not in selected
+                   for output in outputs}
+
+        try:
+            _, report = await run_dag(stages, initial)
+        except DagStageError as e:
+            await emit(f"❌ {e.error}")
+            await _report_timings(e.report, progress_callback)
+            return False
+
+        await _report_timings(report, progress_callback)
         print("🎉 All actions completed successfully")
         return True
 
@@ -213,8 +307,15 @@ def run_scripts(action=None, params=None, log_callback=None):
     return asyncio.run(_run_scripts(action, params, log_callback, False))
 
 
-async def run_scripts_async(action=None, params=None, log_callback=None):
-    return await _run_scripts(action, params, log_callback, True)
+async def run_scripts_async(action=None, params=None, log_callback=None, on_queue_position=None,
+                            progress_callback=None):
+    """
+    Run scripts once a 'creation' slot is free; on_queue_position(position) is awaited while waiting.
+    progress_callback(event) gets the typed events from scripts/progress.js as they happen,
+    including the final {'type': 'result', 'payload': {...}} with the script's structured result.
+    """
+    async with admission.slot('creation', on_position=on_queue_position):
+        return await _run_scripts(action, params, log_callback, True, progress_callback)
 
 
 if __name__ == "__main__":
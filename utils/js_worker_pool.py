@@ -0,0 +1,253 @@
+"""Pool of pre-started Node workers (scripts/worker.js) for token-creation scripts"""
+import logging
+import asyncio
+import itertools
+import json
+import os
+import time
+from config import NODE_WORKER_POOL_SIZE, NODE_WORKER_MAX_JOBS, NODE_WORKER_MAX_RSS_MB
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'worker.js')
+
+# Actions scripts/worker.js can run, others are still started as separate node processes
+WORKER_ACTIONS = {'create', 'revoke'}
+
+
+class NodeWorker:
+    """One `node scripts/worker.js` process, running one job at a time"""
+
+    def __init__(self, process):
+        self.process = process
+        self.jobs_done = 0
+        self.rss_bytes = 0
+
+    @property
+    def is_alive(self):
+        return self.process.returncode is None
+
+    async def read_frame(self):
+        """Next frame from the worker, None on EOF; stray non-JSON output becomes a stdout log frame"""
+        line = await self.process.stdout.readline()
+        if not line:
+            return None
+
+        text = line.decode('utf-8', errors='replace').rstrip('\n')
+        try:
+            frame = json.loads(text)
+            if isinstance(frame, dict):
+                return frame
+        except json.JSONDecodeError:
+            pass
+        return {'id': None, 'type': 'log', 'stream': 'stdout', 'line': text}
+
+    async def stop(self, timeout=10.0):
+        if not self.is_alive:
+            return
+        try:
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), timeout=timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            self.process.kill()
+            await self.process.wait()
+
+
+class NodeWorkerPool:
+    """
+    Keeps up to `size` workers with the Solana libraries and config already loaded.
+    A worker is retired after `max_jobs` jobs or once its RSS passes `max_rss_mb`,
+    and replaced in the background.
+    """
+
+    def __init__(self, script, size=2, max_jobs=50, max_rss_mb=512):
+        self.script = script
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_mb * 1024 * 1024
+
+        self._idle = None
+        self._workers = set()
+        self._starting = 0
+        self._ids = itertools.count(1)
+        self._closed = False
+
+        self.jobs = 0
+        self.failures = 0
+        self.recycled = 0
+        self.crashed = 0
+
+    def _ensure_queue(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+
+    @property
+    def has_capacity(self):
+        return len(self._workers) + self._starting < self.size
+
+    async def _spawn(self):
+        self._starting += 1
+        try:
+            return await self._start_worker()
+        finally:
+            self._starting -= 1
+
+    async def _start_worker(self):
+        process = await asyncio.create_subprocess_exec(
+            'node', self.script,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            limit=2 ** 20
+        )
+        worker = NodeWorker(process)
+
+        # Wait for the ready frame: modules are loaded once this arrives
+        while True:
+            frame = await worker.read_frame()
+            if frame is None:
+                raise RuntimeError(f"worker exited during startup with code {await process.wait()}")
+            if frame.get('type') == 'ready':
+                break
+            if frame.get('type') == 'log':
+                print(frame.get('line', ''))
+
+        self._workers.add(worker)
+        logging.info(f"Node worker started (pid {process.pid}), {len(self._workers)}/{self.size} running")
+        return worker
+
+    async def _replenish(self):
+        """Start workers until the pool is full again"""
+        while not self._closed and self.has_capacity:
+            try:
+                worker = await self._spawn()
+            except Exception as e:
+                logging.error(f"Failed to start Node worker: {e}")
+                return
+            self._idle.put_nowait(worker)
+
+    async def start(self):
+        """Pre-start all workers (call once at startup)"""
+        self._ensure_queue()
+        await self._replenish()
+
+    async def _acquire(self):
+        self._ensure_queue()
+        if self._idle.empty() and self.has_capacity:
+            return await self._spawn()
+
+        while True:
+            worker = await self._idle.get()
+            if worker.is_alive:
+                return worker
+            self._workers.discard(worker)
+
+    async def _release(self, worker, healthy):
+        worker.jobs_done += 1
+
+        retire_reason = None
+        if not healthy or not worker.is_alive:
+            retire_reason = 'crashed'
+        elif worker.jobs_done >= self.max_jobs:
+            retire_reason = f"{worker.jobs_done} jobs done"
+        elif worker.rss_bytes > self.max_rss_bytes:
+            retire_reason = f"RSS {worker.rss_bytes // (1024 * 1024)} MB"
+
+        if retire_reason is None and not self._closed:
+            self._idle.put_nowait(worker)
+            return
+
+        self._workers.discard(worker)
+        if retire_reason == 'crashed':
+            self.crashed += 1
+        else:
+            self.recycled += 1
+        logging.info(f"Node worker {worker.process.pid} retired: {retire_reason}")
+
+        asyncio.create_task(worker.stop())
+        if not self._closed:
+            asyncio.create_task(self._replenish())
+
+    async def run(self, action, params=None, log_callback=None, progress_callback=None):
+        """
+        Run action ('create', 'revoke') on a pooled worker, streaming its output to log_callback
+        and its progress events to progress_callback. Returns True on success, like run_js_file_async.
+        """
+        if self._closed:
+            raise RuntimeError("worker pool is closed")
+
+        worker = await self._acquire()
+        job_id = next(self._ids)
+        healthy = False
+        success = False
+        self.jobs += 1
+
+        try:
+            frame = json.dumps({'id': job_id, 'action': action, 'params': params})
+            worker.process.stdin.write(frame.encode() + b'\n')
+            await worker.process.stdin.drain()
+
+            while True:
+                frame = await worker.read_frame()
+                if frame is None:
+                    error = f"Node worker exited with code {await worker.process.wait()} during {action}"
+                    print(error)
+                    if log_callback:
+                        await log_callback(error)
+                    break
+
+                if frame.get('type') == 'log':
+                    text = frame.get('line', '').strip()
+                    if not text:
+                        continue
+                    if frame.get('stream') == 'stderr':
+                        text = f"STDERR: {text}"
+                    print(text)
+                    if log_callback:
+                        await log_callback(text)
+
+                elif frame.get('type') == 'progress':
+                    if progress_callback and isinstance(frame.get('event'), dict):
+                        await progress_callback(frame['event'])
+
+                elif frame.get('type') == 'result' and frame.get('id') == job_id:
+                    worker.rss_bytes = frame.get('rssBytes', 0)
+                    healthy = True
+                    success = bool(frame.get('success'))
+                    if success and progress_callback:
+                        await progress_callback({'type': 'result', 'ts': int(time.time() * 1000),
+                                                 'payload': frame.get('result')})
+                    break
+        except (ConnectionError, BrokenPipeError) as e:
+            error = f"Node worker pipe closed during {action}: {e}"
+            print(error)
+            if log_callback:
+                await log_callback(error)
+        finally:
+            if not success:
+                self.failures += 1
+            await self._release(worker, healthy)
+
+        return success
+
+    async def close(self):
+        """Let running jobs finish and stop all workers"""
+        self._closed = True
+        await asyncio.gather(*(worker.stop() for worker in list(self._workers)), return_exceptions=True)
+        self._workers.clear()
+
+    def stats(self):
+        return {
+            'workers': len(self._workers),
+            'idle': self._idle.qsize() if self._idle is not None else 0,
+            'jobs': self.jobs,
+            'failures': self.failures,
+            'recycled': self.recycled,
+            'crashed': self.crashed,
+        }
+
+
+js_worker_pool = NodeWorkerPool(
+    WORKER_SCRIPT,
+    size=NODE_WORKER_POOL_SIZE,
+    max_jobs=NODE_WORKER_MAX_JOBS,
+    max_rss_mb=NODE_WORKER_MAX_RSS_MB
+)
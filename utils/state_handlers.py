@@ -75,7 +75,8 @@ async def cmd_start(message: types.Message, state: FSMContext):
         logging.info(f"{user_info} started bot with referral code: {referral_code}")
 
         try:
-            # Referral code processing
+            from referrals.handlers import process_referral_code
+            await process_referral_code(user_id, username, referral_code)
             logging.debug("Referral code processed")
         except ImportError:
             logging.debug("Referral system not available for processing code")